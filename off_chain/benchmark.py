@@ -0,0 +1,150 @@
+"""
+This module benchmarks the search paths of the off-chain database on a synthetic data set.
+It fills a scratch database (never the application one) with generated rows, then times each search
+against the LIKE scan it replaces:
+- records: full-text search over reports and treatment plans
+- patients: case-folded prefix search over the patient registry
+
+Usage: python benchmark.py [records|patients] [--rows 1000000] [--repeat 5] [--db bench.sqlite]
+"""
+
+import argparse
+import itertools
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from db.connection_manager import connection_manager
+
+VOCABULARY = [
+    "diabetes", "hypertension", "asthma", "anemia", "migraine", "arthritis", "bronchitis", "influenza",
+    "glucose", "cholesterol", "insulin", "hemoglobin", "platelets", "creatinine", "thyroid", "vitamin",
+    "elevated", "normal", "reduced", "chronic", "acute", "mild", "severe", "stable", "follow", "daily",
+    "blood", "test", "pressure", "therapy", "dose", "tablet", "weekly", "monitoring", "diet", "exercise",
+]
+
+SEARCHES = ["diabetes", "chronic hypertension", "insulin daily", "thyro"]
+
+NAMES = ["Mario", "Luca", "Giulia", "Anna", "Marco", "Sara", "Paolo", "Elena", "Davide", "Chiara"]
+LASTNAMES = ["Rossi", "Russo", "Ferrari", "Esposito", "Bianchi", "Romano", "Colombo", "Ricci", "Marino", "Greco"]
+PREFIXES = ["ros", "Rossi ma", "gre", "user12345", "zz"]
+
+# Filler words with a Zipf-like distribution, so that clinical terms are as selective as in real notes
+FILLER = [f"{a}{b}{c}" for a in ("ka", "lo", "mi", "nu", "pe", "ra", "so", "ti") for b in ("ber", "dan", "fol", "gim", "hes", "jor",
+          "lun", "mar", "nel", "pos") for c in ("a", "e", "i", "o", "u", "an", "en", "in", "on", "un")]
+FILLER_CUM_WEIGHTS = list(itertools.accumulate(1 / rank for rank in range(1, len(FILLER) + 1)))
+
+def random_text(rng, words):
+    return " ".join(rng.choice(VOCABULARY) if rng.random() < 0.1 else filler
+                    for filler in rng.choices(FILLER, cum_weights=FILLER_CUM_WEIGHTS, k=words))
+
+def populate(db_ops, rows, seed=42):
+    """
+    Inserts rows records into the scratch database: four reports for every treatment plan.
+    """
+    rng = random.Random(seed)
+    reports = rows * 4 // 5
+    db_ops.insert_reports_bulk((f"patient{rng.randrange(10000)}", f"medic{rng.randrange(500)}",
+                                random_text(rng, 12), random_text(rng, 6)) for _ in range(reports))
+    db_ops.insert_treatment_plans_bulk((f"patient{rng.randrange(10000)}", f"medic{rng.randrange(500)}",
+                                        random_text(rng, 15), "2024-01-01", "2024-12-31") for _ in range(rows - reports))
+
+def populate_patients(db_ops, rows, seed=42):
+    """
+    Inserts rows patients into the scratch database. Last names get a numeric suffix, so that prefixes are selective.
+    """
+    rng = random.Random(seed)
+    start = db_ops.cur.execute("SELECT COUNT(*) FROM Patients").fetchone()[0]
+    db_ops.insert_patients_bulk((f"user{i}", rng.choice(NAMES), f"{rng.choice(LASTNAMES)}{'' if i % 100 == 0 else i}",
+                                 "1980-01-01", "Roma", "Roma", 1, "") for i in range(start, start + rows))
+
+def like_scan_patients(conn, prefix):
+    """
+    The patient lookup available before the prefix indexes: a case-insensitive LIKE over the whole registry.
+    """
+    words = prefix.split()
+    if len(words) == 1:
+        return conn.execute("SELECT * FROM Patients WHERE lastname LIKE ?1 OR username LIKE ?1 ORDER BY lastname, name LIMIT 15",
+                            (words[0] + "%",)).fetchall()
+    return conn.execute("SELECT * FROM Patients WHERE lastname LIKE ? AND name LIKE ? ORDER BY lastname, name LIMIT 15",
+                        (" ".join(words[:-1]), words[-1] + "%")).fetchall()
+
+def like_scan(conn, text):
+    """
+    The search available before the full-text index: every word must appear, anywhere, in the record.
+    """
+    words = text.split()
+    report_filter = " AND ".join("(analyses LIKE ? OR diagnosis LIKE ?)" for _ in words)
+    plan_filter = " AND ".join("description LIKE ?" for _ in words)
+    params = [f"%{w}%" for w in words for _ in range(2)] + [f"%{w}%" for w in words]
+    return conn.execute(f"""SELECT 'REPORT', id_report FROM Reports WHERE {report_filter}
+                            UNION ALL
+                            SELECT 'TREATMENT_PLAN', id_treament_plan FROM TreatmentPlans WHERE {plan_filter}""", params).fetchall()
+
+def timed(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), result
+
+def benchmark_records(db_ops, rows, repeat):
+    existing = db_ops.cur.execute("SELECT (SELECT COUNT(*) FROM Reports) + (SELECT COUNT(*) FROM TreatmentPlans)").fetchone()[0]
+    if existing < rows:
+        print(f"Generating {rows - existing} reports and treatment plans...")
+        start = time.perf_counter()
+        populate(db_ops, rows - existing)
+        print(f"  done in {time.perf_counter() - start:.1f}s")
+
+    print(f"\n{'query':<24}{'matches':>10}{'LIKE scan':>14}{'FTS5 top 20':>14}{'speed-up':>10}")
+    for text in SEARCHES:
+        like_time, matches = timed(lambda: like_scan(db_ops.conn, text), repeat)
+        fts_time, _ = timed(lambda: db_ops.search_medical_records(text, limit=20), repeat)
+        print(f"{text:<24}{len(matches):>10}{like_time * 1000:>12.1f}ms{fts_time * 1000:>12.1f}ms{like_time / fts_time:>9.1f}x")
+
+def benchmark_patients(db_ops, rows, repeat):
+    existing = db_ops.cur.execute("SELECT COUNT(*) FROM Patients").fetchone()[0]
+    if existing < rows:
+        print(f"Generating {rows - existing} patients...")
+        start = time.perf_counter()
+        populate_patients(db_ops, rows - existing)
+        print(f"  done in {time.perf_counter() - start:.1f}s")
+
+    print(f"\n{'prefix':<24}{'matches':>10}{'LIKE scan':>14}{'prefix seek':>14}{'speed-up':>10}")
+    for prefix in PREFIXES:
+        like_time, _ = timed(lambda: like_scan_patients(db_ops.conn, prefix), repeat)
+        seek_time, matches = timed(lambda: db_ops.search_patients(prefix, limit=15), repeat)
+        print(f"{prefix:<24}{len(matches):>10}{like_time * 1000:>12.1f}ms{seek_time * 1000:>12.2f}ms{like_time / seek_time:>9.1f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the indexed searches against LIKE scans.")
+    parser.add_argument("target", nargs="?", choices=("records", "patients"), default="records",
+                        help="search to benchmark: full-text over medical records, or prefix over patients")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="number of rows to generate")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per query, the median is reported")
+    parser.add_argument("--db", help="scratch database file (default: a temporary file, deleted afterwards)")
+    args = parser.parse_args()
+
+    db_path = args.db or os.path.join(tempfile.mkdtemp(), "benchmark.sqlite")
+    connection_manager.db_path = db_path
+    # Imported here so that the schema is created in the scratch database
+    from db.db_operations import DatabaseOperations
+    db_ops = DatabaseOperations()
+    print(f"Benchmarking on {db_path}")
+
+    if args.target == "records":
+        benchmark_records(db_ops, args.rows, args.repeat)
+    else:
+        benchmark_patients(db_ops, args.rows, args.repeat)
+
+    connection_manager.close_all()
+    if not args.db:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""
+This module picks the scrypt parameters for new password hashes on the machine it runs on.
+It times scrypt for increasing cost factors and prints the 'scrypt' section to put in configuration.yml:
+the highest cost whose verification stays within the target latency and the memory budget.
+Existing users are moved to the new parameters transparently, the next time they log in.
+
+Usage: python calibrate.py [--target-ms 100] [--max-memory-mb 64] [--r 8] [--p 1]
+"""
+
+import argparse
+
+from db.kdf_executor import calibrate_scrypt, SCRYPT_PARAMS
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate the scrypt parameters for this machine.")
+    parser.add_argument("--target-ms", type=float, default=100, help="maximum duration of one password verification")
+    parser.add_argument("--max-memory-mb", type=int, default=64, help="maximum memory of one password derivation")
+    parser.add_argument("--r", type=int, default=SCRYPT_PARAMS["r"], help="scrypt block size")
+    parser.add_argument("--p", type=int, default=SCRYPT_PARAMS["p"], help="scrypt parallelization factor")
+    parser.add_argument("--dklen", type=int, default=SCRYPT_PARAMS["dklen"], help="length of the derived key")
+    args = parser.parse_args()
+
+    result = calibrate_scrypt(args.target_ms, args.max_memory_mb * 2**20, r=args.r, p=args.p, dklen=args.dklen)
+
+    print(f"{'n':>10}{'time':>12}{'memory':>12}")
+    for n, duration, memory in result["candidates"]:
+        print(f"{n:>10}{duration:>10.1f}ms{memory / 2**20:>10.1f}MB")
+
+    print(f"\nChosen: n={result['n']} ({result['ms']:.1f}ms, {result['memory'] / 2**20:.1f}MB per derivation); "
+          f"currently configured: n={SCRYPT_PARAMS['n']}")
+    print("Remember that the KDF pool runs up to 'workers' derivations at once: budget memory accordingly.\n")
+    print("scrypt:")
+    for name in ("n", "r", "p", "dklen"):
+        print(f"  {name}: {result[name]}")
+
+if __name__ == "__main__":
+    main()
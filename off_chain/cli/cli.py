@@ -12,6 +12,7 @@ from eth_keys import *
 from controllers.controller import Controller
 from controllers.action_controller import ActionController
 from session.session import Session
+from session.logging import log_error
 from db.db_operations import DatabaseOperations
 from cli.utils import Utils
 from colorama import Fore, Style, init
@@ -45,7 +46,7 @@ class CommandLineInterface:
         self.act_controller = ActionController()
         self.session = session
         self.ops = DatabaseOperations()
-        self.util = Utils(session)
+        self.util = Utils(session, self.act_controller)
 
         self.menu = {
             1: 'Register New Account',
@@ -196,35 +197,65 @@ class CommandLineInterface:
                 else:
                     break
 
-            reg_code = self.controller.registration(username, password, user_role, public_key, private_key)
-            if reg_code == 0:
-                print(Fore.GREEN + 'You have succesfully registered!\n' + Style.RESET_ALL)
-                if role == 'P':
-                    self.insert_patient_info(username)
-                elif role == 'M':
-                    self.insert_medic_info(username)
-                elif role == 'C':
-                    self.insert_caregiver_info(username)
-            elif reg_code == -1:
-                print(Fore.RED + 'Your username has been taken.\n' + Style.RESET_ALL)
+            # Credentials are registered together with the profile, in a single unit of work
+            credentials = (password, user_role, public_key, private_key)
+            if role == 'P':
+                self.insert_patient_info(username, credentials=credentials)
+            elif role == 'M':
+                self.insert_medic_info(username, credentials)
+            elif role == 'C':
+                self.insert_caregiver_info(username, credentials)
         
         else:
             print(Fore.RED + 'Sorry, but the provided public and private key do not match to any account\n' + Style.RESET_ALL)
             return 
 
-    def insert_patient_info(self, username, autonomous_flag=1):
+    def insert_patient_info(self, username, autonomous_flag=1, credentials=None):
         """
         This method guides users through the process of providing personal information.
         It validates user inputs and ensures data integrity before inserting the 
-        information into the system. Additionally, it registers the patient entity 
+        information into the system. Once the information is saved, it registers the patient entity
         on the blockchain.
 
         Args:
             username (str): The username of the patient.
             role (str): The role of the patient.
             autonomous_flag (bool): Flag indicating whether the patient is autonomous or not. Default set to 1.
+            credentials (tuple): (password, role, public_key, private_key) of a patient being registered, whose
+                                 credentials are committed together with the profile. Default set to None.
+        """
+
+        profile = self.prompt_patient_profile(autonomous_flag)
+        if credentials:
+            insert_code = self.controller.registration(username, *credentials, profile=profile)
+        else:
+            insert_code = self.controller.insert_patient_info(username, **profile)
+        if insert_code == 0:
+            if autonomous_flag == 1:
+                from_address_patient = credentials[2] if credentials else self.controller.get_public_key_by_username(username)
+                self.register_on_chain('patient', profile['name'], profile['lastname'], autonomous_flag, from_address=from_address_patient)
+            if credentials:
+                print(Fore.GREEN + 'You have succesfully registered!' + Style.RESET_ALL)
+            print(Fore.GREEN + 'Information saved correctly!' + Style.RESET_ALL)
+            if autonomous_flag == 1:
+                self.patient_menu(username)
+        elif insert_code == -1 and credentials:
+            print(Fore.RED + 'Your username has been taken.\n' + Style.RESET_ALL)
+        elif insert_code in (-1, -2):
+            print(Fore.RED + 'Internal error!' + Style.RESET_ALL)
+
+    def prompt_patient_profile(self, autonomous_flag=1, taken_phones=()):
         """
+        Asks for the personal information of a patient and validates it, without saving anything.
+
+        Args:
+            autonomous_flag (bool): Flag indicating whether the patient is autonomous or not. Default set to 1.
+            taken_phones (tuple): Phone numbers not yet saved but already assigned to someone else being registered
+                                  at the same time (e.g. the caregiver of the patient).
 
+        Returns:
+            dict: The keyword arguments of the patient profile insertion.
+        """
         print("\nProceed with the insertion of a few personal information.")
         while True:
             name = input('Name: ')
@@ -249,22 +280,29 @@ class CommandLineInterface:
         while True:
             phone = input('Phone number: ')
             if self.controller.check_phone_number_format(phone): 
-                if self.controller.check_unique_phone_number(phone) == 0: break
+                if phone not in taken_phones and self.controller.check_unique_phone_number(phone) == 0: break
                 else: print(Fore.RED + "This phone number has already been inserted. \n" + Style.RESET_ALL)
             else: print(Fore.RED + "Invalid phone number format.\n" + Style.RESET_ALL)
-        
-        if autonomous_flag == 1:
-            from_address_patient = self.controller.get_public_key_by_username(username)
-            self.act_controller.register_entity('patient', name, lastname, autonomous_flag, from_address=from_address_patient)
-        insert_code = self.controller.insert_patient_info(username, name, lastname, birthday, birth_place, residence, autonomous_flag, phone)
-        if insert_code == 0:
-            print(Fore.GREEN + 'Information saved correctly!' + Style.RESET_ALL)
-            if autonomous_flag == 1:
-                self.patient_menu(username)
-        elif insert_code == -1:
-            print(Fore.RED + 'Internal error!' + Style.RESET_ALL)
 
-    def insert_medic_info(self, username):
+        return {'name': name, 'lastname': lastname, 'birthday': birthday, 'birth_place': birth_place,
+                'residence': residence, 'autonomous': autonomous_flag, 'phone': phone}
+
+    def register_on_chain(self, entity_type, *args, from_address):
+        """
+        Registers an entity on the blockchain once its profile has been committed locally, so that a failed
+        local insertion never leaves an orphan record on the chain. The transaction is tracked in the background.
+
+        Args:
+            entity_type (str): The type of entity ('medic', 'patient' or 'caregiver').
+            *args: The arguments of the contract registration function.
+            from_address (str): The Ethereum address of the entity.
+        """
+        try:
+            self.act_controller.register_entity(entity_type, *args, from_address=from_address, wait=False)
+        except Exception as e:
+            log_error(e)
+
+    def insert_medic_info(self, username, credentials=None):
         """
         This method assists medics in providing their personal information. It validates 
         user inputs and ensures data integrity before inserting the information into 
@@ -272,7 +310,8 @@ class CommandLineInterface:
 
         Args:
             username (str): The username of the medic.
-            role (str): The role of the medic.
+            credentials (tuple): (password, role, public_key, private_key) of a medic being registered, whose
+                                 credentials are committed together with the profile. Default set to None.
         """
 
         print("\nProceed with the insertion of a few personal information.")
@@ -306,25 +345,35 @@ class CommandLineInterface:
                 else: print(Fore.RED + "This phone number has already been inserted. \n" + Style.RESET_ALL)
             else: print(Fore.RED + "Invalid phone number format.\n" + Style.RESET_ALL)
 
-        from_address_medic = self.controller.get_public_key_by_username(username)
-        self.act_controller.register_entity('medic', name, lastname, specialization, from_address=from_address_medic)
-        insert_code = self.controller.insert_medic_info(username, name, lastname, birthday, specialization, mail, phone)
+        if credentials:
+            profile = {'name': name, 'lastname': lastname, 'birthday': birthday, 'specialization': specialization,
+                       'mail': mail, 'phone': phone}
+            insert_code = self.controller.registration(username, *credentials, profile=profile)
+        else:
+            insert_code = self.controller.insert_medic_info(username, name, lastname, birthday, specialization, mail, phone)
         if insert_code == 0:
+            from_address_medic = credentials[2] if credentials else self.controller.get_public_key_by_username(username)
+            self.register_on_chain('medic', name, lastname, specialization, from_address=from_address_medic)
+            if credentials:
+                print(Fore.GREEN + 'You have succesfully registered!' + Style.RESET_ALL)
             print(Fore.GREEN + 'Information saved correctly!' + Style.RESET_ALL)
             self.medic_menu(username)
-        elif insert_code == -1:
+        elif insert_code == -1 and credentials:
+            print(Fore.RED + 'Your username has been taken.\n' + Style.RESET_ALL)
+        elif insert_code in (-1, -2):
             print(Fore.RED + 'Internal error!' + Style.RESET_ALL)
 
-    def insert_caregiver_info(self, username):
+    def insert_caregiver_info(self, username, credentials=None):
         """
         This method facilitates the process of caregivers providing their personal 
         information and the patient's information the are taking care of. It validates user inputs and ensures data 
-        integrity before inserting the information into the system. Additionally, 
-        it registers the caregiver entity on the blockchain.
+        integrity before inserting the information into the system: caregiver and patient are saved together,
+        or not at all. Once they are saved, it registers the caregiver entity on the blockchain.
 
         Args:
             username (str): The username of the caregiver.
-            role (str): The role of the caregiver.
+            credentials (tuple): (password, role, public_key, private_key) of a caregiver being registered, whose
+                                 credentials are committed together with the profile. Default set to None.
         """
 
         print("\nProceed with the insertion of a few personal information.")
@@ -346,22 +395,33 @@ class CommandLineInterface:
         print('\nNow register patient information')
         while True:
             username_patient = input('Insert the patient username: ')
-            if self.controller.check_username(username_patient) == 0: break
+            if username_patient != username and self.controller.check_username(username_patient) == 0: break
             else: print(Fore.RED + 'Your username has been taken.\n' + Style.RESET_ALL)
-        self.insert_patient_info(username_patient, 0)
+        # The patient is saved together with the caregiver, so the caregiver's phone is not in the database yet
+        patient_profile = self.prompt_patient_profile(0, taken_phones=(phone,))
 
         while True:
             relationship = input('What kind of relationship there is between you and the patient: ')
             if self.controller.check_null_info(relationship): break
             else: print(Fore.RED + '\nPlease insert information.' + Style.RESET_ALL)
 
-        from_address_caregiver = self.controller.get_public_key_by_username(username)
-        self.act_controller.register_entity('caregiver', name, lastname, from_address=from_address_caregiver)
-        insert_code = self.controller.insert_caregiver_info(username, name, lastname, username_patient, relationship, phone)
+        patient = (username_patient, patient_profile)
+        if credentials:
+            profile = {'name': name, 'lastname': lastname, 'username_patient': username_patient,
+                       'relationship': relationship, 'phone': phone}
+            insert_code = self.controller.registration(username, *credentials, profile=profile, patient=patient)
+        else:
+            insert_code = self.controller.insert_caregiver_info(username, name, lastname, username_patient, relationship, phone, patient=patient)
         if insert_code == 0:
+            from_address_caregiver = credentials[2] if credentials else self.controller.get_public_key_by_username(username)
+            self.register_on_chain('caregiver', name, lastname, from_address=from_address_caregiver)
+            if credentials:
+                print(Fore.GREEN + 'You have succesfully registered!' + Style.RESET_ALL)
             print(Fore.GREEN + 'Information saved correctly!\n' + Style.RESET_ALL)
             self.caregiver_menu(username)
-        elif insert_code == -1:
+        elif insert_code == -1 and credentials:
+            print(Fore.RED + 'Your username has been taken.\n' + Style.RESET_ALL)
+        elif insert_code in (-1, -2):
             print(Fore.RED + 'Internal error!' + Style.RESET_ALL)
 
     def login_menu(self):
@@ -406,6 +466,8 @@ class CommandLineInterface:
                 elif login_code == -2:
                     print(Fore.RED + '\nToo many login attempts\n' + Style.RESET_ALL)
                     return -1
+                elif login_code == -3:
+                    print(Fore.RED + '\nThe service is busy, please try again in a moment\n' + Style.RESET_ALL)
                 
             else:
                 print(Fore.RED + '\nMax number of attemps reached\n' + Style.RESET_ALL)
@@ -417,8 +479,8 @@ class CommandLineInterface:
     def medic_menu(self, username):
         """
         This method presents medics with a menu of options tailored to their role. 
-        It allows medics to choose actions such as selecting a patient, viewing or 
-        updating their profile, changing their password, or logging out. The method 
+        It allows medics to choose actions such as selecting or searching a patient, searching 
+        reports and treatment plans, viewing or updating their profile, changing their password, or logging out. The method 
         handles user input validation and directs users to the corresponding functionality 
         based on their choice.
 
@@ -428,10 +490,12 @@ class CommandLineInterface:
 
         medic_options = {
             1: "Choose patient",
-            2: "View profile",
-            3: "Update profile",
-            4: "Change password",
-            5: "Log out"
+            2: "Search patient",
+            3: "Search reports and treatment plans",
+            4: "View profile",
+            5: "Update profile",
+            6: "Change password",
+            7: "Log out"
         }
 
         while True:
@@ -446,15 +510,21 @@ class CommandLineInterface:
                         self.util.display_records(username)
 
                     elif choice == 2:
+                        self.util.search_patients()
+
+                    elif choice == 3:
+                        self.util.search_medical_records()
+
+                    elif choice == 4:
                         self.view_medicview(username)
 
-                    elif choice == 3:                           
+                    elif choice == 5:                           
                         self.util.update_profile(username, "Medic")
                 
-                    elif choice == 4:
+                    elif choice == 6:
                         self.util.change_passwd(username)
 
-                    elif choice == 5:
+                    elif choice == 7:
                         confirm = input("\nDo you really want to leave? (Y/n): ").strip().upper()
                         if confirm == 'Y':
                             print(Fore.CYAN + "\nThank you for using the service!\n" + Style.RESET_ALL)
@@ -5,7 +5,6 @@ and treatment plans. It also includes functions for adding new reports and treat
 """
 
 import datetime
-import math
 import re
 import click
 import getpass
@@ -17,6 +16,7 @@ from controllers.controller import Controller
 from controllers.action_controller import ActionController
 from session.session import Session
 from session.logging import log_error
+from models.read_models import ReadModel
 
 
 
@@ -28,33 +28,33 @@ class Utils:
 
     Attributes:
         PAGE_SIZE (int): The number of items to display per page.
-        current_page (int): The index of the current page being displayed.
 
     """
 
     init(convert=True)
 
     PAGE_SIZE = 3
-    current_page = 0
     
-    def __init__(self, session: Session):
+    def __init__(self, session: Session, act_controller: ActionController):
 
         """
         Initializes the Utils class with a session object.
 
         Parameters:
             session (Session): The session object containing user information.
+            act_controller (ActionController): The ActionController of the command line interface, shared so that
+                                               the application has a single receipt tracker and write coalescer.
 
         Attributes:
             session (Session): The session object containing user information.
             controller (Controller): An instance of the Controller class for database interaction.
-            act_controller (ActionController): An instance of the ActionController class for managing actions.
+            act_controller (ActionController): The ActionController instance managing actions.
             today_date (str): The current date in string format.
         """
 
         self.session = session
         self.controller = Controller(session)
-        self.act_controller = ActionController()
+        self.act_controller = act_controller
         self.today_date = str(datetime.date.today())
 
     def change_passwd(self, username):
@@ -139,7 +139,7 @@ class Utils:
             if autonomous_flag == 1:
                 try:
                     from_address_patient = self.controller.get_public_key_by_username(username)
-                    self.act_controller.update_entity('patient', name, lastname, autonomous_flag, from_address=from_address_patient)
+                    self.act_controller.update_entity('patient', name, lastname, autonomous_flag, from_address=from_address_patient, wait=False)
                 except Exception as e:
                     log_error(e)
 
@@ -157,7 +157,7 @@ class Utils:
             lastname = us.get_lastname()
             try:
                 from_address_caregiver = self.controller.get_public_key_by_username(username)
-                self.act_controller.update_entity('caregiver', name, lastname, from_address=from_address_caregiver)
+                self.act_controller.update_entity('caregiver', name, lastname, from_address=from_address_caregiver, wait=False)
             except Exception as e:
                 log_error(e)
 
@@ -189,7 +189,7 @@ class Utils:
             specialization = us.get_specialization()
             try:
                 from_address_medic = self.controller.get_public_key_by_username(username)
-                self.act_controller.update_entity('medic', name, lastname, specialization, from_address=from_address_medic)
+                self.act_controller.update_entity('medic', name, lastname, specialization, from_address=from_address_medic, wait=False)
             except Exception as e:
                 log_error(e)
 
@@ -217,15 +217,12 @@ class Utils:
             try:
                 choice = int(input('Enter your choice: '))
                 if choice == 1:
-                    self.current_page = 0
                     self.display_reports(username)
 
                 elif choice == 2:
-                    self.current_page = 0
                     self.display_treats(username)
 
                 elif choice == 3:
-                    self.current_page = 0
                     break
                 
                 else:
@@ -263,90 +260,80 @@ class Utils:
                 else: print(Fore.RED + "\nInvalid input, try again!" + Style.RESET_ALL)
             except: print(Fore.RED + "Invalid input!" + Style.RESET_ALL)
 
-    def get_page_records(self, page_index, patients):
+    def get_page_records(self, cursor):
 
         """
-        Retrieves a subset of patient records for a specific page.
+        Retrieves one page of patient records, starting at the given cursor.
 
         Parameters:
-            page_index (int): The index of the page to retrieve.
-            patients (List[Patient]): A list of Patient objects.
+            cursor (int|None): The cursor of the page to retrieve, or None for the first page.
 
         Returns:
-            list: A subset of Patient objects for the specified page.
+            tuple: The Patient objects of the page and the cursor of the next page (None if there is none).
         """
 
-        start_index = page_index * self.PAGE_SIZE
-        end_index = start_index + self.PAGE_SIZE
-
-        if not patients:
+        patients, next_cursor = self.controller.get_patients_page(cursor, self.PAGE_SIZE)
+        if not patients and cursor is None:
             print(Fore.RED + "\nThere are no patients in the system." + Style.RESET_ALL)
-            return
-        return patients[start_index:end_index]
+        return patients, next_cursor
 
-    def get_page_reports(self, page_index, username):
+    def get_page_reports(self, cursor, username):
 
         """
-        Retrieves a subset of reports for a specific page belonging to a particular user.
+        Retrieves one page of reports belonging to a particular user, starting at the given cursor.
 
         Parameters:
-            page_index (int): The index of the page to retrieve.
+            cursor (tuple|None): The cursor of the page to retrieve, or None for the first page.
             username (str): The username of the user whose reports are to be fetched.
 
         Returns:
-            list: A subset of reports for the specified page.
+            tuple: The reports of the page and the cursor of the next page (None if there is none).
         """
 
         user_auth = self.session.get_user()
         username_auth = user_auth.get_username()
 
-        start_index = page_index * self.PAGE_SIZE
-        end_index = start_index + self.PAGE_SIZE
-
-        reports = self.controller.get_reports_list_by_username(username)
-        if not reports:
+        reports, next_cursor = self.controller.get_reports_page(username, cursor, self.PAGE_SIZE)
+        if not reports and cursor is None:
             print(Fore.RED + f"\n{username} doesn't have reports yet." + Style.RESET_ALL)
             if self.controller.get_role_by_username(username_auth) == "MEDIC": 
                 while True:
                     new_report = input("\nDo you want to add one? (Y/n) ").strip().upper()
                     if new_report == 'Y':
                         self.add_report(username)
-                        return self.controller.get_reports_list_by_username(username)
-                    elif new_report == 'N': return
+                        return self.controller.get_reports_page(username, None, self.PAGE_SIZE)
+                    elif new_report == 'N': break
                     else: print(Fore.RED + "Invalid choice!" + Style.RESET_ALL)
-        else: return reports[start_index:end_index]
+        return reports, next_cursor
     
-    def get_page_treatplan(self, page_index, username):
+    def get_page_treatplan(self, cursor, username):
 
         """
-        Retrieves a subset of treatment plans for a specific page belonging to a particular user.
+        Retrieves one page of treatment plans belonging to a particular user, starting at the given cursor.
 
         Args:
-            page_index (int): The index of the page to retrieve.
+            cursor (tuple|None): The cursor of the page to retrieve, or None for the first page.
             username (str): The username of the user whose treatment plans are to be fetched.
 
         Returns:
-            list: A subset of treatment plans for the specified page.
+            tuple: The treatment plans of the page and the cursor of the next page (None if there is none).
         """
 
         user_auth = self.session.get_user()
         username_auth = user_auth.get_username()
 
-        start_index = page_index * self.PAGE_SIZE
-        end_index = start_index + self.PAGE_SIZE
-
-        treats = self.controller.get_treatplan_list_by_username(username)
-        if not treats:
+        treats, next_cursor = self.controller.get_treatplan_page(username, cursor, self.PAGE_SIZE)
+        if not treats and cursor is None:
             print(Fore.RED + f"\n{username} doesn't have any treatment plan yet." + Style.RESET_ALL)
             if self.controller.get_role_by_username(username_auth) == "MEDIC":
                 while True:
                     new_treat = input("\nDo you want to add one? (Y/n) ").strip().upper()
                     if new_treat == 'Y':
                         self.add_treatment_plan(username)
-                        return self.controller.get_treatplan_list_by_username(username)
-                    elif new_treat == 'N': return
+                        return self.controller.get_treatplan_page(username, None, self.PAGE_SIZE)
+                    elif new_treat == 'N': break
                     else: print(Fore.RED + "Invalid choice!" + Style.RESET_ALL)
-        else: return treats[start_index:end_index]
+        return treats, next_cursor
 
     def display_records(self, username):
 
@@ -354,13 +341,13 @@ class Utils:
         Displays the records (patients) in a tabular format.
 
         Args:
-            records (list): A list of patient records to be displayed.
+            username (str): The username of the medic browsing the records.
         """
 
-        while True:
-            patients = self.controller.get_patients()
+        page_cursors = [None]
 
-            pagerecords = self.get_page_records(self.current_page, patients)
+        while True:
+            pagerecords, next_cursor = self.get_page_records(page_cursors[-1])
 
             if pagerecords:
 
@@ -382,13 +369,12 @@ class Utils:
                     action = input("\nEnter 'n' for next page, 'p' for previous page, 's' to select a patient, or 'q' to quit: \n")
 
                     if action == "n" or action == "N":
-                        self.go_to_next_page(patients, 0, username)
+                        self.go_to_next_page(page_cursors, next_cursor)
                     elif action == "p" or action == "P":
-                        self.go_to_previous_page(patients, 0, username)
+                        self.go_to_previous_page(page_cursors)
                     elif action == "s" or action == "S":
                         self.handle_selection(pagerecords)
                     elif action == "q" or action == "Q":
-                        self.current_page = 0
                         print("Exiting...")
                         break
                     else:
@@ -407,10 +393,10 @@ class Utils:
 
         user_auth = self.session.get_user()
         role = self.controller.get_role_by_username(user_auth.get_username())
+        page_cursors = [None]
 
         while True:
-            reports = self.controller.get_reports_list_by_username(username)
-            pagereports = self.get_page_reports(self.current_page, username)
+            pagereports, next_cursor = self.get_page_reports(page_cursors[-1], username)
             if pagereports:
                 possessive_suffix = self.controller.possessive_suffix(username)
                 table = Table(title=f"{username}{possessive_suffix} reports")
@@ -421,8 +407,7 @@ class Utils:
                     table.add_column(column)
 
                 for i, report in enumerate(pagereports, start=1):
-                    medic = self.controller.get_medic_by_username(report.get_username_medic())
-                    row = [str(i), report.get_date(), f"{medic.get_name()} {medic.get_lastname()}", report.get_analyses()]
+                    row = [str(i), report.get_date(), f"{report.get_medic_name()} {report.get_medic_lastname()}", report.get_analyses()]
                     table.add_row(*row, style = 'bright_green')
 
                 console = Console()
@@ -435,13 +420,12 @@ class Utils:
                         action = input("\nEnter the number of the report to visualize, 'n' for next page, 'p' for previous page or 'q' to quit: \n")
 
                     if action == "n" or action == "N":
-                        self.go_to_next_page(reports, 1, username)
+                        self.go_to_next_page(page_cursors, next_cursor)
                     elif action == "p" or action == "P":
-                        self.go_to_previous_page(reports, 1, username)
+                        self.go_to_previous_page(page_cursors)
                     elif (action == "a" or action == "A") and role == "MEDIC":
                         self.add_report(username)
                     elif action == "q" or action == "Q":
-                        self.current_page = 0
                         print("Exiting...")
                         break
                     elif 0 < int(action) <= len(pagereports):
@@ -464,10 +448,10 @@ class Utils:
 
         user_auth = self.session.get_user()
         role = self.controller.get_role_by_username(user_auth.get_username())
+        page_cursors = [None]
 
         while True:
-            treats = self.controller.get_treatplan_list_by_username(username)
-            pagetreats = self.get_page_treatplan(self.current_page, username)
+            pagetreats, next_cursor = self.get_page_treatplan(page_cursors[-1], username)
             if pagetreats:
                 possessive_suffix = self.controller.possessive_suffix(username)
                 table = Table(title=f"{username}{possessive_suffix} treatment plans")
@@ -478,8 +462,7 @@ class Utils:
                     table.add_column(column)
 
                 for i, treat in enumerate(pagetreats, start=1):
-                    medic = self.controller.get_medic_by_username(treat.get_username_medic())
-                    row = [str(i), treat.get_date(), f"{medic.get_name()} {medic.get_lastname()}", treat.get_start_date(), treat.get_end_date()]
+                    row = [str(i), treat.get_date(), f"{treat.get_medic_name()} {treat.get_medic_lastname()}", treat.get_start_date(), treat.get_end_date()]
                     table.add_row(*row, style = 'bright_green')
 
                 console = Console()
@@ -492,85 +475,125 @@ class Utils:
                         action = input("\nEnter the number of the treatment plan to visualize, 'n' for next page, 'p' for previous page or 'q' to quit: \n")
 
                     if action == "n" or action == "N":
-                        self.go_to_next_page(treats, 2, username)
+                        self.go_to_next_page(page_cursors, next_cursor)
                     elif action == "p" or action == "P":
-                        self.go_to_previous_page(treats, 2, username)
+                        self.go_to_previous_page(page_cursors)
                     elif (action == "a" or action == "A") and role == "MEDIC":
                         self.add_treatment_plan(username)
                     elif action == "q" or action == "Q":
-                        self.current_page = 0
                         print("Exiting...")
                         break
-                    elif 0 < int(action) <= len(treats):
+                    elif 0 < int(action) <= len(pagetreats):
                         selection_index = int(action) - 1
-                        if 0 <= selection_index < len(treats):
+                        if 0 <= selection_index < len(pagetreats):
                             self.show_treatment_plan_details(pagetreats[selection_index])
                     else:
                         print(Fore.RED + "Invalid input. Please try again. \n" + Style.RESET_ALL)
                 except: print(Fore.RED + "Invalid input!" + Style.RESET_ALL)
             else: break
 
-    def show_page(self, list, flag, username):
+    def search_patients(self):
 
         """
-        Display a page of records based on the flag.
+        Asks the medic for the beginning of a patient's last name (optionally followed by the name) or username
+        and shows the matching patients, which can then be selected as from the full list.
+        """
 
-        Args:
-            list (list): The list of records to display.
-            flag (int): An integer flag indicating the type of records (0 for general records, 1 for reports, 2 for treatment plans).
-            username (str): The username associated with the records.
+        while True:
+            prefix = input("\nEnter the last name (and name) or the username of the patient (or 'q' to quit): ").strip()
+            if prefix == "q" or prefix == "Q":
+                break
+            if not prefix:
+                print(Fore.RED + "Please enter at least one letter." + Style.RESET_ALL)
+                continue
 
-        Returns:
-            None
+            patients = self.controller.search_patients(prefix, limit=self.PAGE_SIZE * 5)
+            if not patients:
+                print(Fore.YELLOW + "No patient matches your search." + Style.RESET_ALL)
+                continue
+
+            table = Table(title=f"Patients matching '{prefix}'")
+
+            columns = ["Username", "Name", "Last Name", "Date of Birth", "Place of Birth", "Residence"]
+
+            for column in columns:
+                table.add_column(column)
+
+            for patient in patients:
+                row = [patient.get_username(), patient.get_name(), patient.get_lastname(), patient.get_birthday(), patient.get_birth_place(), patient.get_residence()]
+                table.add_row(*row, style = 'bright_green')
+
+            console = Console()
+            console.print(table)
+
+            self.handle_selection(patients)
+
+    def search_medical_records(self):
+
+        """
+        Asks the medic for some words and shows the reports and treatment plans containing them,
+        most relevant first, as found by the full-text index.
         """
 
-        if flag == 0:
-            self.get_page_records(self.current_page, list)
-        elif flag == 1:
-            self.get_page_reports(self.current_page, username)
-        elif flag == 2:
-            self.get_page_treatplan(self.current_page, username)
+        while True:
+            text = input("\nEnter the words to search in reports and treatment plans (or 'q' to quit): ").strip()
+            if text == "q" or text == "Q":
+                break
+            if not text:
+                print(Fore.RED + "Please enter at least one word." + Style.RESET_ALL)
+                continue
+
+            hits = self.controller.search_medical_records(text)
+            if not hits:
+                print(Fore.YELLOW + "No reports or treatment plans match your search." + Style.RESET_ALL)
+                continue
+
+            table = Table(title=f"Results for '{text}'")
+
+            columns = ["Type", "Patient", "Medic", "Date", "Match"]
+
+            for column in columns:
+                table.add_column(column)
 
-    def go_to_next_page(self, list, flag, username):
+            for hit in hits:
+                kind = "Report" if hit.get_kind() == "REPORT" else "Treatment plan"
+                row = [kind, hit.get_username_patient(), hit.get_username_medic(), hit.get_date(), hit.get_snippet()]
+                table.add_row(*row, style = 'bright_green')
+
+            console = Console()
+            console.print(table)
+
+    def go_to_next_page(self, page_cursors, next_cursor):
         """
-        Displays the next page of records based on the current page index.
+        Moves to the next page of records, if there is one.
 
         Args:
-            list (list): The list of records to paginate through.
-            flag (int): A flag indicating the type of records (0 for general records, 1 for reports, 2 for treatment plans).
-            username (str): The username associated with the records.
+            page_cursors (list): The cursors of the pages visited so far; the last one is the current page.
+            next_cursor: The cursor of the next page, as returned with the current page (None if there is none).
 
         Returns:
             None
         """
 
-        total_pages = math.ceil(len(list) / self.PAGE_SIZE)
-        if self.current_page < total_pages - 1:
-            self.current_page += 1
-            self.show_page(list, flag, username)
+        if next_cursor is not None:
+            page_cursors.append(next_cursor)
         else:
-            self.show_page(list, flag, username)
             print(Fore.RED + "\nNo more results found." + Style.RESET_ALL)
-            return
 
-    def go_to_previous_page(self, list, flag, username):
+    def go_to_previous_page(self, page_cursors):
         """
-        Displays the previous page of records based on the current page index.
+        Moves back to the previous page of records, if there is one.
 
         Args:
-            list (list): The list of records to paginate through.
-            flag (int): A flag indicating the type of records (0 for general records, 1 for reports, 2 for treatment plans).
-            username (str): The username associated with the records.
+            page_cursors (list): The cursors of the pages visited so far; the last one is the current page.
 
         Returns:
             None
         """
 
-        if self.current_page > 0:
-            self.current_page -= 1
-            self.show_page(list, flag, username)
+        if len(page_cursors) > 1:
+            page_cursors.pop()
         else:
-            self.show_page(list, flag, username)
             print(Fore.RED + "\nInvalid action!" + Style.RESET_ALL)
 
     def show_patient_details(self, patient):
@@ -596,12 +619,10 @@ class Utils:
         Display details of a medical report.
 
         Args:
-            report (Report): The medical report object containing the report details.
+            report (ReportListing): The report listing row containing the report details and the medic's name.
         """
 
-        medic = self.controller.get_medic_by_username(report.get_username_medic())
-
-        print(f"\nReport issued on {report.get_date()} by the medic {medic.get_name()} {medic.get_lastname()}:")
+        print(f"\nReport issued on {report.get_date()} by the medic {report.get_medic_name()} {report.get_medic_lastname()}:")
         print(f"Analyses: {report.get_analyses()}")
         print(f"Diagnosis: {report.get_diagnosis()}")
         input("\nPress Enter to exit\n")
@@ -612,23 +633,23 @@ class Utils:
         Display details of a treatment plan.
 
         Args:
-            treat (TreatmentPlan): The treatment plan object containing the plan details.
+            treat (TreatmentPlanListing): The treatment plan listing row containing the plan details and the medic's name.
         """
 
         user = self.session.get_user()
         username = user.get_username()
         role = self.controller.get_role_by_username(username)
-        medic = self.controller.get_medic_by_username(treat.get_username_medic())
+        medic_fullname = f"{treat.get_medic_name()} {treat.get_medic_lastname()}"
 
         while True:
-            print(f"\nTreatment plan issued on {treat.get_date()} by the medic {medic.get_name()} {medic.get_lastname()}:")
+            print(f"\nTreatment plan issued on {treat.get_date()} by the medic {medic_fullname}:")
             print(f"Description: {treat.get_description()}")
             print(f"Treatment plan's start: {treat.get_start_date()}")
             print(f"Treatment plan's end: {treat.get_end_date()}")
             if role == "MEDIC":
                 action = input("\nEnter 'u' to update, or 'q' to quit: \n")
                 if action == "u" or action == "U":
-                    self.update_treat(treat, username)
+                    treat = self.update_treat(treat, username)
                 elif action == "q" or action == "Q":
                     print("Going back...\n")
                     break
@@ -643,15 +664,15 @@ class Utils:
         Update a treatment plan.
 
         Args:
-            treat (TreatmentPlan): The treatment plan object to be updated.
+            treat (TreatmentPlanRecord|TreatmentPlans): The treatment plan to be updated; read-only rows are upgraded to a model.
             medic_username (str): The username of the medic updating the treatment plan.
+
+        Returns:
+            TreatmentPlans: The editable treatment plan, holding the updated values if the update succeeded.
         """
-        while True:
-            password = getpass.getpass("Insert your password in order to proceed with the update: ")
-            if not self.controller.check_passwd(medic_username, password):
-                print(Fore.RED + "\nWrong password submitted. Try again...\n" + Style.RESET_ALL)
-            else:
-                break
+        if isinstance(treat, ReadModel):
+            treat = treat.to_model()
+        self.require_reauth(medic_username, "Insert your password in order to proceed with the update: ")
         
         print("\nEnter new treatment plan details (click Enter to keep current values):")
         new_description = input(f"Description ({treat.get_description()}): ").strip() or treat.get_description()
@@ -669,15 +690,15 @@ class Utils:
 
         if new_description != treat.get_description() or new_start_date != treat.get_start_date() or new_end_date != treat.get_end_date():
             try:
+                medic = self.controller.get_medic_by_username(medic_username)
+                updated_description = f"{treat.get_description()}. \nDescription updated on {self.today_date} by the medic {medic.get_name()} {medic.get_lastname()}: {new_description}"
                 try:
                     from_address_medic = self.controller.get_public_key_by_username(medic_username)
                     self.act_controller.manage_treatment_plan('update', treat.get_id_treatment_plan(),
                                                                 updated_description, new_start_date,
-                                                                new_end_date, from_address=from_address_medic)
+                                                                new_end_date, from_address=from_address_medic, wait=False)
                 except Exception as e:
                     log_error(e)
-                medic = self.controller.get_medic_by_username(medic_username)
-                updated_description = f"{treat.get_description()}. \nDescription updated on {self.today_date} by the medic {medic.get_name()} {medic.get_lastname()}: {new_description}"
                 treat.set_description(updated_description)
                 treat.set_start_date(new_start_date)
                 treat.set_end_date(new_end_date)
@@ -687,6 +708,26 @@ class Utils:
                 print(Fore.RED + f"An error occurred while updating the treatment plan: {e}" + Style.RESET_ALL)
         else:
             print("No changes made to the treatment plan.")
+        return treat
+
+    def require_reauth(self, username, prompt):
+
+        """
+        Asks the user to re-enter their password before a sensitive operation, unless they already did so
+        within the configured re-authentication window.
+
+        Args:
+            username (str): The username of the user performing the operation.
+            prompt (str): The message shown when asking for the password.
+        """
+
+        if self.controller.has_valid_reauth(username):
+            return
+        while True:
+            password = getpass.getpass(prompt)
+            if self.controller.reauthenticate(username, password):
+                break
+            print(Fore.RED + "\nWrong password submitted. Try again...\n" + Style.RESET_ALL)
 
     def add_report(self, username):
         """
@@ -702,12 +743,7 @@ class Utils:
         user = self.session.get_user()
         username_med = user.get_username()
 
-        while True:
-            password = getpass.getpass("\nInsert your password in order to proceed with the update: ")
-            if not self.controller.check_passwd(username_med, password):
-                print(Fore.RED + "\nWrong password submitted. Try again...\n" + Style.RESET_ALL)
-            else:
-                break
+        self.require_reauth(username_med, "\nInsert your password in order to proceed with the update: ")
 
         print("\nInsert the information regarding the new report...")
         while True:
@@ -722,14 +758,14 @@ class Utils:
             else: print(Fore.RED + "\nYou must enter report's informations" + Style.RESET_ALL)
 
            
-        try:
-            from_address_medic = self.controller.get_public_key_by_username(username_med)
-            self.act_controller.manage_report('add', analysis, diagnosis, from_address=from_address_medic)
-        except Exception as e:
-            log_error(e)
         result_code = self.controller.insert_report(username, username_med, analysis, diagnosis)
         
         if result_code == 0:
+            try:
+                from_address_medic = self.controller.get_public_key_by_username(username_med)
+                self.act_controller.manage_report('add', analysis, diagnosis, from_address=from_address_medic, coalesce=True)
+            except Exception as e:
+                log_error(e)
             print(Fore.GREEN + "\nNew report has been saved correctly." + Style.RESET_ALL)
         else:
             print(Fore.RED + "\nInternal error!" + Style.RESET_ALL)
@@ -748,12 +784,7 @@ class Utils:
         user = self.session.get_user()
         username_med = user.get_username()
 
-        while True:
-            password = getpass.getpass("\nInsert your password in order to proceed with the update: ")
-            if not self.controller.check_passwd(username_med, password):
-                print(Fore.RED + "\nWrong password submitted. Try again...\n" + Style.RESET_ALL)
-            else:
-                break
+        self.require_reauth(username_med, "\nInsert your password in order to proceed with the update: ")
 
         print("\nInsert the information regarding the new treatment plan...")
 
@@ -782,14 +813,14 @@ class Utils:
                 else: print(Fore.RED + "\nThe second date cannot come before the first date!" + Style.RESET_ALL)
             else: print(Fore.RED + "Invalid date or incorrect format." + Style.RESET_ALL)
         
-        try:
-            from_address_medic= self.controller.get_public_key_by_username(username_med)
-            self.act_controller.manage_treatment_plan('add', description, start_date, end_date, from_address=from_address_medic)
-        except Exception as e:
-            log_error(e)
         result_code = self.controller.insert_treatment_plan(username, username_med, description, start_date, end_date)
 
         if result_code == 0:
+            try:
+                from_address_medic= self.controller.get_public_key_by_username(username_med)
+                self.act_controller.manage_treatment_plan('add', description, start_date, end_date, from_address=from_address_medic, coalesce=True)
+            except Exception as e:
+                log_error(e)
             print(Fore.GREEN + "\nNew treatment plan has been saved correctly." + Style.RESET_ALL)
         else:
             print(Fore.RED + "\nInternal error!" + Style.RESET_ALL)
\ No newline at end of file
@@ -1,8 +1,13 @@
 import os
-import time
 import json
 from colorama import Fore, Style, init
+from config import config
 from controllers.deploy_controller import DeployController
+from controllers.event_ingestor import EventIngestor
+from controllers.gas_oracle import FeeOracle, GasEstimator
+from controllers.nonce_manager import NonceManager
+from controllers.receipt_tracker import ReceiptTracker
+from controllers.write_coalescer import WriteCoalescer
 from session.logging import log_msg, log_error
 from web3 import Web3
 
@@ -26,6 +31,12 @@ class ActionController:
         self.http_provider = http_provider
         self.w3 = Web3(Web3.HTTPProvider(self.http_provider))
         assert self.w3.is_connected(), Fore.RED + "Failed to connect to Ethereum node." + Style.RESET_ALL
+        self.receipt_tracker = ReceiptTracker(self.w3)
+        self.nonce_manager = NonceManager.shared(self.http_provider, self.w3)
+        self.fee_oracle = FeeOracle(self.w3)
+        self.gas_estimator = GasEstimator()
+        self.write_coalescer = WriteCoalescer(self.write_data)
+        self.event_ingestor = None
         self.load_contract()
 
     def load_contract(self):
@@ -88,7 +99,38 @@ class ActionController:
             log_error(f"Failed to read data from {function_name}: {str(e)}")
             raise e
 
-    def write_data(self, function_name, from_address, *args, gas=2000000, gas_price=None, nonce=None):
+    def read_many(self, calls, block_identifier=None, batch_size=None):
+        """
+        Reads many values from the contract, packing the calls into JSON-RPC batch requests instead of paying
+        one round trip per call, e.g. read_many(('patients', address) for address in addresses).
+
+        Args:
+            calls (iterable): Tuples (function_name, *args) of the contract functions to call.
+            block_identifier (int|str): The block to read the state at. Defaults to the latest block number, read
+                                        once, so that all the results come from the same snapshot even across batches.
+            batch_size (int): The number of calls per batch request.
+
+        Returns:
+            list: The result of each call, in the order of the calls.
+        """
+        calls = list(calls)
+        batch_size = batch_size or config.config.get("chain", {}).get("read_batch_size", 500)
+        if block_identifier is None:
+            block_identifier = self.w3.eth.block_number
+        results = []
+        try:
+            for start in range(0, len(calls), batch_size):
+                with self.w3.batch_requests() as batch:
+                    for function_name, *args in calls[start:start + batch_size]:
+                        batch.add(self.contract.functions[function_name](*args).call(block_identifier=block_identifier))
+                    results.extend(batch.execute())
+        except Exception as e:
+            log_error(f"Failed to read {len(calls)} values in batch at block {block_identifier}: {str(e)}")
+            raise e
+        log_msg(f"Read {len(calls)} values in {-(-len(calls) // batch_size)} batch requests at block {block_identifier}")
+        return results
+
+    def write_data(self, function_name, from_address, *args, gas=None, gas_price=None, nonce=None, wait=True):
         """
         Writes data to a contract's function.
 
@@ -96,43 +138,81 @@ class ActionController:
             function_name (str): The function name to call on the contract.
             from_address (str): The Ethereum address to send the transaction from.
             *args: Arguments required by the function.
-            gas (int): The gas limit for the transaction.
-            gas_price (int): The gas price for the transaction.
-            nonce (int): The nonce for the transaction.
+            gas (int): The gas limit for the transaction; by default estimated per function and argument size
+                       by the gas estimator, which learns from the gas used by the mined transactions.
+            gas_price (int): The (legacy) gas price for the transaction; by default the cached fees of the fee oracle.
+            nonce (int): The nonce for the transaction; by default the next one handed out by the nonce manager,
+                         so that several transactions from the same account can be in flight at once.
+            wait (bool): If True, blocks until the transaction is mined; if False, returns as soon as the
+                         transaction is submitted, leaving the receipt to the background receipt tracker.
 
         Returns:
-            The transaction receipt object.
+            The transaction receipt object if wait is True, otherwise a TxHandle resolved with the receipt once mined.
         """
         if not from_address:
             raise ValueError("Invalid 'from_address' provided. It must be a non-empty string representing an Ethereum address.")
-        tx_parameters = {
-            'from': from_address,
-            'gas': gas,
-            'gasPrice': gas_price or self.w3.eth.gas_price,
-            'nonce': nonce or self.w3.eth.get_transaction_count(from_address)
-        }
+        tx_parameters = {'from': from_address, **({'gasPrice': gas_price} if gas_price else self.fee_oracle.fees())}
         try:
             function = getattr(self.contract.functions, function_name)(*args)
-            tx_hash = function.transact(tx_parameters)
+            if gas is None:
+                gas = self.gas_estimator.gas_limit(function_name, args, lambda: function.estimate_gas({'from': from_address}))
+            tx_parameters['gas'] = gas
+            submit = lambda tx_nonce: function.transact({**tx_parameters, 'nonce': tx_nonce})
+            if nonce is not None:
+                tx_hash = submit(nonce)
+            else:
+                nonce, tx_hash = self.nonce_manager.send(from_address, submit)
+            fees = {key: value for key, value in tx_parameters.items() if key not in ('from', 'gas')}
+            if not wait:
+                handle = self.receipt_tracker.track(tx_hash, function_name, from_address, nonce)
+                handle.add_done_callback(lambda h: self._on_mined(h, function_name, args, gas, from_address, nonce))
+                log_msg(f"Transaction {function_name} submitted. From: {from_address}, Tx Hash: {handle.tx_hash}, Nonce: {nonce}, Gas: {gas}, Fees: {fees}")
+                return handle
             receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
+            self.nonce_manager.mark_done(from_address, nonce)
+            self.gas_estimator.observe(function_name, args, receipt, gas)
 
-            log_msg(f"Transaction {function_name} executed. From: {from_address}, Tx Hash: {tx_hash.hex()}, Gas: {gas}, Gas Price: {tx_parameters['gasPrice']}")
+            log_msg(f"Transaction {function_name} executed. From: {from_address}, Tx Hash: {tx_hash.hex()}, Gas: {gas}, Gas used: {receipt['gasUsed']}, Fees: {fees}")
             return receipt
 
         except Exception as e:
+            if 'underpriced' in str(e) or 'base fee' in str(e):
+                # The cached fees are behind the network: fetch them again for the next transaction
+                self.fee_oracle.invalidate()
             log_error(f"Error executing {function_name} from {from_address}. Error: {str(e)}")
             raise e
 
-    def listen_to_event(self):
+    def _on_mined(self, handle, function_name, args, gas, from_address, nonce):
         """
-        Listens to a specific event from the smart contract indefinitely.
+        Called once a tracked transaction left the node's pool: tells the nonce manager (a dropped transaction
+        leaves its nonce unused, so the account is resynchronized) and feeds the gas used to the gas estimator.
         """
-        event_filter = self.contract.events.ActionLogged.create_filter(fromBlock='latest')
-        while True:
-            entries = event_filter.get_new_entries()
-            for event in entries:
-                self.handle_action_logged(event)
-            time.sleep(10)
+        error = handle.future.exception()
+        receipt = handle.future.result() if error is None else getattr(error, 'receipt', None)
+        self.nonce_manager.mark_done(from_address, nonce, dropped=error is not None and receipt is None)
+        if receipt is not None:
+            self.gas_estimator.observe(function_name, args, receipt, gas)
+
+    def listen_to_events(self):
+        """
+        Starts ingesting the contract events in the background (see EventIngestor): the ingestion resumes from
+        the checkpoint of the previous run, so the events emitted while the application was down are not lost.
+
+        Returns:
+            EventIngestor: The running ingestor, or None if no contract is loaded.
+        """
+        if self.contract is None:
+            return None
+        if self.event_ingestor is None or self.event_ingestor.address != self.contract.address:
+            if self.event_ingestor is not None:
+                self.event_ingestor.stop()
+            self.event_ingestor = EventIngestor(self.w3, self.contract, handlers={
+                'ActionLogged': self.handle_action_logged,
+                'EntityRegistered': self.handle_entity_event,
+                'EntityUpdated': self.handle_entity_event,
+            })
+        self.event_ingestor.start()
+        return self.event_ingestor
 
     def handle_action_logged(self, event):
         """
@@ -143,7 +223,16 @@ class ActionController:
         """
         log_msg(f"New Action Logged: {event['args']}")
 
-    def register_entity(self, entity_type, *args, from_address):
+    def handle_entity_event(self, event):
+        """
+        Handles the registration and update events of medics, patients and caregivers by logging them.
+
+        Args:
+            event (dict): The event data returned by the blockchain.
+        """
+        log_msg(f"{event['event']}: {event['args']['entityType']} {event['args']['entityAddress']} (block {event['blockNumber']})")
+
+    def register_entity(self, entity_type, *args, from_address, wait=True):
         """
         Registers a new entity of a specified type in the contract.
 
@@ -151,9 +240,10 @@ class ActionController:
             entity_type (str): Type of the entity to register, e.g., 'medic', 'patient', 'caregiver'.
             *args: Additional arguments required by the contract function.
             from_address (str): The Ethereum address to send the transaction from.
+            wait (bool): If False, returns as soon as the transaction is submitted (see write_data).
 
         Returns:
-            The transaction receipt object.
+            The transaction receipt object, or a TxHandle if wait is False.
         
         Raises:
             ValueError: If no function is available for the specified entity type or the from_address is invalid.
@@ -168,9 +258,9 @@ class ActionController:
         function_name = entity_functions.get(entity_type)
         if not function_name:
             raise ValueError(Fore.RED + f"No function available for entity type {entity_type}" + Style.RESET_ALL)
-        return self.write_data(function_name, from_address, *args)
+        return self.write_data(function_name, from_address, *args, wait=wait)
 
-    def update_entity(self, entity_type, *args, from_address):
+    def update_entity(self, entity_type, *args, from_address, wait=True):
         """
         Updates an existing entity of a specified type in the contract.
 
@@ -178,9 +268,10 @@ class ActionController:
             entity_type (str): Type of the entity to update, e.g., 'medic', 'patient', 'caregiver'.
             *args: Additional arguments required by the contract function.
             from_address (str): The Ethereum address to send the transaction from.
+            wait (bool): If False, returns as soon as the transaction is submitted (see write_data).
 
         Returns:
-            The transaction receipt object.
+            The transaction receipt object, or a TxHandle if wait is False.
 
         Raises:
             ValueError: If no function is available for the specified entity type or the from_address is invalid.
@@ -195,9 +286,9 @@ class ActionController:
         function_name = update_functions.get(entity_type)
         if not function_name:
             raise ValueError(Fore.RED + f"No function available for entity type {entity_type}" + Style.RESET_ALL)
-        return self.write_data(function_name, from_address, *args)
+        return self.write_data(function_name, from_address, *args, wait=wait)
 
-    def manage_report(self, action, *args, from_address):
+    def manage_report(self, action, *args, from_address, wait=True, coalesce=False):
         """
         Manages reports by adding new reports.
 
@@ -205,9 +296,13 @@ class ActionController:
             action (str): The action to be performed, currently only 'add' is supported.
             *args: Additional arguments required by the contract function.
             from_address (str): The Ethereum address to send the transaction from.
+            wait (bool): If False, returns as soon as the transaction is submitted (see write_data).
+            coalesce (bool): If True, an 'add' is queued and sent with other ones in a single batch transaction
+                             (see WriteCoalescer); wait is then ignored.
 
         Returns:
-            The transaction receipt object.
+            The transaction receipt object, a TxHandle if wait is False, or a Future resolved with the receipt
+            of the batch transaction if the write is coalesced.
 
         Raises:
             ValueError: If no function is available for the specified action or the from_address is invalid.
@@ -220,9 +315,11 @@ class ActionController:
         function_name = report_functions.get(action)
         if not function_name:
             raise ValueError(Fore.RED + f"No function available for action {action}" + Style.RESET_ALL)
-        return self.write_data(function_name, from_address, *args)
+        if coalesce and action == 'add':
+            return self.write_coalescer.submit(function_name, from_address, *args)
+        return self.write_data(function_name, from_address, *args, wait=wait)
 
-    def manage_treatment_plan(self, action, *args, from_address):
+    def manage_treatment_plan(self, action, *args, from_address, wait=True, coalesce=False):
         """
         Manages treatment plans by adding or updating them.
 
@@ -230,9 +327,13 @@ class ActionController:
             action (str): The action to be performed, such as 'add' or 'update'.
             *args: Additional arguments required by the contract function.
             from_address (str): The Ethereum address to send the transaction from.
+            wait (bool): If False, returns as soon as the transaction is submitted (see write_data).
+            coalesce (bool): If True, an 'add' is queued and sent with other ones in a single batch transaction
+                             (see WriteCoalescer); wait is then ignored.
 
         Returns:
-            The transaction receipt object.
+            The transaction receipt object, a TxHandle if wait is False, or a Future resolved with the receipt
+            of the batch transaction if the write is coalesced.
 
         Raises:
             ValueError: If no function is available for the specified action or the from_address is invalid.
@@ -246,4 +347,6 @@ class ActionController:
         function_name = treatment_plan_functions.get(action)
         if not function_name:
             raise ValueError(Fore.RED + f"No function available for action {action}" + Style.RESET_ALL)
-        return self.write_data(function_name, from_address, *args)
+        if coalesce and action == 'add':
+            return self.write_coalescer.submit(function_name, from_address, *args)
+        return self.write_data(function_name, from_address, *args, wait=wait)
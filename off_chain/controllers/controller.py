@@ -1,9 +1,12 @@
 import re
 from datetime import datetime
 from colorama import Fore, Style, init
+from config import config
 from db.db_operations import DatabaseOperations
+from db.connection_manager import Rollback
+from db.kdf_executor import KDFBusyError
+from db.login_throttle import login_throttle, LOCAL_SOURCE
 from session.session import Session
-from models.credentials import Credentials
 
 class Controller:
     """
@@ -22,44 +25,102 @@ class Controller:
         self.__n_attempts_limit = 5 # Maximum number of login attempts before lockout.
         self.__timeout_timer = 180 # Timeout duration in seconds.
 
-    def registration(self, username: str, password: str, role: str, public_key: str, private_key: str):
+    def registration(self, username: str, password: str, role: str, public_key: str, private_key: str, profile: dict = None, patient: tuple = None):
         """
         Registers a new user in the database with the given credentials.
+        When the role-specific profile is provided too, credentials and profile are written in a single
+        unit of work: they are committed together, or not at all.
         
         :param username: The user's username.
         :param password: The user's password.
         :param role: The user's role in the system.
         :param public_key: The user's public key.
         :param private_key: The user's private key.
-        :return: A registration code indicating success or failure.
+        :param profile: Optional keyword arguments of the profile insertion for the given role (e.g. name, lastname, phone).
+        :param patient: Optional (username, profile) of the patient a caregiver takes care of, inserted in the same unit of work.
+        :return: A registration code: 0 on success, -1 if the username has been taken, -2 if the profile could not
+                 be saved, -3 if the service is too busy to hash the password.
         """
-        registration_code = self.db_ops.register_creds(username, password, role, public_key, private_key)
+        registration_code = -1
+        try:
+            with self.db_ops.transaction():
+                registration_code = self.db_ops.register_creds(username, password, role, public_key, private_key)
+                if registration_code == 0 and profile is not None:
+                    if self._insert_profile(role, username, profile, patient) != 0:
+                        registration_code = -2
+                        raise Rollback()
+        except KDFBusyError:
+            print(Fore.RED + 'The service is busy, please try again in a moment.' + Style.RESET_ALL)
+            return -3
+
+        if registration_code == 0 and profile is not None:
+            user = self.db_ops.get_user_by_username(username)
+            self.session.set_user(user)
 
         return registration_code
+
+    def _insert_profile(self, role: str, username: str, profile: dict, patient: tuple = None):
+        """
+        Inserts the role-specific profile of a user, joining the enclosing unit of work if any.
+
+        :param role: The user's role in the system ('PATIENT', 'MEDIC' or 'CAREGIVER').
+        :param username: The user's username.
+        :param profile: Keyword arguments of the profile insertion for the given role.
+        :param patient: Optional (username, profile) of the patient a caregiver takes care of, inserted first.
+        :return: An insertion code indicating success (0) or failure (-1).
+        """
+        if patient is not None:
+            username_patient, patient_profile = patient
+            if self.db_ops.insert_patient(username=username_patient, **patient_profile) != 0:
+                return -1
+        insert_functions = {
+            'PATIENT': self.db_ops.insert_patient,
+            'MEDIC': self.db_ops.insert_medic,
+            'CAREGIVER': self.db_ops.insert_caregiver
+        }
+        insert_function = insert_functions.get(role.upper())
+        if insert_function is None:
+            return -1
+        return insert_function(username=username, **profile)
     
-    def login(self, username: str, password: str, public_key: str, private_key: str):
+    def login(self, username: str, password: str, public_key: str, private_key: str, source: str = LOCAL_SOURCE):
         """
         Attempts to log a user in by validating credentials and handling session attempts.
+        Failed attempts are also counted in the database, per username and source, so the limit holds across
+        processes and restarts; while a username is locked out its password is not even verified.
+        Credentials and profile are fetched with a single query, then the password is verified once.
         
         :param username: The user's username.
         :param password: The user's password.
         :param public_key: The user's public key.
         :param private_key: The user's private key.
-        :return: Tuple containing a status code and the user's role, if successful.
+        :param source: Where the attempt comes from (e.g. a client address); defaults to this host.
+        :return: Tuple containing a status code and the user's role, if successful; the status code is -3 if the
+                 password could not be verified because the service is busy (the attempt is not counted).
         """
-        if(self.check_attempts() and self.db_ops.check_credentials(username, password, public_key, private_key)):
-            creds: Credentials = self.db_ops.get_creds_by_username(username)
+        if not self.check_attempts():
+            return -2, None
+        locked_for = login_throttle.locked_for(username, source)
+        if locked_for > 0:
+            self.session.set_error_attempts_timeout(locked_for)
+            return -2, None
+        try:
+            login = self.db_ops.authenticate(username, password, public_key, private_key)
+        except KDFBusyError:
+            return -3, None
+        if login is not None:
+            login_throttle.reset(username, source)
+            creds, user = login
             user_role = creds.get_role()
-            user = self.db_ops.get_user_by_username(username)
             self.session.set_user(user)
             return 0, user_role
-        elif self.check_attempts():
-            self.session.increment_attempts()
-            if self.session.get_attempts() == self.__n_attempts_limit:
-                self.session.set_error_attempts_timeout(self.__timeout_timer)
-            return -1, None
-        else:
-            return -2, None
+        self.session.increment_attempts()
+        if self.session.get_attempts() == self.__n_attempts_limit:
+            self.session.set_error_attempts_timeout(self.__timeout_timer)
+        locked_for = login_throttle.record_failure(username, source)
+        if locked_for > self.session.get_timeout_left():
+            self.session.set_error_attempts_timeout(locked_for)
+        return -1, None
     
     def insert_patient_info(self, username: str, name: str, lastname: str, birthday: str, birth_place: str, residence: str, autonomous: bool, phone: str):
         """
@@ -106,7 +167,7 @@ class Controller:
 
         return insertion_code
     
-    def insert_caregiver_info(self, username: str, name: str, lastname: str, username_patient: int, relationship: str, phone: str):
+    def insert_caregiver_info(self, username: str, name: str, lastname: str, username_patient: int, relationship: str, phone: str, patient: tuple = None):
         """
         Inserts caregiver information into the database, associating the caregiver with a patient.
 
@@ -117,9 +178,15 @@ class Controller:
         :param username_patient: The username or identifier of the patient for whom the caregiver is responsible.
         :param relationship: The relationship of the caregiver to the patient (e.g., parent, sibling, professional).
         :param phone: The phone number of the caregiver.
+        :param patient: Optional (username, profile) of the patient, inserted in the same unit of work as the caregiver.
         :return: An insertion code indicating success (0) or failure of the operation. Success also triggers setting the user in the session and prints 'DONE'.
         """
-        insertion_code = self.db_ops.insert_caregiver(username, name, lastname, username_patient, relationship, phone)
+        profile = {'name': name, 'lastname': lastname, 'username_patient': username_patient,
+                   'relationship': relationship, 'phone': phone}
+        with self.db_ops.transaction():
+            insertion_code = self._insert_profile('CAREGIVER', username, profile, patient)
+            if insertion_code != 0:
+                raise Rollback()
 
         if insertion_code == 0:
             user = self.db_ops.get_user_by_username(username) 
@@ -285,7 +352,28 @@ class Controller:
         return self.db_ops.key_exists(public_key, private_key)
     
     def check_passwd(self, username, password):
-        return self.db_ops.check_passwd(username, password)
+        try:
+            return self.db_ops.check_passwd(username, password)
+        except KDFBusyError:
+            print(Fore.RED + 'The service is busy, please try again in a moment.' + Style.RESET_ALL)
+            return False
+    
+    def reauthenticate(self, username, password):
+        """
+        Verifies a user's password before a sensitive operation and, if it is correct, grants the session
+        a re-authentication window during which the following operations skip the check.
+
+        :param username: The username of the user performing the operation.
+        :param password: The password re-entered by the user.
+        :return: True if the password is correct, False otherwise.
+        """
+        if not self.check_passwd(username, password):
+            return False
+        self.session.grant_reauth(username, config.config.get("reauth_window", 0))
+        return True
+    
+    def has_valid_reauth(self, username):
+        return self.session.has_valid_reauth(username)
     
     def check_unique_phone_number(self, phone):
         return self.db_ops.check_unique_phone_number(phone)
@@ -305,6 +393,8 @@ class Controller:
         if self.db_ops.check_passwd(username, old_pass):
             try:
                 response = self.db_ops.change_passwd(username, old_pass, new_pass)
+                if response == 0:
+                    self.session.revoke_reauth()
                 return response
             except:
                 return -2
@@ -327,15 +417,42 @@ class Controller:
     def get_medic_by_username(self, username):
         return self.db_ops.get_medic_by_username(username)
     
+    def get_cache_stats(self):
+        return self.db_ops.get_cache_stats()
+    
     def get_reports_list_by_username(self, username):
         return self.db_ops.get_reports_list_by_username(username)
     
     def get_treatplan_list_by_username(self, username):
         return self.db_ops.get_treatplan_list_by_username(username)
     
+    def get_reports_page(self, username, cursor=None, limit=10):
+        return self.db_ops.get_reports_page(username, cursor, limit)
+    
+    def get_treatplan_page(self, username, cursor=None, limit=10):
+        return self.db_ops.get_treatplan_page(username, cursor, limit)
+    
     def get_role_by_username(self, username):
         return self.db_ops.get_role_by_username(username)
     
     def get_patients(self):
         return self.db_ops.get_patients()
+    
+    def get_patients_page(self, cursor=None, limit=10):
+        return self.db_ops.get_patients_page(cursor, limit)
+    
+    def search_patients(self, prefix, limit=10):
+        return self.db_ops.search_patients(prefix, limit)
+    
+    def search_medical_records(self, text, username_patient=None, limit=20):
+        return self.db_ops.search_medical_records(text, username_patient, limit)
+    
+    def iter_patients(self, **filters):
+        return self.db_ops.iter_patients(**filters)
+    
+    def iter_reports(self, username=None, **filters):
+        return self.db_ops.iter_reports(username, **filters)
+    
+    def iter_treatment_plans(self, username=None, **filters):
+        return self.db_ops.iter_treatment_plans(username, **filters)
     
\ No newline at end of file
@@ -0,0 +1,173 @@
+"""
+This module ingests the events emitted by the contract into the database.
+Events are fetched with eth_getLogs over block ranges starting from a checkpoint persisted in the database:
+after a restart the ingestion resumes where it stopped, backfilling everything emitted in the meantime, and then
+follows the head of the chain. The range of each request adapts to the node, shrinking when a request fails
+(too many results, timeouts) and growing again after successful ones.
+Each range is recorded in a single transaction together with the checkpoint, and every event is handled only
+when it is first inserted, so events are handled exactly once even across crashes and concurrent ingestors.
+"""
+
+import json
+import threading
+import time
+
+from config import config
+from db.connection_manager import connection_manager
+from session.logging import log_msg, log_error
+
+class EventIngestor:
+    """
+    Background ingestion of the ActionLogged, EntityRegistered and EntityUpdated events of a contract.
+    Handlers are called in chain order, inside the transaction recording the event: whatever they write
+    to the database is committed (or rolled back) together with the event and the checkpoint.
+    """
+
+    EVENTS = ('ActionLogged', 'EntityRegistered', 'EntityUpdated')
+
+    def __init__(self, w3, contract, handlers=None, start_block=None, poll_interval=None, max_range=None,
+                 confirmations=None):
+        """
+        Initializes the ingestor; call start() to ingest in the background, or run_once() to catch up synchronously.
+
+        Args:
+            w3 (Web3): The connection to the Ethereum node.
+            contract (Contract): The deployed contract whose events are ingested.
+            handlers (dict): Callables by event name, called with the decoded event (args, blockNumber, ...).
+            start_block (int): The first block to ingest when there is no checkpoint yet.
+            poll_interval (float): Seconds between two checks for new blocks once the ingestion caught up.
+            max_range (int): The largest block range requested at once.
+            confirmations (int): Blocks to leave between the head and the ingested blocks, to avoid reorgs.
+        """
+        chain_config = config.config.get("chain", {})
+        self.w3 = w3
+        self.contract = contract
+        self.handlers = dict(handlers or {})
+        self.start_block = chain_config.get("event_start_block", 0) if start_block is None else start_block
+        self.poll_interval = poll_interval or chain_config.get("event_poll_interval", 1.0)
+        self.max_range = max_range or chain_config.get("event_max_range", 2000)
+        self.confirmations = chain_config.get("event_confirmations", 0) if confirmations is None else confirmations
+        self.range = self.max_range
+        self.address = contract.address
+        self._events = {}
+        for name in self.EVENTS:
+            event = getattr(contract.events, name)()
+            self._events[self._hex(event.topic)] = event
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def on(self, event_name, handler):
+        """
+        Registers the handler of an event, replacing the previous one.
+
+        Args:
+            event_name (str): One of EVENTS.
+            handler (callable): Called with the decoded event.
+        """
+        if event_name not in self.EVENTS:
+            raise ValueError(f"Unsupported event: {event_name}")
+        self.handlers[event_name] = handler
+
+    def checkpoint(self):
+        """
+        Returns the last block whose events have all been ingested.
+
+        Returns:
+            int: The block number, start_block - 1 if nothing has been ingested yet.
+        """
+        row = connection_manager.get_connection().execute(
+            "SELECT last_block FROM EventCheckpoints WHERE contract_address = ?", (self.address,)).fetchone()
+        return row[0] if row else self.start_block - 1
+
+    def run_once(self):
+        """
+        Ingests every block between the checkpoint and the head of the chain.
+
+        Returns:
+            int: The number of new events handled.
+
+        Raises:
+            Exception: The error of the node if even a single-block request fails.
+        """
+        head = self.w3.eth.block_number - self.confirmations
+        from_block = self.checkpoint() + 1
+        handled = 0
+        while from_block <= head and not self._stopped.is_set():
+            to_block = min(from_block + self.range - 1, head)
+            try:
+                logs = self.w3.eth.get_logs({
+                    'address': self.address,
+                    'fromBlock': from_block,
+                    'toBlock': to_block,
+                    'topics': [list(self._events)],
+                })
+            except Exception as e:
+                if self.range == 1:
+                    raise
+                self.range = max(1, self.range // 2)
+                log_msg(f"Event query {from_block}-{to_block} failed ({e}), retrying with ranges of {self.range} blocks")
+                continue
+            handled += self._ingest(logs, to_block)
+            from_block = to_block + 1
+            self.range = min(self.max_range, self.range * 2)
+        return handled
+
+    def start(self):
+        """
+        Starts ingesting in the background: catches up from the checkpoint, then follows the head.
+        """
+        if self._thread is None or not self._thread.is_alive():
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="event-ingestor", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        """
+        Stops the background ingestion; it resumes from the checkpoint when started again.
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                log_error(f"Event ingestion failed: {e}")
+            self._stopped.wait(self.poll_interval)
+
+    def _ingest(self, logs, to_block):
+        events = sorted((self._events[self._hex(log['topics'][0])].process_log(log) for log in logs),
+                        key=lambda event: (event['blockNumber'], event['logIndex']))
+        handled = 0
+        now = time.time()
+        with connection_manager.transaction() as conn:
+            for event in events:
+                cursor = conn.execute("""
+                        INSERT OR IGNORE INTO ChainEvents
+                        (tx_hash, log_index, contract_address, block_number, event_name, args, ingested_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                        (self._hex(event['transactionHash']), event['logIndex'], self.address, event['blockNumber'],
+                         event['event'], json.dumps(dict(event['args']), default=str), now))
+                # Already ingested, by a previous run or by another process
+                if cursor.rowcount == 0:
+                    continue
+                handler = self.handlers.get(event['event'])
+                if handler is not None:
+                    handler(event)
+                handled += 1
+            conn.execute("""
+                    INSERT INTO EventCheckpoints (contract_address, last_block, updated_at) VALUES (?, ?, ?)
+                    ON CONFLICT(contract_address) DO UPDATE
+                    SET last_block = MAX(last_block, excluded.last_block), updated_at = excluded.updated_at""",
+                    (self.address, to_block, now))
+        return handled
+
+    @staticmethod
+    def _hex(value):
+        if isinstance(value, (bytes, bytearray)):
+            value = value.hex()
+        value = str(value).lower()
+        return value if value.startswith("0x") else "0x" + value
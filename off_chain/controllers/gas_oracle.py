@@ -0,0 +1,192 @@
+"""
+This module prices and sizes the transactions sent to the contract without querying the node for every write.
+The FeeOracle caches the network fees for a few seconds, in legacy (gasPrice) or EIP-1559
+(maxFeePerGas/maxPriorityFeePerGas) form; the GasEstimator estimates the gas limit of each contract function
+once per number of records and size of its arguments and then refines it with the gas actually used by the mined
+transactions.
+"""
+
+import math
+import threading
+import time
+
+from config import config
+
+# Gas of a plain transfer, the lowest limit a transaction can have
+MIN_GAS = 21000
+
+class FeeOracle:
+    """
+    Thread-safe cache of the fee parameters of new transactions.
+    """
+
+    def __init__(self, w3, mode=None, ttl=None, base_fee_multiplier=None):
+        """
+        Initializes the oracle; fees are fetched on the first request.
+
+        Args:
+            w3 (Web3): The connection to the Ethereum node.
+            mode (str): 'legacy' for a gasPrice, 'eip1559' for a maxFeePerGas and a maxPriorityFeePerGas,
+                        'auto' to use EIP-1559 when the latest block has a base fee.
+            ttl (float): Seconds the fees are reused before being fetched again.
+            base_fee_multiplier (float): How many times the current base fee maxFeePerGas allows, so that
+                                         transactions stay valid while the base fee rises over the next blocks.
+        """
+        chain_config = config.config.get("chain", {})
+        mode = mode or chain_config.get("fee_mode", "auto")
+        if mode not in ("auto", "legacy", "eip1559"):
+            raise ValueError(f"Unsupported fee mode: {mode}")
+        self.w3 = w3
+        self.mode = mode
+        self.ttl = chain_config.get("fee_ttl", 15) if ttl is None else ttl
+        self.base_fee_multiplier = base_fee_multiplier or chain_config.get("base_fee_multiplier", 2)
+        self._fees = None
+        self._expires_at = 0
+        self._lock = threading.Lock()
+
+    def fees(self):
+        """
+        Returns the fee parameters to add to a transaction, fetching them from the node if the cached ones expired.
+
+        Returns:
+            dict: Either {'gasPrice': ...} or {'maxFeePerGas': ..., 'maxPriorityFeePerGas': ...}.
+        """
+        with self._lock:
+            if self._fees is None or time.monotonic() >= self._expires_at:
+                self._fees = self._fetch()
+                self._expires_at = time.monotonic() + self.ttl
+            return dict(self._fees)
+
+    def invalidate(self):
+        """
+        Forgets the cached fees, e.g. after the node refused a transaction as underpriced.
+        """
+        with self._lock:
+            self._fees = None
+
+    def _fetch(self):
+        if self.mode != "legacy":
+            base_fee = self.w3.eth.get_block('latest').get("baseFeePerGas")
+            if base_fee is not None:
+                priority_fee = self.w3.eth.max_priority_fee
+                return {"maxFeePerGas": int(base_fee * self.base_fee_multiplier) + priority_fee,
+                        "maxPriorityFeePerGas": priority_fee}
+            if self.mode == "eip1559":
+                raise ValueError("The node does not support EIP-1559 fees")
+        return {"gasPrice": self.w3.eth.gas_price}
+
+class GasEstimator:
+    """
+    Thread-safe memo of the gas limits of the contract functions, keyed by function name, number of records
+    (batch functions pay the storage and the action log of every record) and argument size bucket: the gas of
+    the contract functions grows with the length of the strings they store. Each estimate remembers the argument
+    size it was taken at, and a larger call of the same bucket is estimated again instead of reusing it.
+    """
+
+    def __init__(self, margin=None):
+        """
+        Initializes an empty memo.
+
+        Args:
+            margin (float): Factor applied to the estimated or observed gas to obtain the gas limit.
+        """
+        self.margin = margin or config.config.get("chain", {}).get("gas_margin", 1.2)
+        # (function name, items, bucket) -> [argument size of the estimate, node estimate,
+        #                                    highest gas used by a mined call of at least that size or None]
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def size(args):
+        """
+        Returns the encoded size of the arguments of a call: the length of the strings, 32 bytes for other values.
+
+        Args:
+            args (tuple): The arguments of the contract function.
+
+        Returns:
+            int: The size, in bytes.
+        """
+        size = 0
+        for arg in args:
+            if isinstance(arg, (str, bytes, bytearray)):
+                size += len(arg)
+            elif isinstance(arg, (list, tuple)):
+                size += sum(len(item) if isinstance(item, (str, bytes, bytearray)) else 32 for item in arg)
+            else:
+                size += 32
+        return size
+
+    @classmethod
+    def key(cls, function_name, args):
+        """
+        Returns the memo key of a call: its function, its number of records (the length of the array arguments
+        of a batch function, 1 otherwise) and its size bucket, a quarter of a power of two wide.
+
+        Args:
+            function_name (str): The contract function called.
+            args (tuple): The arguments of the call.
+
+        Returns:
+            tuple: The key.
+        """
+        items = max((len(arg) for arg in args if isinstance(arg, (list, tuple))), default=1)
+        size = cls.size(args)
+        # Bit length plus the two following bits: 4 buckets between consecutive powers of two
+        bucket = (size.bit_length(), size >> max(0, size.bit_length() - 3))
+        return function_name, items, bucket
+
+    def gas_limit(self, function_name, args, estimate):
+        """
+        Returns the gas limit of a call, asking the node only for the first call of its bucket and for the
+        calls larger than the one the cached estimate was taken at.
+
+        Args:
+            function_name (str): The contract function called.
+            args (tuple): The arguments of the call.
+            estimate (callable): Returns the node's estimate of the gas of the call (e.g. estimate_gas).
+
+        Returns:
+            int: The gas limit to send the transaction with.
+        """
+        key = self.key(function_name, args)
+        size = self.size(args)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and size <= entry[0]:
+                return self._limit(entry)
+        # Concurrent calls may both estimate: the largest size wins
+        gas = estimate()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or size > entry[0]:
+                entry = self._entries[key] = [size, gas, None]
+            return self._limit(entry)
+
+    def observe(self, function_name, args, receipt, gas_limit):
+        """
+        Refines the gas limit of a bucket with the receipt of a mined transaction.
+        Successful transactions as large as the estimate bring the limit to the highest gas actually used;
+        a transaction that reverted after consuming its whole limit most likely ran out of gas, so the limit is raised.
+
+        Args:
+            function_name (str): The contract function called.
+            args (tuple): The arguments of the call.
+            receipt (dict): The receipt of the transaction.
+            gas_limit (int): The gas limit the transaction was sent with.
+        """
+        key = self.key(function_name, args)
+        size = self.size(args)
+        gas_used = receipt["gasUsed"]
+        with self._lock:
+            entry = self._entries.setdefault(key, [size, gas_used, None])
+            if receipt["status"] == 1:
+                # Smaller calls used less gas than the largest one of the bucket would
+                if size >= entry[0]:
+                    entry[0], entry[2] = size, max(entry[2] or 0, gas_used)
+            elif gas_used >= gas_limit:
+                entry[1], entry[2] = math.ceil(gas_limit * self.margin), None
+
+    def _limit(self, entry):
+        _, estimate, observed = entry
+        return max(MIN_GAS, math.ceil((observed or estimate) * self.margin))
@@ -0,0 +1,141 @@
+"""
+This module hands out transaction nonces locally, so that one account can have many transactions in flight.
+The next nonce of each account is read from the node once (counting the transactions still in its pool,
+which also covers a restart of the application) and then incremented locally for every submission;
+when the node reports a nonce error the account is resynchronized and the submission retried.
+"""
+
+import threading
+
+from session.logging import log_msg
+
+# Fragments of the errors returned by the nodes (geth, ganache, ...) when a nonce is already used or out of order
+NONCE_ERRORS = ("nonce too low", "nonce too high", "already known", "replacement transaction underpriced",
+                "correct nonce", "invalid nonce")
+
+def is_nonce_error(error):
+    """
+    Tells whether a submission failed because of its nonce.
+
+    Args:
+        error (Exception): The error raised by the submission.
+
+    Returns:
+        bool: True if the node rejected the transaction because of its nonce.
+    """
+    message = str(error).lower()
+    return any(fragment in message for fragment in NONCE_ERRORS)
+
+class NonceManager:
+    """
+    Thread-safe allocator of the nonces of the accounts sending transactions through a node.
+    Submissions from the same account are serialized only for the time it takes the node to accept them,
+    never while waiting for them to be mined.
+    """
+
+    _shared = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, w3):
+        """
+        Initializes the manager for a node.
+
+        Args:
+            w3 (Web3): The connection to the Ethereum node.
+        """
+        self.w3 = w3
+        self._next = {}
+        self._pending = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, key, w3):
+        """
+        Returns the manager shared by every controller talking to the same node, creating it if needed:
+        two managers handing out nonces for the same account would collide.
+
+        Args:
+            key (str): Identifies the node, e.g. its HTTP provider URL.
+            w3 (Web3): The connection to the node, used if the manager has to be created.
+
+        Returns:
+            NonceManager: The manager of the node.
+        """
+        with cls._shared_lock:
+            if key not in cls._shared:
+                cls._shared[key] = cls(w3)
+            return cls._shared[key]
+
+    def _account_lock(self, account):
+        with self._lock:
+            return self._locks.setdefault(account, threading.Lock())
+
+    def send(self, account, submit):
+        """
+        Submits a transaction from an account with the next local nonce.
+
+        Args:
+            account (str): The address sending the transaction.
+            submit (callable): Called with the nonce to use; submits the transaction and returns its hash.
+
+        Returns:
+            tuple[int, object]: The nonce used and the value returned by submit.
+
+        Raises:
+            Exception: Whatever submit raises, once a nonce error has already been retried after a resync.
+        """
+        key = account.lower()
+        with self._account_lock(key):
+            for attempt in range(2):
+                nonce = self._next.get(key)
+                if nonce is None:
+                    nonce = self._sync(key, account)
+                try:
+                    result = submit(nonce)
+                except Exception as e:
+                    if attempt == 0 and is_nonce_error(e):
+                        log_msg(f"Nonce {nonce} rejected for {account} ({e}), resynchronizing with the node")
+                        self._next.pop(key, None)
+                        continue
+                    # The node did not accept the transaction, so the nonce is still free
+                    raise
+                self._next[key] = nonce + 1
+                self._pending.setdefault(key, set()).add(nonce)
+                return nonce, result
+
+    def mark_done(self, account, nonce, dropped=False):
+        """
+        Records that a transaction is no longer in flight.
+
+        Args:
+            account (str): The address that sent the transaction.
+            nonce (int): The nonce of the transaction.
+            dropped (bool): True if the node dropped the transaction without mining it: its nonce is free again,
+                            so the account is resynchronized before its next submission.
+        """
+        key = account.lower()
+        with self._account_lock(key):
+            self._pending.get(key, set()).discard(nonce)
+            if dropped:
+                self._next.pop(key, None)
+
+    def pending_nonces(self, account):
+        """
+        Returns the nonces of the transactions of an account submitted but not yet mined.
+        """
+        with self._account_lock(account.lower()):
+            return sorted(self._pending.get(account.lower(), set()))
+
+    def resync(self, account):
+        """
+        Forgets the local nonce of an account; the next submission reads it again from the node.
+        """
+        key = account.lower()
+        with self._account_lock(key):
+            self._next.pop(key, None)
+
+    def _sync(self, key, account):
+        nonce = self.w3.eth.get_transaction_count(account, 'pending')
+        self._next[key] = nonce
+        return nonce
@@ -0,0 +1,259 @@
+"""
+This module tracks the transactions submitted to the blockchain without blocking the caller.
+Submitted transactions are recorded in the ChainTransactions table and handed to a background thread,
+which watches the new blocks for all of them at once, resolves their handles when they are mined,
+and persists their final status; transactions still pending when the application stops are resumed
+the next time the tracker starts.
+"""
+
+import threading
+import time
+from concurrent.futures import Future
+
+from web3.exceptions import TransactionNotFound
+
+from config import config
+from db.connection_manager import connection_manager
+from session.logging import log_msg, log_error
+
+class TransactionFailed(Exception):
+    """
+    Raised by a transaction handle when the transaction was mined but reverted, or dropped by the node.
+    """
+
+    def __init__(self, message, receipt=None):
+        super().__init__(message)
+        self.receipt = receipt
+
+class TxHandle:
+    """
+    Handle of a submitted transaction, resolved by the ReceiptTracker once the transaction is mined.
+    """
+
+    def __init__(self, tx_hash, function_name):
+        """
+        Initializes a pending handle.
+
+        Args:
+            tx_hash (str): The hash of the transaction, as a 0x-prefixed hex string.
+            function_name (str): The contract function the transaction calls.
+        """
+        self.tx_hash = tx_hash
+        self.function_name = function_name
+        self.future = Future()
+
+    def done(self):
+        """
+        Returns True once the transaction has been mined or dropped.
+        """
+        return self.future.done()
+
+    def result(self, timeout=None):
+        """
+        Waits for the transaction to be mined.
+
+        Args:
+            timeout (float|None): The maximum number of seconds to wait, or None to wait indefinitely.
+
+        Returns:
+            The transaction receipt.
+
+        Raises:
+            TransactionFailed: If the transaction reverted or was dropped.
+            concurrent.futures.TimeoutError: If the transaction is still pending after timeout seconds.
+        """
+        return self.future.result(timeout)
+
+    def add_done_callback(self, callback):
+        """
+        Calls callback(handle) once the transaction has been mined or dropped, from the tracker thread
+        (or right away if it already has).
+        """
+        self.future.add_done_callback(lambda _: callback(self))
+
+    def __repr__(self):
+        return f"TxHandle({self.function_name}, {self.tx_hash})"
+
+class ReceiptTracker:
+    """
+    Background tracker resolving the handles of submitted transactions.
+    At each poll a single call checks whether new blocks were mined; only then the new blocks are fetched,
+    once each, and matched against every pending transaction, so the cost does not grow with their number.
+    """
+
+    def __init__(self, w3, poll_interval=None, drop_timeout=None):
+        """
+        Initializes the tracker; its thread is started on the first submission.
+
+        Args:
+            w3 (Web3): The connection to the Ethereum node.
+            poll_interval (float): Seconds between two checks for new blocks.
+            drop_timeout (float): Seconds after which a transaction unknown to the node is considered dropped.
+        """
+        chain_config = config.config.get("chain", {})
+        self.w3 = w3
+        self.poll_interval = poll_interval or chain_config.get("receipt_poll_interval", 1.0)
+        self.drop_timeout = drop_timeout or chain_config.get("receipt_drop_timeout", 300)
+        self._pending = {}
+        self._unchecked = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._last_block = None
+
+    def track(self, tx_hash, function_name, from_address, nonce=None):
+        """
+        Records a submitted transaction and starts tracking it.
+
+        Args:
+            tx_hash (str|bytes): The hash returned by the node on submission.
+            function_name (str): The contract function the transaction calls.
+            from_address (str): The address the transaction was sent from.
+            nonce (int|None): The nonce of the transaction, if known.
+
+        Returns:
+            TxHandle: The handle resolved when the transaction is mined.
+        """
+        tx_hash = self._normalize(tx_hash)
+        now = time.time()
+        with connection_manager.transaction() as conn:
+            conn.execute("""
+                    INSERT OR REPLACE INTO ChainTransactions
+                    (tx_hash, function_name, from_address, nonce, status, submitted_at, updated_at)
+                    VALUES (?, ?, ?, ?, 'PENDING', ?, ?)""", (tx_hash, function_name, from_address, nonce, now, now))
+        handle = TxHandle(tx_hash, function_name)
+        with self._lock:
+            self._pending[tx_hash] = (handle, now)
+            self._unchecked.add(tx_hash)
+        self._start()
+        self._wakeup.set()
+        return handle
+
+    def resume(self):
+        """
+        Resumes tracking the transactions left pending by a previous run of the application.
+
+        Returns:
+            list[TxHandle]: The handles of the resumed transactions.
+        """
+        rows = connection_manager.get_connection().execute("""
+                SELECT tx_hash, function_name, submitted_at
+                FROM ChainTransactions
+                WHERE status = 'PENDING'""").fetchall()
+        handles = []
+        with self._lock:
+            for tx_hash, function_name, submitted_at in rows:
+                if tx_hash not in self._pending:
+                    handle = TxHandle(tx_hash, function_name)
+                    self._pending[tx_hash] = (handle, submitted_at)
+                    self._unchecked.add(tx_hash)
+                    handles.append(handle)
+        if handles:
+            self._start()
+        return handles
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending)
+
+    def stop(self, timeout=None):
+        """
+        Stops the background thread; pending transactions stay recorded and can be resumed later.
+        """
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopped.clear()
+                self._thread = threading.Thread(target=self._run, name="receipt-tracker", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self.poll()
+            except Exception as e:
+                log_error(f"Receipt tracker poll failed: {e}")
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def poll(self):
+        """
+        Checks the blocks mined since the last poll for the pending transactions, and resolves those found.
+        Called periodically by the background thread.
+        """
+        with self._lock:
+            pending = dict(self._pending)
+            unchecked, self._unchecked = self._unchecked, set()
+        if not pending:
+            # Nothing to watch: new submissions are checked directly, so idle blocks never need a scan
+            self._last_block = None
+            return
+        try:
+            latest = self.w3.eth.block_number
+            # Transactions tracked since the last poll may be in blocks that have already been scanned
+            for tx_hash in unchecked:
+                self._check_receipt(tx_hash)
+            if self._last_block is not None:
+                for number in range(self._last_block + 1, latest + 1):
+                    block = self.w3.eth.get_block(number)
+                    for tx_hash in block["transactions"]:
+                        tx_hash = self._normalize(tx_hash)
+                        if tx_hash in pending and tx_hash not in unchecked:
+                            self._check_receipt(tx_hash)
+        except Exception:
+            with self._lock:
+                self._unchecked |= {tx_hash for tx_hash in unchecked if tx_hash in self._pending}
+            raise
+        self._last_block = latest
+        self._check_dropped(pending)
+
+    def _check_receipt(self, tx_hash):
+        try:
+            receipt = self.w3.eth.get_transaction_receipt(tx_hash)
+        except TransactionNotFound:
+            return
+        self._resolve(tx_hash, 'SUCCESS' if receipt["status"] == 1 else 'FAILED', receipt)
+
+    def _check_dropped(self, pending):
+        now = time.time()
+        for tx_hash, (_, submitted_at) in pending.items():
+            if now - submitted_at < self.drop_timeout:
+                continue
+            try:
+                self.w3.eth.get_transaction(tx_hash)
+            except TransactionNotFound:
+                self._resolve(tx_hash, 'DROPPED', None)
+
+    def _resolve(self, tx_hash, status, receipt):
+        with self._lock:
+            entry = self._pending.pop(tx_hash, None)
+        if entry is None:
+            return
+        handle = entry[0]
+        block_number = receipt["blockNumber"] if receipt is not None else None
+        gas_used = receipt["gasUsed"] if receipt is not None else None
+        with connection_manager.transaction() as conn:
+            conn.execute("""
+                    UPDATE ChainTransactions
+                    SET status = ?, block_number = ?, gas_used = ?, updated_at = ?
+                    WHERE tx_hash = ?""", (status, block_number, gas_used, time.time(), tx_hash))
+        if status == 'SUCCESS':
+            log_msg(f"Transaction {handle.function_name} mined. Tx Hash: {tx_hash}, Block: {block_number}, Gas used: {gas_used}")
+            handle.future.set_result(receipt)
+        else:
+            log_error(f"Transaction {handle.function_name} {status.lower()}. Tx Hash: {tx_hash}")
+            handle.future.set_exception(TransactionFailed(f"Transaction {tx_hash} {status.lower()}", receipt))
+
+    @staticmethod
+    def _normalize(tx_hash):
+        if isinstance(tx_hash, (bytes, bytearray)):
+            tx_hash = tx_hash.hex()
+        tx_hash = str(tx_hash).lower()
+        return tx_hash if tx_hash.startswith("0x") else "0x" + tx_hash
@@ -0,0 +1,158 @@
+"""
+This module groups the record writes sent to the contract into batch transactions.
+Reports and treatment plans added by the same account are queued and sent together through the batch entrypoints
+of the contract (addReports, addTreatmentPlans) once enough of them are queued or the oldest one has waited long
+enough, so bulk imports and busy clinics pay the per-transaction overhead once per batch instead of once per record.
+"""
+
+import atexit
+import threading
+import time
+from concurrent.futures import Future
+
+from config import config
+from session.logging import log_msg, log_error
+
+# Single-record contract functions and the batch function taking one array per argument
+BATCH_FUNCTIONS = {
+    'addReport': 'addReports',
+    'addTreatmentPlan': 'addTreatmentPlans',
+}
+
+class WriteCoalescer:
+    """
+    Thread-safe queue of contract writes, flushed per (function, account) after max_items writes or max_delay_ms
+    milliseconds, whichever comes first. A background thread flushes the queues whose delay expired; a queue
+    reaching max_items is flushed right away by the thread that filled it.
+    """
+
+    def __init__(self, write, max_items=None, max_delay_ms=None):
+        """
+        Initializes an empty coalescer; its thread is started on the first write.
+
+        Args:
+            write (callable): Sends a transaction, called as write(function_name, from_address, *args, wait=False)
+                              and returning a TxHandle (i.e. ActionController.write_data).
+            max_items (int): Writes per batch transaction; bounded by the block gas limit.
+            max_delay_ms (float): Milliseconds the first write of a batch waits for others before it is sent.
+        """
+        chain_config = config.config.get("chain", {})
+        self.write = write
+        self.max_items = max_items or chain_config.get("batch_max_items", 32)
+        self.max_delay = (max_delay_ms or chain_config.get("batch_max_delay_ms", 200)) / 1000
+        self._queues = {}
+        self._deadlines = {}
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closed = False
+
+    def submit(self, function_name, from_address, *args):
+        """
+        Queues a write for the next batch of its function and account.
+
+        Args:
+            function_name (str): The single-record contract function, e.g. 'addReport'.
+            from_address (str): The Ethereum address to send the transaction from.
+            *args: The arguments of the single-record function.
+
+        Returns:
+            concurrent.futures.Future: Resolved with the receipt of the batch transaction once it is mined,
+                                       or with the error that prevented the batch from being sent or mined.
+
+        Raises:
+            ValueError: If the function has no batch counterpart.
+        """
+        batch_function = BATCH_FUNCTIONS.get(function_name)
+        if batch_function is None:
+            raise ValueError(f"No batch function available for {function_name}")
+        key = (batch_function, from_address)
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("The write coalescer is closed")
+            queue = self._queues.setdefault(key, [])
+            if not queue:
+                self._deadlines[key] = time.monotonic() + self.max_delay
+            queue.append((args, future))
+            items = self._take(key) if len(queue) >= self.max_items else None
+            if items is None:
+                self._start()
+                self._cond.notify()
+        if items is not None:
+            self._send(key, items)
+        return future
+
+    def flush(self):
+        """
+        Sends every queued write now, without waiting for the batches to fill up.
+        """
+        with self._cond:
+            batches = [(key, self._take(key)) for key in list(self._queues)]
+        for key, items in batches:
+            self._send(key, items)
+
+    def close(self):
+        """
+        Sends the queued writes and stops the background thread; later writes are refused.
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self.flush()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def pending_count(self):
+        with self._cond:
+            return sum(len(queue) for queue in self._queues.values())
+
+    def _take(self, key):
+        self._deadlines.pop(key, None)
+        return self._queues.pop(key)
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="write-coalescer", daemon=True)
+            self._thread.start()
+            # Queued writes must not be lost when the application exits before their batch is due
+            atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed:
+                    now = time.monotonic()
+                    due = [key for key, deadline in self._deadlines.items() if deadline <= now]
+                    if due:
+                        break
+                    self._cond.wait(min(self._deadlines.values()) - now if self._deadlines else None)
+                if self._closed:
+                    return
+                batches = [(key, self._take(key)) for key in due]
+            for key, items in batches:
+                self._send(key, items)
+
+    def _send(self, key, items):
+        batch_function, from_address = key
+        # One array per argument of the single-record function, in queue order; the gas limit of the batch
+        # is estimated per number of records, see GasEstimator.key
+        columns = [list(column) for column in zip(*(args for args, _ in items))]
+        try:
+            handle = self.write(batch_function, from_address, *columns, wait=False)
+        except Exception as e:
+            log_error(f"Batch {batch_function} of {len(items)} writes from {from_address} could not be sent: {e}")
+            for _, future in items:
+                future.set_exception(e)
+            return
+        log_msg(f"Batch {batch_function} of {len(items)} writes from {from_address} submitted.")
+        handle.add_done_callback(lambda handle: self._settle(handle, items))
+
+    @staticmethod
+    def _settle(handle, items):
+        error = handle.future.exception()
+        for _, future in items:
+            if error is None:
+                future.set_result(handle.future.result())
+            else:
+                future.set_exception(error)
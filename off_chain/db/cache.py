@@ -0,0 +1,113 @@
+"""
+This module provides the in-process caches used in front of the database for data that is read far more
+often than it is written. Caches are bounded, thread-safe and invalidated explicitly by the code paths that
+write the cached rows; an optional time-to-live bounds how stale an entry can get when another process
+writes to the same database.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from config import config
+
+class LRUCache:
+    """
+    A bounded least-recently-used cache with an optional time-to-live and hit/miss counters.
+    Values should be immutable (e.g. read models), since the same object is handed out to every caller.
+    """
+
+    def __init__(self, maxsize, ttl=None):
+        """
+        Initializes an empty cache.
+
+        Args:
+            maxsize (int): The maximum number of entries; the least recently used one is evicted beyond it.
+            ttl (float|None): Seconds after which an entry expires, or None to keep entries until evicted or invalidated.
+        """
+        if maxsize <= 0:
+            raise ValueError("The cache size must be positive")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Looks up a key, counting the lookup as a hit or a miss.
+
+        Args:
+            key: The key to look up.
+
+        Returns:
+            The cached value, or None if the key is absent or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        """
+        Stores a value, evicting the least recently used entry if the cache is full.
+
+        Args:
+            key: The key of the value.
+            value: The value to cache; None values are not cached.
+        """
+        if value is None:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        """
+        Removes a key from the cache, if present. Must be called whenever the cached row is written.
+
+        Args:
+            key: The key to remove.
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """
+        Removes every entry from the cache. The hit/miss counters are kept.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Returns the usage counters of the cache.
+
+        Returns:
+            dict: The number of hits and misses, the current size and the maximum size of the cache.
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "maxsize": self.maxsize}
+
+    def __len__(self):
+        return len(self._entries)
+
+_cache_config = config.config.get("cache", {})
+
+# Medic records by username, read for every report and treatment plan shown to a user
+medic_directory = LRUCache(**_cache_config.get("medic_directory", {"maxsize": 1024}))
+
+# Non-secret Credentials fields (id, username, role, public key) by username, read by the role and public key
+# lookups of every menu; password hashes and private keys are always read from the database
+credentials_cache = LRUCache(**_cache_config.get("credentials", {"maxsize": 1024, "ttl": 60}))
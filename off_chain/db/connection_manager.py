@@ -0,0 +1,165 @@
+"""
+This module provides a process-wide manager for the SQLite connections used by ADIChain.
+Every model and every DatabaseOperations instance borrows the connection of the calling thread
+from here, instead of opening (and closing) a connection of its own.
+"""
+
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from config import config
+from session.logging import log_msg
+
+# Pragmas that can be tuned through the 'sqlite' section of the configuration file, in the order they are applied
+SQLITE_PRAGMAS = ('busy_timeout', 'journal_mode', 'synchronous', 'mmap_size', 'cache_size', 'temp_store')
+
+class Rollback(Exception):
+    """
+    Raised inside a transaction block to roll the unit of work back without propagating an error.
+    """
+
+class ConnectionManager:
+    """
+    Keeps one SQLite connection per thread for the configured database and hands it out on demand.
+    Connections are opened lazily, re-opened transparently if they have been closed, and can be
+    released for the current thread or for the whole process.
+    """
+
+    def __init__(self, db_path, pragmas=None):
+        """
+        Initializes the manager for a given database file.
+
+        Args:
+            db_path (str): Path of the SQLite database file.
+            pragmas (dict): Performance pragmas (journal_mode, synchronous, mmap_size, cache_size, temp_store,
+                            busy_timeout) applied to every connection. Unknown keys are rejected.
+        """
+        pragmas = pragmas or {}
+        unknown = set(pragmas) - set(SQLITE_PRAGMAS)
+        if unknown:
+            raise ValueError(f"Unsupported SQLite pragmas in configuration: {', '.join(sorted(unknown))}")
+        for name, value in pragmas.items():
+            if not re.fullmatch(r'-?[A-Za-z0-9_]+', str(value)):
+                raise ValueError(f"Invalid value for SQLite pragma {name}: {value}")
+        self.db_path = db_path
+        self.pragmas = pragmas
+        self._pragmas_logged = False
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = {}
+        self._transaction_depth = threading.local()
+
+    def _connect(self):
+        """
+        Opens a new connection to the database and applies the configured pragmas to it.
+        The effective values are logged the first time a connection is opened.
+
+        Returns:
+            sqlite3.Connection: The freshly opened connection.
+        """
+        # Connections are only ever used by the thread that opened them; disabling the
+        # same-thread check just allows close_all() to release them from any thread.
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        for name in SQLITE_PRAGMAS:
+            if name in self.pragmas:
+                conn.execute(f"PRAGMA {name} = {self.pragmas[name]}").fetchall()
+        if not self._pragmas_logged:
+            self._pragmas_logged = True
+            log_msg(f"SQLite connection to {self.db_path} opened with pragmas: {self.get_effective_pragmas(conn)}")
+        return conn
+
+    def get_effective_pragmas(self, conn=None):
+        """
+        Reads back the values SQLite is actually using for the tunable pragmas.
+
+        Args:
+            conn (sqlite3.Connection): Connection to inspect. Defaults to the connection of the calling thread.
+
+        Returns:
+            dict: The effective value of each tunable pragma.
+        """
+        conn = conn or self.get_connection()
+        return {name: conn.execute(f"PRAGMA {name}").fetchone()[0] for name in SQLITE_PRAGMAS}
+
+    def get_connection(self):
+        """
+        Returns the connection bound to the calling thread, opening it if needed.
+
+        Returns:
+            sqlite3.Connection: The connection of the calling thread.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            try:
+                conn.total_changes  # Raises if somebody closed the connection
+                return conn
+            except sqlite3.ProgrammingError:
+                conn = None
+        conn = self._connect()
+        self._local.conn = conn
+        with self._lock:
+            self._connections[threading.get_ident()] = conn
+        return conn
+
+    def in_transaction(self):
+        """
+        Tells whether the calling thread is inside a transaction block.
+
+        Returns:
+            bool: True if a unit of work is open on the calling thread, False otherwise.
+        """
+        return getattr(self._transaction_depth, 'depth', 0) > 0
+
+    @contextmanager
+    def transaction(self):
+        """
+        Opens a unit of work on the connection of the calling thread.
+        Statements executed inside the block are committed once, when the outermost block exits;
+        an exception rolls the whole unit of work back. Nested blocks join the outer one, and
+        raising Rollback aborts the unit of work without propagating any error.
+
+        Yields:
+            sqlite3.Connection: The connection the unit of work runs on.
+        """
+        conn = self.get_connection()
+        depth = getattr(self._transaction_depth, 'depth', 0)
+        self._transaction_depth.depth = depth + 1
+        try:
+            yield conn
+        except BaseException as e:
+            self._transaction_depth.depth = depth
+            if depth == 0:
+                conn.rollback()
+                if isinstance(e, Rollback):
+                    return
+            raise
+        else:
+            self._transaction_depth.depth = depth
+            if depth == 0:
+                conn.commit()
+
+    def close_connection(self):
+        """
+        Closes the connection bound to the calling thread, if any.
+        """
+        conn = getattr(self._local, 'conn', None)
+        self._local.conn = None
+        with self._lock:
+            self._connections.pop(threading.get_ident(), None)
+        if conn is not None:
+            conn.close()
+
+    def close_all(self):
+        """
+        Closes every connection opened by the manager, whatever thread it belongs to.
+        """
+        with self._lock:
+            connections = list(self._connections.values())
+            self._connections.clear()
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+connection_manager = ConnectionManager(config.config["db_path"], config.config.get("sqlite"))
@@ -14,6 +14,11 @@ cur.execute("DROP TABLE IF EXISTS Patients")
 cur.execute("DROP TABLE IF EXISTS Caregivers")
 cur.execute("DROP TABLE IF EXISTS Reports")
 cur.execute("DROP TABLE IF EXISTS TreatmentPlans")
+# Tables created by the schema migrations: left in place they would keep stale contacts, login attempts, chain
+# state and full-text entries, whose rowids collide with the ids of the recreated reports and treatment plans
+for table in ("MedicalRecordsSearch", "ContactDirectory", "LoginThrottle", "ChainTransactions", "ChainEvents",
+              "EventCheckpoints"):
+    cur.execute(f"DROP TABLE IF EXISTS {table}")
 cur.execute('''CREATE TABLE Credentials(
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             username TEXT NOT NULL,
@@ -72,7 +77,9 @@ cur.execute('''CREATE TABLE TreatmentPlans(
             start_date TEXT NOT NULL,
             end_date TEXT NOT NULL,
             FOREIGN KEY(username_patient) REFERENCES Patients(username),
-            FOREIGN KEY(username_medic) REFERENCES Medics(username),
+            FOREIGN KEY(username_medic) REFERENCES Medics(username)
             );''')
+# Tables were recreated from scratch: let the schema migrations run again at next startup
+cur.execute("PRAGMA user_version = 0")
 con.commit()
 con.close()
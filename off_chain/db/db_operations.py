@@ -5,19 +5,23 @@ It manages the creation, update, and retrieval of user data through a series of
 
 import datetime
 import sqlite3
-import os
 import hashlib
 import base64
+from concurrent.futures import Future
 
 from cryptography.fernet import Fernet
 from colorama import Fore, Style, init
 from config import config
+from db.cache import credentials_cache, medic_directory
+from db.connection_manager import connection_manager
+from db.kdf_executor import kdf_executor, needs_rehash, KDFBusyError, SCRYPT_PARAMS
+from db.schema_migrations import apply_migrations
+from session.logging import log_msg, log_error
 from models.medics import Medics
 from models.patients import Patients
 from models.caregivers import Caregivers
 from models.credentials import Credentials
-from models.treatmentplan import TreatmentPlans
-from models.reports import Reports
+from models.read_models import MedicRecord, PatientRecord, ReportRecord, ReportListing, TreatmentPlanRecord, TreatmentPlanListing, MedicalRecordHit
 
 class DatabaseOperations:
     """
@@ -28,22 +32,61 @@ class DatabaseOperations:
 
     def __init__(self):
         """
-        Initializes the database connection and cursor, and creates new tables if they do not exist.
+        Borrows the shared database connection and creates new tables if they do not exist.
         """
-        self.conn = sqlite3.connect(config.config["db_path"])
-        self.cur = self.conn.cursor()
+        self._cur = None
         self._create_new_table()
 
-        self.n_param = 2
-        self.r_param = 8
-        self.p_param = 1
-        self.dklen_param = 64
+        self.n_param = SCRYPT_PARAMS["n"]
+        self.r_param = SCRYPT_PARAMS["r"]
+        self.p_param = SCRYPT_PARAMS["p"]
+        self.dklen_param = SCRYPT_PARAMS["dklen"]
 
         self.today_date = datetime.date.today().strftime('%Y-%m-%d')
 
+    @property
+    def conn(self):
+        """
+        The connection of the calling thread, borrowed from the shared connection manager.
+        """
+        return connection_manager.get_connection()
+
+    @property
+    def cur(self):
+        """
+        The cursor used by this instance, recreated whenever the borrowed connection changes.
+        """
+        conn = self.conn
+        if self._cur is None or self._cur.connection is not conn:
+            self._cur = conn.cursor()
+        return self._cur
+
+    def transaction(self):
+        """
+        Opens a unit of work: the methods of this class called inside the block join it instead of
+        committing on their own, and everything is committed once when the block exits.
+
+        Usage:
+            with db_ops.transaction():
+                db_ops.register_creds(...)
+                db_ops.insert_patient(...)
+
+        Returns:
+            contextmanager: The transaction block, shared by every instance working on the same thread.
+        """
+        return connection_manager.transaction()
+
+    def _commit(self):
+        """
+        Commits the pending changes, unless they belong to an enclosing transaction block.
+        """
+        if not connection_manager.in_transaction():
+            self.conn.commit()
+
     def _create_new_table(self):
         """
-        Creates necessary tables in the database if they are not already present.
+        Creates necessary tables in the database if they are not already present, then applies
+        any pending schema migration (e.g. secondary indexes) to bring existing databases up to date.
         This ensures that the database schema is prepared before any operations are performed.
         """
         self.cur.execute('''CREATE TABLE IF NOT EXISTS Credentials(
@@ -107,6 +150,7 @@ class DatabaseOperations:
             FOREIGN KEY(username_medic) REFERENCES Medics(username)
             );''')
         self.conn.commit()
+        apply_migrations(self.conn)
     
     def register_creds(self, username, hash_password, role, public_key, private_key):
         """
@@ -135,7 +179,8 @@ class DatabaseOperations:
                                     public_key,
                                     obfuscated_private_k
                                 ))
-                self.conn.commit()
+                credentials_cache.invalidate(username)
+                self._commit()
                 return 0
             else:
                 return -1  # Username already exists
@@ -157,7 +202,8 @@ class DatabaseOperations:
 
     def check_unique_phone_number(self, phone):
         """
-        Checks if a phone number is unique across multiple tables in the database.
+        Checks if a phone number is unique across patients, medics and caregivers, with a single probe
+        of the ContactDirectory unique index.
 
         Args:
             phone (str): The phone number to check for uniqueness.
@@ -165,19 +211,8 @@ class DatabaseOperations:
         Returns:
             int: 0 if the phone number is not found in any records (unique), -1 if it is found (not unique).
         """
-        query_patients = "SELECT COUNT(*) FROM Patients WHERE phone = ?"
-        self.cur.execute(query_patients, (phone,))
-        count_patients = self.cur.fetchone()[0]
-
-        query_medics = "SELECT COUNT(*) FROM Medics WHERE phone = ?"
-        self.cur.execute(query_medics, (phone,))
-        count_medics = self.cur.fetchone()[0]
-
-        query_caregivers = "SELECT COUNT(*) FROM Caregivers WHERE phone = ?"
-        self.cur.execute(query_caregivers, (phone,))
-        count_caregivers = self.cur.fetchone()[0]
-
-        if count_patients == 0 and count_medics == 0 and count_caregivers == 0:
+        self.cur.execute("SELECT 1 FROM ContactDirectory WHERE kind = 'PHONE' AND contact = ?", (phone,))
+        if self.cur.fetchone() is None:
             return 0 
         else:
             return -1 
@@ -220,7 +255,7 @@ class DatabaseOperations:
     
     def check_unique_email(self, mail):
         """
-        Checks if an email address is unique within the Medics table in the database.
+        Checks if an email address is unique, with a single probe of the ContactDirectory unique index.
 
         Args:
             mail (str): The email address to check for uniqueness.
@@ -228,11 +263,8 @@ class DatabaseOperations:
         Returns:
             int: 0 if the email address is not found in the Medics records (unique), -1 if it is found (not unique).
         """
-        query_medics = "SELECT COUNT(*) FROM Medics WHERE mail = ?"
-        self.cur.execute(query_medics, (mail,))
-        count_medics = self.cur.fetchone()[0]
-
-        if count_medics == 0:
+        self.cur.execute("SELECT 1 FROM ContactDirectory WHERE kind = 'MAIL' AND contact = ?", (mail,))
+        if self.cur.fetchone() is None:
             return 0 
         else:
             return -1
@@ -275,7 +307,8 @@ class DatabaseOperations:
             phone (str): The phone number of the patient.
 
         Returns:
-            int: 0 if the insertion was successful, -1 if an integrity error occurred (e.g., duplicate username).
+            int: 0 if the insertion was successful, -1 if an integrity error occurred (e.g., duplicate username, or a
+                 phone number already registered in the ContactDirectory).
 
         Exceptions:
             sqlite3.IntegrityError: Catches and handles integrity errors from the database if, for instance, the
@@ -296,7 +329,7 @@ class DatabaseOperations:
                                 autonomous,
                                 phone
                             ))
-            self.conn.commit()
+            self._commit()
             return 0
         except sqlite3.IntegrityError:
             return -1
@@ -331,7 +364,7 @@ class DatabaseOperations:
                                 analyses,
                                 diagnosis
                             ))
-            self.conn.commit()
+            self._commit()
             return 0
         except sqlite3.IntegrityError:
             return -1
@@ -372,7 +405,7 @@ class DatabaseOperations:
                                 start_date_str,
                                 end_date_str
                             ))
-            self.conn.commit()
+            self._commit()
             return 0
         except sqlite3.IntegrityError:
             return -1
@@ -392,7 +425,7 @@ class DatabaseOperations:
 
         Returns:
             int: 0 if the insertion was successful, -1 if an integrity error occurred, such as violating unique constraints
-                or foreign key references.
+                (e.g. a phone number or e-mail already registered in the ContactDirectory) or foreign key references.
 
         Exceptions:
             sqlite3.IntegrityError: Catches and handles any integrity errors during the insertion process, which typically occur
@@ -412,7 +445,8 @@ class DatabaseOperations:
                                 mail,
                                 phone
                             ))
-            self.conn.commit()
+            medic_directory.invalidate(username)
+            self._commit()
             return 0
         except sqlite3.IntegrityError:
             return -1
@@ -430,8 +464,8 @@ class DatabaseOperations:
             phone (str): The contact phone number of the caregiver.
 
         Returns:
-            int: 0 if the insertion was successful, -1 if an integrity error occurred, such as duplicate entries or 
-                issues with foreign key constraints.
+            int: 0 if the insertion was successful, -1 if an integrity error occurred, such as duplicate entries
+                (e.g. a phone number already registered in the ContactDirectory) or issues with foreign key constraints.
 
         Exceptions:
             sqlite3.IntegrityError: Catches and handles any integrity errors that occur during the database operation. 
@@ -450,11 +484,170 @@ class DatabaseOperations:
                                 relationship,
                                 phone
                             ))
-            self.conn.commit()
+            self._commit()
             return 0
         except sqlite3.IntegrityError:
             return -1
 
+    def _insert_chunk(self, query, chunk):
+        """
+        Inserts a chunk of rows with a single executemany, falling back to row-by-row inserts
+        inside a savepoint when the chunk contains rows violating the table constraints.
+
+        Args:
+            query (str): The parametrized INSERT statement.
+            chunk (list[tuple]): The rows to insert.
+
+        Returns:
+            list[int]: For each row, 0 if it was inserted, -1 if it raised an integrity error.
+        """
+        # Outside a transaction, SAVEPOINT would open one and RELEASE would commit the chunk on its own:
+        # open it explicitly so every chunk joins the transaction of the whole bulk insert
+        if not self.conn.in_transaction:
+            self.cur.execute("BEGIN")
+        self.cur.execute("SAVEPOINT bulk_chunk")
+        try:
+            self.cur.executemany(query, chunk)
+            self.cur.execute("RELEASE SAVEPOINT bulk_chunk")
+            return [0] * len(chunk)
+        except sqlite3.IntegrityError:
+            # Undo the rows inserted before the failure, then find out which rows are invalid
+            self.cur.execute("ROLLBACK TO SAVEPOINT bulk_chunk")
+            statuses = []
+            for row in chunk:
+                try:
+                    self.cur.execute(query, row)
+                    statuses.append(0)
+                except sqlite3.IntegrityError:
+                    statuses.append(-1)
+            self.cur.execute("RELEASE SAVEPOINT bulk_chunk")
+            return statuses
+
+    def _bulk_insert(self, query, rows, chunk_size=None):
+        """
+        Inserts any number of rows in a single transaction, in chunks of executemany calls.
+        When called inside a transaction block, the rows join it and are committed with it.
+
+        Args:
+            query (str): The parametrized INSERT statement.
+            rows (iterable[tuple]): The rows to insert; generators are consumed lazily.
+            chunk_size (int): Number of rows per executemany call. Defaults to the configured bulk_chunk_size.
+
+        Returns:
+            list[int]: For each row, in input order, 0 if it was inserted, -1 if it raised an integrity error.
+
+        Exceptions:
+            Any non-integrity error rolls the whole transaction back and is propagated to the caller.
+        """
+        chunk_size = chunk_size or config.config.get("bulk_chunk_size", 1000)
+        statuses = []
+        chunk = []
+        with self.transaction():
+            for row in rows:
+                chunk.append(tuple(row))
+                if len(chunk) >= chunk_size:
+                    statuses.extend(self._insert_chunk(query, chunk))
+                    chunk = []
+            if chunk:
+                statuses.extend(self._insert_chunk(query, chunk))
+        return statuses
+
+    def insert_reports_bulk(self, reports, chunk_size=None):
+        """
+        Inserts many medical reports into the Reports table in a single transaction.
+
+        Args:
+            reports (iterable[tuple]): Rows of (username_patient, username_medic, analyses, diagnosis).
+            chunk_size (int): Number of rows per executemany call. Defaults to the configured bulk_chunk_size.
+
+        Returns:
+            list[int]: For each report, 0 if it was inserted, -1 if an integrity error occurred.
+        """
+        query = """
+                INSERT INTO Reports
+                (date, username_patient, username_medic, analyses, diagnosis)
+                VALUES (?, ?, ?, ?, ?) """
+        rows = ((self.today_date, *report) for report in reports)
+        return self._bulk_insert(query, rows, chunk_size)
+
+    def insert_treatment_plans_bulk(self, treatment_plans, chunk_size=None):
+        """
+        Inserts many treatment plans into the TreatmentPlans table in a single transaction.
+
+        Args:
+            treatment_plans (iterable[tuple]): Rows of (username_patient, username_medic, description, start_date, end_date).
+                                               Dates may be given as datetime.date objects or as strings.
+            chunk_size (int): Number of rows per executemany call. Defaults to the configured bulk_chunk_size.
+
+        Returns:
+            list[int]: For each treatment plan, 0 if it was inserted, -1 if an integrity error occurred.
+        """
+        query = """
+                INSERT INTO TreatmentPlans
+                (date, username_patient, username_medic, description, start_date, end_date)
+                VALUES (?, ?, ?, ?, ?, ?) """
+
+        def to_row(plan):
+            username_patient, username_medic, description, start_date, end_date = plan
+            start_date_str = start_date.strftime('%Y-%m-%d') if isinstance(start_date, datetime.date) else start_date
+            end_date_str = end_date.strftime('%Y-%m-%d') if isinstance(end_date, datetime.date) else end_date
+            return (self.today_date, username_patient, username_medic, description, start_date_str, end_date_str)
+
+        return self._bulk_insert(query, (to_row(plan) for plan in treatment_plans), chunk_size)
+
+    def insert_patients_bulk(self, patients, chunk_size=None):
+        """
+        Inserts many patients into the Patients table in a single transaction.
+
+        Args:
+            patients (iterable[tuple]): Rows of (username, name, lastname, birthday, birth_place, residence, autonomous, phone).
+            chunk_size (int): Number of rows per executemany call. Defaults to the configured bulk_chunk_size.
+
+        Returns:
+            list[int]: For each patient, 0 if it was inserted, -1 if an integrity error occurred.
+        """
+        query = """
+                INSERT INTO Patients
+                (username, name, lastname, birthday, birth_place, residence, autonomous, phone)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?) """
+        return self._bulk_insert(query, patients, chunk_size)
+
+    def insert_medics_bulk(self, medics, chunk_size=None):
+        """
+        Inserts many medics into the Medics table in a single transaction.
+
+        Args:
+            medics (iterable[tuple]): Rows of (username, name, lastname, birthday, specialization, mail, phone).
+            chunk_size (int): Number of rows per executemany call. Defaults to the configured bulk_chunk_size.
+
+        Returns:
+            list[int]: For each medic, 0 if it was inserted, -1 if an integrity error occurred.
+        """
+        query = """
+                INSERT INTO Medics
+                (username, name, lastname, birthday, specialization, mail, phone)
+                VALUES (?, ?, ?, ?, ?, ?, ?) """
+        results = self._bulk_insert(query, medics, chunk_size)
+        medic_directory.clear()
+        return results
+
+    def insert_caregivers_bulk(self, caregivers, chunk_size=None):
+        """
+        Inserts many caregivers into the Caregivers table in a single transaction.
+
+        Args:
+            caregivers (iterable[tuple]): Rows of (username, name, lastname, username_patient, relationship, phone).
+            chunk_size (int): Number of rows per executemany call. Defaults to the configured bulk_chunk_size.
+
+        Returns:
+            list[int]: For each caregiver, 0 if it was inserted, -1 if an integrity error occurred.
+        """
+        query = """
+                INSERT INTO Caregivers
+                (username, name, lastname, username_patient, relationship, phone)
+                VALUES (?, ?, ?, ?, ?, ?) """
+        return self._bulk_insert(query, caregivers, chunk_size)
+
     def check_patient_by_username(self, username):
         """
         Checks if a patient with the given username exists in the Patients table in the database.
@@ -470,6 +663,41 @@ class DatabaseOperations:
         if self.cur.fetchone()[0] == 0: return 0
         else: return -1
 
+    def _get_public_creds(self, username):
+        """
+        Retrieves the non-secret fields of a user's credentials through the credentials cache, which every role
+        and public key lookup shares. The password hash and the private key are never cached: they are read
+        from the database whenever they are needed. Rows read inside a transaction block are not cached.
+
+        Args:
+            username (str): The username of the user whose credentials are to be retrieved.
+
+        Returns:
+            tuple|None: The (id, username, role, public_key) row, or None if not found.
+        """
+        creds = credentials_cache.get(username)
+        if creds is None:
+            creds = self.cur.execute("""
+                                    SELECT id, username, role, public_key
+                                    FROM Credentials
+                                    WHERE username=?""", (username,)).fetchone()
+            if creds is not None and not connection_manager.in_transaction():
+                credentials_cache.put(username, creds)
+        return creds
+
+    def _cache_public_creds(self, creds):
+        # Keeps only the non-secret fields of a full Credentials row
+        if not connection_manager.in_transaction():
+            credentials_cache.put(creds[1], (creds[0], creds[1], creds[3], creds[4]))
+
+    def _get_hash_password(self, username):
+        # Always read from the database: a password changed by another process must stop working at once
+        row = self.cur.execute("""
+                                SELECT hash_password
+                                FROM Credentials
+                                WHERE username=?""", (username,)).fetchone()
+        return row[0] if row else None
+
     def get_creds_by_username(self, username):
         """
         Retrieves a user's credentials from the Credentials table based on their username.
@@ -486,6 +714,7 @@ class DatabaseOperations:
                                 FROM Credentials
                                 WHERE username=?""", (username,)).fetchone()
         if creds is not None:
+            self._cache_public_creds(creds)
             return Credentials(*creds)
         return None
 
@@ -535,13 +764,9 @@ class DatabaseOperations:
             str|None: The role of the user as a string if found (e.g., 'MEDIC', 'PATIENT', 'CAREGIVER'), or None if the
                   username does not correspond to any known user in the system.
         """
-        role = self.cur.execute("""
-                                SELECT role
-                                FROM Credentials
-                                WHERE username = ?""", (username,))
-        role = self.cur.fetchone()  
-        if role:
-            return role[0]
+        creds = self._get_public_creds(username)
+        if creds:
+            return creds[2]
         else:
             pat = self.check_patient_by_username(username)
             if pat:
@@ -560,10 +785,9 @@ class DatabaseOperations:
             str: The public key of the user if found, None otherwise.
         """
         try:
-            self.cur.execute("SELECT public_key FROM Credentials WHERE username = ?", (username,))
-            result = self.cur.fetchone()
+            result = self._get_public_creds(username)
             if result:
-                return result[0]  # Return the public key
+                return result[3]  # Return the public key
             else:
                 return None  # Public key not found
         except Exception as e:
@@ -572,7 +796,7 @@ class DatabaseOperations:
 
     def hash_function(self, password: str):
 
-        """Hashes the supplied password using the scrypt algorithm.
+        """Hashes the supplied password using the scrypt algorithm, in the KDF pool.
     
         Args:
             password: The password to hash.
@@ -585,17 +809,23 @@ class DatabaseOperations:
             A string containing the hashed password and the parameters used for hashing.
         """
 
-        salt = os.urandom(16)
-        digest = hashlib.scrypt(
-            password.encode(), 
-            salt = salt,
-            n = self.n_param,
-            r = self.r_param,
-            p = self.p_param,
-            dklen = self.dklen_param
-        )
-        hashed_passwd = f"{digest.hex()}${salt.hex()}${self.n_param}${self.r_param}${self.p_param}${self.dklen_param}"
-        return hashed_passwd
+        return self.hash_function_async(password).result()
+
+    def hash_function_async(self, password: str, timeout=None):
+        """
+        Hashes the supplied password in the KDF pool, without blocking the caller.
+
+        Args:
+            password: The password to hash.
+            timeout: Seconds to wait for a free slot in the pool, instead of the configured queue_timeout.
+
+        Returns:
+            concurrent.futures.Future: The future hash string, as returned by hash_function.
+
+        Raises:
+            KDFBusyError: If the KDF pool is saturated.
+        """
+        return kdf_executor.hash_async(password, self.n_param, self.r_param, self.p_param, self.dklen_param, timeout=timeout)
  
     def check_credentials(self, username, password, public_key, private_key):
         """
@@ -611,11 +841,104 @@ class DatabaseOperations:
             bool: True if all provided credentials match the stored values, False otherwise.
         """
         creds = self.get_creds_by_username(username)
-        if(creds is not None and self.check_passwd(username, password) and creds.get_public_key() == public_key and private_key == self.decrypt_private_k(creds.get_private_key(), password)):
+        if(creds is not None and self._verify_hash(creds.get_hash_password(), password) and creds.get_public_key() == public_key and private_key == self.decrypt_private_k(creds.get_private_key(), password)):
             return True
         else:
             return False
     
+    def get_login_record(self, username):
+        """
+        Retrieves, in a single query, a user's credentials together with the profile of their role
+        (Medics, Patients or Caregivers row), as needed to log the user in.
+
+        Args:
+            username (str): The username of the user logging in.
+
+        Returns:
+            tuple[Credentials, Medics|Patients|Caregivers|None]|None: The user's credentials and profile (None if the
+                                                                      profile has not been completed), or None if
+                                                                      the username has no credentials.
+        """
+        row = self.cur.execute("""
+                                SELECT Credentials.*, Medics.*, Patients.*, Caregivers.*
+                                FROM Credentials
+                                LEFT JOIN Medics ON UPPER(Credentials.role) = 'MEDIC' AND Medics.username = Credentials.username
+                                LEFT JOIN Patients ON UPPER(Credentials.role) = 'PATIENT' AND Patients.username = Credentials.username
+                                LEFT JOIN Caregivers ON UPPER(Credentials.role) = 'CAREGIVER' AND Caregivers.username = Credentials.username
+                                WHERE Credentials.username = ?""", (username,)).fetchone()
+        if row is None:
+            return None
+        creds, medic, patient, caregiver = row[:6], row[6:13], row[13:21], row[21:]
+        self._cache_public_creds(creds)
+        user = None
+        if medic[0] is not None:
+            user = Medics(*medic)
+        elif patient[0] is not None:
+            user = Patients(*patient)
+        elif caregiver[1] is not None:
+            user = Caregivers(*caregiver)
+        return Credentials(*creds), user
+
+    def authenticate(self, username, password, public_key, private_key):
+        """
+        Verifies a user's login credentials with one query and one password derivation, and returns what the
+        session needs to log the user in.
+
+        Args:
+            username (str): The username of the user logging in.
+            password (str): The password provided by the user for verification.
+            public_key (str): The public key provided by the user for verification.
+            private_key (str): The private key provided by the user for verification.
+
+        Returns:
+            tuple[Credentials, Medics|Patients|Caregivers|None]|None: The user's credentials and profile if all the
+                                                                      provided credentials match, None otherwise.
+        """
+        record = self.get_login_record(username)
+        if record is None:
+            return None
+        creds, user = record
+        if (self._verify_hash(creds.get_hash_password(), password) and creds.get_public_key() == public_key
+                and private_key == self.decrypt_private_k(creds.get_private_key(), password)):
+            if needs_rehash(creds.get_hash_password(), self._scrypt_params()):
+                self._rehash_password(username, creds.get_hash_password(), password)
+            return creds, user
+        return None
+
+    def _scrypt_params(self):
+        return {"n": self.n_param, "r": self.r_param, "p": self.p_param, "dklen": self.dklen_param}
+
+    def _rehash_password(self, username, old_hash, password):
+        """
+        Recomputes, in the background, the hash of a password verified against outdated scrypt parameters and
+        stores it in place of the old one. The login does not wait for it; if the pool is busy the upgrade is
+        simply retried at the next login. The update only applies if the stored hash is still the old one,
+        so a concurrent password change always wins.
+
+        Args:
+            username (str): The username of the user who just logged in.
+            old_hash (str): The hash the password was verified against.
+            password (str): The verified plaintext password.
+        """
+        def store(future):
+            try:
+                new_hash = future.result()
+                with connection_manager.transaction() as conn:
+                    updated = conn.execute("""
+                                            UPDATE Credentials
+                                            SET hash_password = ?
+                                            WHERE username = ? AND hash_password = ?""", (new_hash, username, old_hash)).rowcount
+                credentials_cache.invalidate(username)
+                if updated:
+                    log_msg(f"Password hash of {username} upgraded to scrypt parameters {self._scrypt_params()}")
+            except Exception as e:
+                log_error(e)
+
+        try:
+            self.hash_function_async(password, timeout=0).add_done_callback(store)
+        except KDFBusyError:
+            pass
+
     def check_passwd(self, username, password):
         """
         Verifies a user's password by comparing it against the hashed password stored in the database.
@@ -625,29 +948,54 @@ class DatabaseOperations:
             password (str): The plaintext password provided by the user for verification.
 
         Returns:
-            bool: True if the provided password matches the stored hash, False otherwise.
+            bool: True if the provided password matches the stored hash, False otherwise (including unknown users).
 
         Note:
             This method assumes that the hashed password and the salt are stored in a specific format in the database,
             delimited by '$'. It extracts the salt and hash parameters from this format to perform the hashing operation.
         """
-        result = self.cur.execute("""
-                                SELECT hash_password
-                                FROM Credentials
-                                WHERE username =?""", (username,))
-        hash = result.fetchone()
-        if hash:
-            saved_hash = hash[0]
-            params = saved_hash.split('$')
-            hashed_passwd = hashlib.scrypt(
-                password.encode('utf-8'),
-                salt=bytes.fromhex(params[1]),
-                n = int(params[2]),
-                r = int(params[3]),
-                p = int(params[4]),
-                dklen= int(params[5])
-            )
-        return hashed_passwd.hex() == params[0]
+        saved_hash = self._get_hash_password(username)
+        if saved_hash is None:
+            return False
+        return self._verify_hash(saved_hash, password)
+
+    def check_passwd_async(self, username, password):
+        """
+        Verifies a user's password in the KDF pool, without blocking the caller on the derivation.
+        The stored hash is read on the calling thread, which owns the database connection.
+
+        Args:
+            username (str): The username of the user whose password is being verified.
+            password (str): The plaintext password provided by the user for verification.
+
+        Returns:
+            concurrent.futures.Future: The future outcome of the verification (False for unknown users).
+
+        Raises:
+            KDFBusyError: If the KDF pool is saturated.
+        """
+        saved_hash = self._get_hash_password(username)
+        if saved_hash is None:
+            future = Future()
+            future.set_result(False)
+            return future
+        return kdf_executor.verify_async(saved_hash, password)
+
+    def _verify_hash(self, saved_hash, password):
+        """
+        Checks a plaintext password against a stored scrypt hash in the KDF pool, waiting for the outcome.
+
+        Args:
+            saved_hash (str): The stored hash, in the 'digest$salt$n$r$p$dklen' format produced by hash_function.
+            password (str): The plaintext password to verify.
+
+        Returns:
+            bool: True if the password matches the hash, False otherwise.
+
+        Raises:
+            KDFBusyError: If the KDF pool is saturated.
+        """
+        return kdf_executor.verify_async(saved_hash, password).result()
     
     def change_passwd(self, username, old_pass, new_pass):
         """
@@ -676,7 +1024,8 @@ class DatabaseOperations:
                                 UPDATE Credentials
                                 SET hash_password = ?, private_key = ?
                                 WHERE username = ?""", (new_hash, new_encrypted_priv_k, username))
-                self.conn.commit()
+                credentials_cache.invalidate(username)
+                self._commit()
                 return 0
             except Exception as ex:
                 raise ex
@@ -687,18 +1036,38 @@ class DatabaseOperations:
         """
         Retrieves a medic's detailed information based on their username from the Medics table.
 
+        Medics are served from the in-process medic directory, loaded lazily from the table on a miss.
+        Rows read inside a transaction block are not cached, since the block may still be rolled back.
+
         Args:
             username (str): The username of the medic whose details are to be retrieved.
 
         Returns:
-            Medics|None: A Medics object containing the medic's details if a record is found; otherwise, None.
+            MedicRecord|None: A read-only record of the medic's details if a record is found; otherwise, None.
         """
-        medic = self.cur.execute("""
+        medic = medic_directory.get(username)
+        if medic is not None:
+            return medic
+        row = self.cur.execute("""
                                     SELECT *
                                     FROM Medics
                                     WHERE username =?""", (username,)).fetchone()
-        return Medics(*medic)
+        if row is None:
+            return None
+        medic = MedicRecord(*row)
+        if not connection_manager.in_transaction():
+            medic_directory.put(username, medic)
+        return medic
     
+    def get_cache_stats(self):
+        """
+        Reports the usage of the in-process caches in front of the database.
+
+        Returns:
+            dict: For each cache, its hits, misses, current size and maximum size.
+        """
+        return {"medic_directory": medic_directory.stats(), "credentials": credentials_cache.stats()}
+
     def get_reports_list_by_username(self, username):
         """
         Retrieves a list of medical reports associated with a specific patient, identified by their username.
@@ -707,14 +1076,14 @@ class DatabaseOperations:
             username (str): The username of the patient whose reports are being retrieved.
 
         Returns:
-            list[Reports]: A list of Reports objects containing the medical report details for the patient.
-                       If no reports are found, an empty list is returned.
+            list[ReportRecord]: A list of read-only ReportRecord rows containing the medical report details for the patient.
+                                If no reports are found, an empty list is returned.
         """
         reportslist = self.cur.execute("""
                                     SELECT *
                                     FROM Reports
                                     WHERE username_patient =?""", (username,))       
-        return [Reports(*report) for report in reportslist]
+        return [ReportRecord(*report) for report in reportslist]
     
     def get_treatplan_list_by_username(self, username):
         """
@@ -724,27 +1093,275 @@ class DatabaseOperations:
             username (str): The username of the patient whose treatment plans are being retrieved.
 
         Returns:
-            list[TreatmentPlans]: A list of TreatmentPlans objects containing detailed information about each treatment 
-                              plan for the patient. If no treatment plans are found, an empty list is returned.
+            list[TreatmentPlanRecord]: A list of read-only TreatmentPlanRecord rows containing detailed information about
+                                       each treatment plan for the patient. If no treatment plans are found, an empty
+                                       list is returned.
         """
         treatmentplanslist = self.cur.execute("""
                                     SELECT *
                                     FROM TreatmentPlans
                                     WHERE username_patient =?""", (username,))       
-        return [TreatmentPlans(*treatmentplan) for treatmentplan in treatmentplanslist]
+        return [TreatmentPlanRecord(*treatmentplan) for treatmentplan in treatmentplanslist]
     
+    def get_patients_page(self, cursor=None, limit=10):
+        """
+        Retrieves one page of patients, seeking directly to the page start instead of skipping rows.
+
+        Args:
+            cursor (int|None): The cursor returned with the previous page, or None for the first page.
+            limit (int): The maximum number of patients in the page.
+
+        Returns:
+            tuple[list[PatientRecord], int|None]: The read-only patients of the page, in insertion order, and the
+                                                  cursor of the next page (None if this is the last page).
+        """
+        rows = self.cur.execute("""
+                                SELECT rowid, *
+                                FROM Patients
+                                WHERE rowid > ?
+                                ORDER BY rowid
+                                LIMIT ?""", (cursor if cursor is not None else 0, limit + 1)).fetchall()
+        next_cursor = rows[limit - 1][0] if len(rows) > limit else None
+        return [PatientRecord(*row[1:]) for row in rows[:limit]], next_cursor
+
+    def get_reports_page(self, username, cursor=None, limit=10):
+        """
+        Retrieves one page of the medical reports of a patient, using a (date, id_report) keyset seek.
+        Each report is joined with the medic who issued it, so the whole page costs a single query.
+
+        Args:
+            username (str): The username of the patient whose reports are being retrieved.
+            cursor (tuple|None): The cursor returned with the previous page, or None for the first page.
+            limit (int): The maximum number of reports in the page.
+
+        Returns:
+            tuple[list[ReportListing], tuple|None]: The reports of the page, ordered by date and id, and the cursor
+                                                    of the next page (None if this is the last page).
+        """
+        date, id_report = cursor if cursor is not None else ('', 0)
+        rows = self.cur.execute("""
+                                SELECT Reports.*, Medics.name, Medics.lastname
+                                FROM Reports
+                                LEFT JOIN Medics ON Medics.username = Reports.username_medic
+                                WHERE Reports.username_patient = ? AND (Reports.date, Reports.id_report) > (?, ?)
+                                ORDER BY Reports.date, Reports.id_report
+                                LIMIT ?""", (username, date, id_report, limit + 1)).fetchall()
+        next_cursor = (rows[limit - 1][1], rows[limit - 1][0]) if len(rows) > limit else None
+        return [ReportListing(*row) for row in rows[:limit]], next_cursor
+
+    def get_treatplan_page(self, username, cursor=None, limit=10):
+        """
+        Retrieves one page of the treatment plans of a patient, using a (date, id_treament_plan) keyset seek.
+        Each plan is joined with the medic who designed it, so the whole page costs a single query.
+
+        Args:
+            username (str): The username of the patient whose treatment plans are being retrieved.
+            cursor (tuple|None): The cursor returned with the previous page, or None for the first page.
+            limit (int): The maximum number of treatment plans in the page.
+
+        Returns:
+            tuple[list[TreatmentPlanListing], tuple|None]: The treatment plans of the page, ordered by date and id, and
+                                                           the cursor of the next page (None if this is the last page).
+        """
+        date, id_treatment_plan = cursor if cursor is not None else ('', 0)
+        rows = self.cur.execute("""
+                                SELECT TreatmentPlans.*, Medics.name, Medics.lastname
+                                FROM TreatmentPlans
+                                LEFT JOIN Medics ON Medics.username = TreatmentPlans.username_medic
+                                WHERE TreatmentPlans.username_patient = ? AND (TreatmentPlans.date, TreatmentPlans.id_treament_plan) > (?, ?)
+                                ORDER BY TreatmentPlans.date, TreatmentPlans.id_treament_plan
+                                LIMIT ?""", (username, date, id_treatment_plan, limit + 1)).fetchall()
+        next_cursor = (rows[limit - 1][1], rows[limit - 1][0]) if len(rows) > limit else None
+        return [TreatmentPlanListing(*row) for row in rows[:limit]], next_cursor
+
+    def search_patients(self, prefix, limit=10):
+        """
+        Finds patients by the beginning of their last name or username, ignoring case.
+        When the prefix has several words, it is also tried as the last name followed by the beginning of the name:
+        the last word is matched against the beginning of the name and the others against the whole last name
+        (e.g. 'rossi ma' finds Mario Rossi, while 'de lu' finds the De Luca family).
+        Every branch is a range seek on a case-folded expression index, so the cost does not grow with the registry.
+
+        Args:
+            prefix (str): The beginning of the last name (optionally followed by the name) or of the username.
+            limit (int): The maximum number of patients returned.
+
+        Returns:
+            list[PatientRecord]: The matching patients, ordered by last name and name. Empty if the prefix is blank.
+        """
+        words = prefix.split()
+        if not words:
+            return []
+        # lower() is applied in SQL too, so the bounds are folded exactly like the indexed expressions;
+        # char(1114111) is the highest code point, hence an upper bound for every string starting with the prefix
+        branches = ["""
+                        SELECT * FROM (
+                            SELECT * FROM Patients
+                            WHERE lower(lastname) >= lower(?1) AND lower(lastname) < lower(?1) || char(1114111)
+                            ORDER BY lower(lastname), lower(name) LIMIT ?2)""", """
+                        SELECT * FROM (
+                            SELECT * FROM Patients
+                            WHERE lower(username) >= lower(?1) AND lower(username) < lower(?1) || char(1114111)
+                            ORDER BY lower(username) LIMIT ?2)"""]
+        params = (" ".join(words), limit)
+        if len(words) > 1:
+            branches.append("""
+                        SELECT * FROM (
+                            SELECT * FROM Patients
+                            WHERE lower(lastname) = lower(?3)
+                              AND lower(name) >= lower(?4) AND lower(name) < lower(?4) || char(1114111)
+                            ORDER BY lower(lastname), lower(name) LIMIT ?2)""")
+            params += (" ".join(words[:-1]), words[-1])
+        query = f"""
+                    SELECT * FROM ({" UNION".join(branches)})
+                    ORDER BY lower(lastname), lower(name) LIMIT ?2"""
+        rows = self.cur.execute(query, params).fetchall()
+        return [PatientRecord(*row) for row in rows]
+
+    def search_medical_records(self, text, username_patient=None, limit=20):
+        """
+        Searches report analyses, diagnoses and treatment plan descriptions through the full-text index.
+        Every word of the text must appear in the record (in any order); the last word also matches as a prefix,
+        so partial words typed by the medic still find results. FTS5 operators in the text are treated as plain words.
+
+        Args:
+            text (str): The words to look for.
+            username_patient (str|None): If given, only the records of this patient are searched.
+            limit (int): The maximum number of hits returned.
+
+        Returns:
+            list[MedicalRecordHit]: The matching records, most relevant first. Empty if the text contains no words.
+        """
+        words = [word.replace('"', '""') for word in text.split()]
+        if not words:
+            return []
+        match = " ".join(f'"{word}"' for word in words) + "*"
+        # bm25 weights follow the column order: username_patient, username_medic, date, analyses, diagnosis, description
+        query = """
+                SELECT CASE rowid % 2 WHEN 0 THEN 'REPORT' ELSE 'TREATMENT_PLAN' END, rowid / 2,
+                       username_patient, username_medic, date,
+                       snippet(MedicalRecordsSearch, -1, '[', ']', '...', 12), rank
+                FROM MedicalRecordsSearch
+                WHERE MedicalRecordsSearch MATCH ? AND rank MATCH 'bm25(0, 0, 0, 1.0, 2.0, 1.0)'"""
+        params = [match]
+        if username_patient is not None:
+            query += " AND username_patient = ?"
+            params.append(username_patient)
+        # Ordering by the rank column lets FTS5 sort internally, so snippets are only built for the returned hits
+        query += " ORDER BY rank LIMIT ?"
+        params.append(limit)
+        rows = self.cur.execute(query, params).fetchall()
+        return [MedicalRecordHit(*row) for row in rows]
+
+    def _iter_rows(self, query, params, row_type, batch_size=None):
+        """
+        Streams the result of a query in batches, converting each row to a read-only record.
+        A dedicated cursor is used, so other queries issued while iterating do not interfere with the stream.
+
+        Args:
+            query (str): The parametrized SELECT statement.
+            params (tuple): The query parameters.
+            row_type (type): The ReadModel subclass each row is converted to.
+            batch_size (int): Number of rows fetched per round trip. Defaults to the configured stream_batch_size.
+
+        Yields:
+            ReadModel: One record per row, in query order.
+        """
+        batch_size = batch_size or config.config.get("stream_batch_size", 500)
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield row_type(*row)
+        finally:
+            cursor.close()
+
+    def iter_patients(self, autonomous=None, residence=None, batch_size=None):
+        """
+        Streams the patients of the Patients table in constant memory, optionally filtered.
+
+        Args:
+            autonomous (int|None): If given, only patients with this autonomous flag (0 or 1) are returned.
+            residence (str|None): If given, only patients living in this place are returned.
+            batch_size (int): Number of rows fetched per round trip. Defaults to the configured stream_batch_size.
+
+        Yields:
+            PatientRecord: One read-only record per patient, in insertion order.
+        """
+        conditions, params = [], []
+        if autonomous is not None:
+            conditions.append("autonomous = ?")
+            params.append(autonomous)
+        if residence is not None:
+            conditions.append("residence = ?")
+            params.append(residence)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        query = f"SELECT * FROM Patients {where} ORDER BY rowid"
+        return self._iter_rows(query, tuple(params), PatientRecord, batch_size)
+
+    def iter_reports(self, username=None, username_medic=None, since=None, until=None, batch_size=None):
+        """
+        Streams medical reports in constant memory, optionally filtered.
+
+        Args:
+            username (str|None): If given, only the reports of this patient are returned.
+            username_medic (str|None): If given, only the reports issued by this medic are returned.
+            since (str|None): If given, only the reports dated on or after this day (YYYY-MM-DD) are returned.
+            until (str|None): If given, only the reports dated on or before this day (YYYY-MM-DD) are returned.
+            batch_size (int): Number of rows fetched per round trip. Defaults to the configured stream_batch_size.
+
+        Yields:
+            ReportRecord: One read-only record per report, ordered by date and id.
+        """
+        conditions, params = [], []
+        for condition, value in (("username_patient = ?", username), ("username_medic = ?", username_medic),
+                                 ("date >= ?", since), ("date <= ?", until)):
+            if value is not None:
+                conditions.append(condition)
+                params.append(value)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        query = f"SELECT * FROM Reports {where} ORDER BY date, id_report"
+        return self._iter_rows(query, tuple(params), ReportRecord, batch_size)
+
+    def iter_treatment_plans(self, username=None, username_medic=None, active_on=None, batch_size=None):
+        """
+        Streams treatment plans in constant memory, optionally filtered.
+
+        Args:
+            username (str|None): If given, only the treatment plans of this patient are returned.
+            username_medic (str|None): If given, only the treatment plans designed by this medic are returned.
+            active_on (str|None): If given, only the plans whose start and end dates include this day (YYYY-MM-DD) are returned.
+            batch_size (int): Number of rows fetched per round trip. Defaults to the configured stream_batch_size.
+
+        Yields:
+            TreatmentPlanRecord: One read-only record per treatment plan, ordered by date and id.
+        """
+        conditions, params = [], []
+        for condition, value in (("username_patient = ?", username), ("username_medic = ?", username_medic),
+                                 ("start_date <= ?", active_on), ("end_date >= ?", active_on)):
+            if value is not None:
+                conditions.append(condition)
+                params.append(value)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        query = f"SELECT * FROM TreatmentPlans {where} ORDER BY date, id_treament_plan"
+        return self._iter_rows(query, tuple(params), TreatmentPlanRecord, batch_size)
+
     def get_patients(self):
         """
         Retrieves a list of all patients from the Patients table in the database.
 
         Returns:
-            list[Patients]: A list of Patients objects containing detailed information about each patient.
-                        If no treatment plans are found, an empty list is returned.
+            list[PatientRecord]: A list of read-only PatientRecord rows containing detailed information about each patient.
+                                 If no patients are found, an empty list is returned.
         """
         query = """
                 SELECT *
                 FROM Patients
             """
         patients = self.cur.execute(query)
-        return [Patients(*patient) for patient in patients]
+        return [PatientRecord(*patient) for patient in patients]
 
@@ -0,0 +1,226 @@
+"""
+This module runs the password key derivations (scrypt) of ADIChain off the caller's thread.
+Derivations are deliberately expensive, so they are executed by a small dedicated pool whose queue is bounded:
+when too many derivations are pending (e.g. during a login storm), new requests wait for a free slot for a
+limited time and are then refused, instead of piling up and starving the rest of the application.
+"""
+
+import hashlib
+import hmac
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from config import config
+
+# Parameters used for new hashes; hashes stored with different ones are upgraded on the next successful login
+SCRYPT_PARAMS = {"n": 2, "r": 8, "p": 1, "dklen": 64, **config.config.get("scrypt", {})}
+
+# Upper bound accepted by hashlib for the maxmem argument
+_MAXMEM_LIMIT = 2**31 - 1
+
+class KDFBusyError(Exception):
+    """
+    Raised when a key derivation cannot be queued because the pool is saturated.
+    """
+
+def scrypt_memory(n, r, p):
+    """
+    Computes the memory a scrypt derivation needs, to be passed as maxmem: OpenSSL refuses by default
+    any derivation above 32 MiB, which production parameters easily exceed.
+
+    Args:
+        n (int): CPU/Memory cost factor.
+        r (int): Block size.
+        p (int): Parallelization factor.
+
+    Returns:
+        int: The memory needed, in bytes, plus 1 MiB of headroom.
+    """
+    return min(128 * r * (n + p + 2) + 2**20, _MAXMEM_LIMIT)
+
+def scrypt_hash(password, n, r, p, dklen):
+    """
+    Hashes a password with scrypt and a fresh random salt.
+
+    Args:
+        password (str): The password to hash.
+        n (int): CPU/Memory cost factor.
+        r (int): Block size.
+        p (int): Parallelization factor.
+        dklen (int): Length of the derived key.
+
+    Returns:
+        str: The hash in the 'digest$salt$n$r$p$dklen' format stored in the Credentials table.
+    """
+    salt = os.urandom(16)
+    digest = hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, dklen=dklen, maxmem=scrypt_memory(n, r, p))
+    return f"{digest.hex()}${salt.hex()}${n}${r}${p}${dklen}"
+
+def scrypt_verify(saved_hash, password):
+    """
+    Checks a plaintext password against a stored scrypt hash, using the parameters saved with it.
+
+    Args:
+        saved_hash (str): The stored hash, in the 'digest$salt$n$r$p$dklen' format produced by scrypt_hash.
+        password (str): The plaintext password to verify.
+
+    Returns:
+        bool: True if the password matches the hash, False otherwise.
+    """
+    params = saved_hash.split('$')
+    digest = hashlib.scrypt(
+        password.encode('utf-8'),
+        salt=bytes.fromhex(params[1]),
+        n=int(params[2]),
+        r=int(params[3]),
+        p=int(params[4]),
+        dklen=int(params[5]),
+        maxmem=scrypt_memory(int(params[2]), int(params[3]), int(params[4]))
+    )
+    return hmac.compare_digest(digest.hex(), params[0])
+
+def needs_rehash(saved_hash, params=None):
+    """
+    Tells whether a stored hash was produced with parameters other than the current ones.
+
+    Args:
+        saved_hash (str): The stored hash, in the 'digest$salt$n$r$p$dklen' format.
+        params (dict): The reference parameters (n, r, p, dklen). Defaults to SCRYPT_PARAMS.
+
+    Returns:
+        bool: True if the hash should be recomputed with the reference parameters.
+    """
+    params = params or SCRYPT_PARAMS
+    stored = saved_hash.split('$')[2:6]
+    return [int(value) for value in stored] != [params["n"], params["r"], params["p"], params["dklen"]]
+
+def calibrate_scrypt(target_ms, max_memory, r=8, p=1, dklen=64, samples=3):
+    """
+    Benchmarks scrypt on this machine and picks the highest cost factor n (a power of two) whose verification
+    stays within the target latency and the memory budget.
+
+    Args:
+        target_ms (float): The maximum acceptable duration of one verification, in milliseconds.
+        max_memory (int): The maximum memory one derivation may use, in bytes.
+        r (int): Block size.
+        p (int): Parallelization factor.
+        dklen (int): Length of the derived key.
+        samples (int): Derivations timed per candidate; the fastest one is kept.
+
+    Returns:
+        dict: The chosen parameters (n, r, p, dklen) with the measured duration (ms) and memory (bytes),
+              plus the list of candidates tried as (n, ms, bytes) tuples.
+    """
+    candidates = []
+    best = None
+    n = 2**10
+    while scrypt_memory(n, r, p) <= max_memory:
+        duration = min(_time_derivation(n, r, p, dklen) for _ in range(samples))
+        candidates.append((n, duration, scrypt_memory(n, r, p)))
+        if duration > target_ms:
+            break
+        best = (n, duration)
+        n *= 2
+    if best is None:
+        raise ValueError("Even the smallest scrypt cost exceeds the target latency or the memory budget")
+    return {"n": best[0], "r": r, "p": p, "dklen": dklen, "ms": best[1],
+            "memory": scrypt_memory(best[0], r, p), "candidates": candidates}
+
+def _time_derivation(n, r, p, dklen):
+    start = time.perf_counter()
+    hashlib.scrypt(b"calibration", salt=os.urandom(16), n=n, r=r, p=p, dklen=dklen, maxmem=scrypt_memory(n, r, p))
+    return (time.perf_counter() - start) * 1000
+
+class KDFExecutor:
+    """
+    A pool of workers dedicated to key derivations, with a bounded number of pending derivations.
+    hashlib.scrypt releases the GIL, so a thread pool runs derivations in parallel with the rest of the process;
+    a process pool can be configured instead to isolate them completely.
+    """
+
+    def __init__(self, workers=2, max_pending=16, queue_timeout=5.0, mode="thread"):
+        """
+        Initializes the executor; the workers are started lazily, on the first submission.
+
+        Args:
+            workers (int): Number of derivations run concurrently.
+            max_pending (int): Maximum number of derivations running or waiting for a worker.
+            queue_timeout (float): Seconds a submission waits for a free slot before KDFBusyError is raised.
+            mode (str): 'thread' for a thread pool, 'process' for a process pool.
+        """
+        if mode not in ("thread", "process"):
+            raise ValueError(f"Unsupported KDF executor mode: {mode}")
+        if workers <= 0 or max_pending < workers:
+            raise ValueError("The KDF pool needs at least one worker and room for one pending derivation per worker")
+        self.workers = workers
+        self.max_pending = max_pending
+        self.queue_timeout = queue_timeout
+        self.mode = mode
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                if self.mode == "process":
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers)
+                else:
+                    self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="kdf")
+            return self._pool
+
+    def submit(self, function, *args, timeout=None):
+        """
+        Queues a derivation, waiting up to queue_timeout seconds for a free slot.
+
+        Args:
+            function (callable): The derivation to run, e.g. scrypt_hash or scrypt_verify.
+            *args: The arguments of the derivation.
+            timeout (float|None): Seconds to wait for a free slot instead of queue_timeout; 0 never waits.
+
+        Returns:
+            concurrent.futures.Future: The future result of the derivation.
+
+        Raises:
+            KDFBusyError: If the pool is still saturated after queue_timeout seconds.
+        """
+        if not self._slots.acquire(timeout=self.queue_timeout if timeout is None else timeout):
+            raise KDFBusyError("Too many password derivations in progress, try again later")
+        try:
+            future = self._get_pool().submit(function, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def hash_async(self, password, n, r, p, dklen, timeout=None):
+        """
+        Hashes a password in the pool. See scrypt_hash and submit.
+
+        Returns:
+            concurrent.futures.Future: The future hash string.
+        """
+        return self.submit(scrypt_hash, password, n, r, p, dklen, timeout=timeout)
+
+    def verify_async(self, saved_hash, password):
+        """
+        Verifies a password in the pool. See scrypt_verify.
+
+        Returns:
+            concurrent.futures.Future: The future outcome of the verification.
+        """
+        return self.submit(scrypt_verify, saved_hash, password)
+
+    def shutdown(self, wait=True):
+        """
+        Stops the workers; a later submission starts a new pool.
+        """
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait)
+
+kdf_executor = KDFExecutor(**config.config.get("kdf", {}))
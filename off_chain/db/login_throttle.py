@@ -0,0 +1,115 @@
+"""
+This module limits failed login attempts across every process sharing the ADIChain database.
+Failures are counted in the LoginThrottle table with a sliding window counter, both per (username, source)
+pair and per username over all sources, so that neither restarting the application nor spreading the
+attempts over several processes or replicas resets the budget. Every check is a primary key lookup.
+"""
+
+import socket
+import time
+
+from config import config
+from db.connection_manager import connection_manager
+
+# Source of the attempts made from this process, when the caller does not provide one (e.g. a client address)
+LOCAL_SOURCE = socket.gethostname()
+
+# Source under which the failures of a username are counted over all sources
+ALL_SOURCES = ""
+
+class LoginThrottle:
+    """
+    Sliding window limiter of failed logins. The failures of the current fixed window are added to those of
+    the previous window, weighted by how much of it the sliding window still covers; once the estimate reaches
+    the limit, the key is locked out for a fixed time.
+    """
+
+    def __init__(self, max_attempts=5, max_attempts_per_user=20, window=180, lockout=180):
+        """
+        Initializes the limiter.
+
+        Args:
+            max_attempts (int): Failures allowed per username and source within the window.
+            max_attempts_per_user (int): Failures allowed per username, over all sources, within the window.
+            window (float): Length of the sliding window, in seconds.
+            lockout (float): Seconds a key stays locked once its limit is reached.
+        """
+        self.max_attempts = max_attempts
+        self.max_attempts_per_user = max_attempts_per_user
+        self.window = window
+        self.lockout = lockout
+
+    def locked_for(self, username, source=LOCAL_SOURCE, now=None):
+        """
+        Tells how long login attempts for a username from a source are still refused.
+
+        Args:
+            username (str): The username being logged in.
+            source (str): Where the attempt comes from.
+            now (float): The current UNIX time; defaults to time.time().
+
+        Returns:
+            float: The seconds left before attempts are accepted again, 0 if they are accepted now.
+        """
+        now = time.time() if now is None else now
+        row = connection_manager.get_connection().execute("""
+                SELECT MAX(locked_until)
+                FROM LoginThrottle
+                WHERE username = ? AND source IN (?, ?)""", (username, source, ALL_SOURCES)).fetchone()
+        return max(0.0, (row[0] or 0) - now)
+
+    def record_failure(self, username, source=LOCAL_SOURCE, now=None):
+        """
+        Counts a failed login for a username from a source, and locks the keys whose limit is reached.
+
+        Args:
+            username (str): The username whose login failed.
+            source (str): Where the attempt came from.
+            now (float): The current UNIX time; defaults to time.time().
+
+        Returns:
+            float: The seconds attempts are now refused for, 0 if the limits have not been reached.
+        """
+        now = time.time() if now is None else now
+        window_start = now - now % self.window
+        with connection_manager.transaction() as conn:
+            for key_source, limit in ((source, self.max_attempts), (ALL_SOURCES, self.max_attempts_per_user)):
+                # The fixed windows roll over inside the upsert itself, so concurrent processes never lose a failure
+                attempts, previous_attempts = conn.execute("""
+                        INSERT INTO LoginThrottle(username, source, window_start, attempts, previous_attempts, locked_until)
+                        VALUES (:username, :source, :window_start, 1, 0, 0)
+                        ON CONFLICT(username, source) DO UPDATE SET
+                            previous_attempts = CASE
+                                WHEN window_start = :window_start THEN previous_attempts
+                                WHEN window_start = :window_start - :window THEN attempts
+                                ELSE 0 END,
+                            attempts = CASE WHEN window_start = :window_start THEN attempts + 1 ELSE 1 END,
+                            window_start = :window_start
+                        RETURNING attempts, previous_attempts""",
+                        {"username": username, "source": key_source, "window_start": window_start,
+                         "window": self.window}).fetchone()
+                covered = 1 - (now - window_start) / self.window
+                if attempts + previous_attempts * covered >= limit:
+                    conn.execute("""
+                            UPDATE LoginThrottle SET locked_until = MAX(locked_until, ?)
+                            WHERE username = ? AND source = ?""", (now + self.lockout, username, key_source))
+        return self.locked_for(username, source, now)
+
+    def reset(self, username, source=LOCAL_SOURCE, now=None):
+        """
+        Forgets the failures of a username from a source after a successful login, and purges the
+        entries that have expired. The count over all sources is kept, as it protects the username
+        from attempts coming from elsewhere.
+
+        Args:
+            username (str): The username that logged in.
+            source (str): Where the successful attempt came from.
+            now (float): The current UNIX time; defaults to time.time().
+        """
+        now = time.time() if now is None else now
+        with connection_manager.transaction() as conn:
+            conn.execute("DELETE FROM LoginThrottle WHERE username = ? AND source = ?", (username, source))
+            conn.execute("DELETE FROM LoginThrottle WHERE window_start < ? AND locked_until < ?",
+                         (now - 2 * self.window, now))
+
+login_throttle = LoginThrottle(**config.config.get("login_throttle", {}))
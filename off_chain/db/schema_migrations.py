@@ -0,0 +1,227 @@
+"""
+This module holds the versioned schema migrations of the ADIChain database.
+The version reached by a database is stored in SQLite's user_version pragma, so every migration
+is applied exactly once, at startup, on both new and existing databases.
+"""
+
+from session.logging import log_msg
+
+# Profile columns mirrored in the ContactDirectory: (table, kind, column)
+CONTACT_COLUMNS = (('Patients', 'PHONE', 'phone'), ('Medics', 'PHONE', 'phone'),
+                   ('Caregivers', 'PHONE', 'phone'), ('Medics', 'MAIL', 'mail'))
+
+def _contact_update_trigger(table, kind, column):
+    # Only a contact that actually changes is moved in the directory: profile updates rewrite every column, and
+    # owners whose contact was a duplicate when the directory was created have no entry to re-insert
+    return f"""CREATE TRIGGER IF NOT EXISTS trg_{table.lower()}_{column}_update AFTER UPDATE OF {column} ON {table}
+                WHEN OLD.{column} IS NOT NEW.{column}
+                BEGIN
+                    DELETE FROM ContactDirectory WHERE kind = '{kind}' AND contact = OLD.{column} AND username = OLD.username;
+                    INSERT INTO ContactDirectory(kind, contact, username)
+                        SELECT '{kind}', NEW.{column}, NEW.username WHERE NEW.{column} <> '';
+                END"""
+
+# Each migration is (version, description, statements); versions must be strictly increasing.
+MIGRATIONS = [
+    (1, "Secondary indexes for username, contact and date lookups", [
+        "CREATE INDEX IF NOT EXISTS idx_credentials_username ON Credentials(username)",
+        "CREATE INDEX IF NOT EXISTS idx_patients_username ON Patients(username)",
+        "CREATE INDEX IF NOT EXISTS idx_medics_username ON Medics(username)",
+        "CREATE INDEX IF NOT EXISTS idx_caregivers_username ON Caregivers(username, username_patient)",
+        "CREATE INDEX IF NOT EXISTS idx_reports_patient_date ON Reports(username_patient, date)",
+        "CREATE INDEX IF NOT EXISTS idx_treatmentplans_patient_start ON TreatmentPlans(username_patient, start_date)",
+        "CREATE INDEX IF NOT EXISTS idx_patients_phone ON Patients(phone)",
+        "CREATE INDEX IF NOT EXISTS idx_medics_phone ON Medics(phone)",
+        "CREATE INDEX IF NOT EXISTS idx_medics_mail ON Medics(mail)",
+        "CREATE INDEX IF NOT EXISTS idx_caregivers_phone ON Caregivers(phone)",
+    ]),
+    (2, "Keyset pagination index for treatment plans", [
+        "CREATE INDEX IF NOT EXISTS idx_treatmentplans_patient_date ON TreatmentPlans(username_patient, date)",
+    ]),
+    (3, "Global contact directory enforcing unique phone numbers and e-mails", [
+        """CREATE TABLE IF NOT EXISTS ContactDirectory(
+            kind TEXT CHECK(kind IN ('PHONE', 'MAIL')) NOT NULL,
+            contact TEXT NOT NULL,
+            username TEXT NOT NULL,
+            UNIQUE(kind, contact)
+            )""",
+        "CREATE INDEX IF NOT EXISTS idx_contactdirectory_username ON ContactDirectory(username, kind)",
+        # Existing duplicates cannot be resolved automatically: the first owner keeps the contact
+        "INSERT OR IGNORE INTO ContactDirectory(kind, contact, username) SELECT 'PHONE', phone, username FROM Patients WHERE phone <> ''",
+        "INSERT OR IGNORE INTO ContactDirectory(kind, contact, username) SELECT 'PHONE', phone, username FROM Medics WHERE phone <> ''",
+        "INSERT OR IGNORE INTO ContactDirectory(kind, contact, username) SELECT 'PHONE', phone, username FROM Caregivers WHERE phone <> ''",
+        "INSERT OR IGNORE INTO ContactDirectory(kind, contact, username) SELECT 'MAIL', mail, username FROM Medics WHERE mail <> ''",
+    ] + [
+        # The directory is maintained by triggers, so a duplicate contact makes the profile write itself fail
+        statement
+        for table, kind, column in (('Patients', 'PHONE', 'phone'), ('Medics', 'PHONE', 'phone'),
+                                    ('Caregivers', 'PHONE', 'phone'), ('Medics', 'MAIL', 'mail'))
+        for statement in (
+            f"""CREATE TRIGGER IF NOT EXISTS trg_{table.lower()}_{column}_insert AFTER INSERT ON {table}
+                WHEN NEW.{column} <> ''
+                BEGIN
+                    INSERT INTO ContactDirectory(kind, contact, username) VALUES ('{kind}', NEW.{column}, NEW.username);
+                END""",
+            f"""CREATE TRIGGER IF NOT EXISTS trg_{table.lower()}_{column}_update AFTER UPDATE OF {column} ON {table}
+                BEGIN
+                    DELETE FROM ContactDirectory WHERE kind = '{kind}' AND contact = OLD.{column} AND username = OLD.username;
+                    INSERT INTO ContactDirectory(kind, contact, username)
+                        SELECT '{kind}', NEW.{column}, NEW.username WHERE NEW.{column} <> '';
+                END""",
+            f"""CREATE TRIGGER IF NOT EXISTS trg_{table.lower()}_{column}_delete AFTER DELETE ON {table}
+                BEGIN
+                    DELETE FROM ContactDirectory WHERE kind = '{kind}' AND contact = OLD.{column} AND username = OLD.username;
+                END""",
+        )
+    ]),
+    (4, "Full-text index over report analyses, diagnoses and treatment plan descriptions", [
+        # rowid encodes the source row (2 * id for reports, 2 * id + 1 for treatment plans), so triggers can
+        # reach an entry without scanning; the unindexed columns let a hit be displayed without a join
+        """CREATE VIRTUAL TABLE IF NOT EXISTS MedicalRecordsSearch USING fts5(
+            username_patient UNINDEXED,
+            username_medic UNINDEXED,
+            date UNINDEXED,
+            analyses,
+            diagnosis,
+            description,
+            tokenize = 'unicode61 remove_diacritics 2'
+            )""",
+        """INSERT INTO MedicalRecordsSearch(rowid, username_patient, username_medic, date, analyses, diagnosis, description)
+            SELECT 2 * id_report, username_patient, username_medic, date, analyses, diagnosis, '' FROM Reports""",
+        """INSERT INTO MedicalRecordsSearch(rowid, username_patient, username_medic, date, analyses, diagnosis, description)
+            SELECT 2 * id_treament_plan + 1, username_patient, username_medic, date, '', '', description FROM TreatmentPlans""",
+        """CREATE TRIGGER IF NOT EXISTS trg_reports_search_insert AFTER INSERT ON Reports
+            BEGIN
+                INSERT INTO MedicalRecordsSearch(rowid, username_patient, username_medic, date, analyses, diagnosis, description)
+                    VALUES (2 * NEW.id_report, NEW.username_patient, NEW.username_medic, NEW.date, NEW.analyses, NEW.diagnosis, '');
+            END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_reports_search_update AFTER UPDATE ON Reports
+            BEGIN
+                DELETE FROM MedicalRecordsSearch WHERE rowid = 2 * OLD.id_report;
+                INSERT INTO MedicalRecordsSearch(rowid, username_patient, username_medic, date, analyses, diagnosis, description)
+                    VALUES (2 * NEW.id_report, NEW.username_patient, NEW.username_medic, NEW.date, NEW.analyses, NEW.diagnosis, '');
+            END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_reports_search_delete AFTER DELETE ON Reports
+            BEGIN
+                DELETE FROM MedicalRecordsSearch WHERE rowid = 2 * OLD.id_report;
+            END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_treatmentplans_search_insert AFTER INSERT ON TreatmentPlans
+            BEGIN
+                INSERT INTO MedicalRecordsSearch(rowid, username_patient, username_medic, date, analyses, diagnosis, description)
+                    VALUES (2 * NEW.id_treament_plan + 1, NEW.username_patient, NEW.username_medic, NEW.date, '', '', NEW.description);
+            END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_treatmentplans_search_update AFTER UPDATE ON TreatmentPlans
+            BEGIN
+                DELETE FROM MedicalRecordsSearch WHERE rowid = 2 * OLD.id_treament_plan + 1;
+                INSERT INTO MedicalRecordsSearch(rowid, username_patient, username_medic, date, analyses, diagnosis, description)
+                    VALUES (2 * NEW.id_treament_plan + 1, NEW.username_patient, NEW.username_medic, NEW.date, '', '', NEW.description);
+            END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_treatmentplans_search_delete AFTER DELETE ON TreatmentPlans
+            BEGIN
+                DELETE FROM MedicalRecordsSearch WHERE rowid = 2 * OLD.id_treament_plan + 1;
+            END""",
+    ]),
+    (5, "Case-folded indexes for patient prefix search", [
+        "CREATE INDEX IF NOT EXISTS idx_patients_lastname_name_ci ON Patients(lower(lastname), lower(name))",
+        "CREATE INDEX IF NOT EXISTS idx_patients_username_ci ON Patients(lower(username))",
+    ]),
+    (6, "Login throttle shared by every process using the database", [
+        """CREATE TABLE IF NOT EXISTS LoginThrottle(
+            username TEXT NOT NULL,
+            source TEXT NOT NULL,
+            window_start REAL NOT NULL,
+            attempts INTEGER NOT NULL,
+            previous_attempts INTEGER NOT NULL,
+            locked_until REAL NOT NULL,
+            PRIMARY KEY(username, source)
+            ) WITHOUT ROWID""",
+        "CREATE INDEX IF NOT EXISTS idx_loginthrottle_window ON LoginThrottle(window_start)",
+    ]),
+    (7, "Status of the transactions submitted to the chain", [
+        """CREATE TABLE IF NOT EXISTS ChainTransactions(
+            tx_hash TEXT PRIMARY KEY,
+            function_name TEXT NOT NULL,
+            from_address TEXT NOT NULL,
+            nonce INTEGER,
+            status TEXT CHECK(status IN ('PENDING', 'SUCCESS', 'FAILED', 'DROPPED')) NOT NULL,
+            block_number INTEGER,
+            gas_used INTEGER,
+            submitted_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+            )""",
+        "CREATE INDEX IF NOT EXISTS idx_chaintransactions_status ON ChainTransactions(status, submitted_at)",
+    ]),
+    (8, "Contract events ingested from the chain and ingestion checkpoints", [
+        """CREATE TABLE IF NOT EXISTS ChainEvents(
+            tx_hash TEXT NOT NULL,
+            log_index INTEGER NOT NULL,
+            contract_address TEXT NOT NULL,
+            block_number INTEGER NOT NULL,
+            event_name TEXT NOT NULL,
+            args TEXT NOT NULL,
+            ingested_at REAL NOT NULL,
+            PRIMARY KEY(tx_hash, log_index)
+            ) WITHOUT ROWID""",
+        "CREATE INDEX IF NOT EXISTS idx_chainevents_block ON ChainEvents(contract_address, block_number, log_index)",
+        """CREATE TABLE IF NOT EXISTS EventCheckpoints(
+            contract_address TEXT PRIMARY KEY,
+            last_block INTEGER NOT NULL,
+            updated_at REAL NOT NULL
+            )""",
+    ]),
+    (9, "Contact directory update triggers ignoring unchanged contacts", [
+        statement
+        for table, kind, column in CONTACT_COLUMNS
+        for statement in (
+            f"DROP TRIGGER IF EXISTS trg_{table.lower()}_{column}_update",
+            _contact_update_trigger(table, kind, column),
+        )
+    ]),
+]
+
+def get_schema_version(conn):
+    """
+    Reads the schema version of the database.
+
+    Args:
+        conn (sqlite3.Connection): Connection to the database.
+
+    Returns:
+        int: The schema version currently stored in the database.
+    """
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def apply_migrations(conn):
+    """
+    Applies, in order, every migration newer than the schema version of the database.
+    Each migration runs in its own immediate transaction together with the version bump,
+    so concurrent processes starting at the same time cannot apply it twice.
+
+    Args:
+        conn (sqlite3.Connection): Connection to the database.
+
+    Returns:
+        int: The schema version of the database after the migrations.
+    """
+    current_version = get_schema_version(conn)
+    for version, description, statements in MIGRATIONS:
+        if version <= current_version:
+            continue
+        if conn.in_transaction:
+            conn.commit()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Another process may have migrated the database while we were waiting for the lock
+            if get_schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        current_version = version
+        log_msg(f"Database migrated to schema version {version}: {description}")
+    return current_version
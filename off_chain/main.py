@@ -10,5 +10,9 @@ from session.session import Session
 if __name__ == "__main__":
     new_session = Session()
     cli = CommandLineInterface(new_session)
+    # Transactions submitted without waiting are tracked in the background, including those left pending by a previous run
+    cli.act_controller.receipt_tracker.resume()
+    # Contract events are ingested from the last checkpoint, backfilling those emitted while the application was down
+    cli.act_controller.listen_to_events()
     while True:
         cli.print_menu()
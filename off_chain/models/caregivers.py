@@ -83,7 +83,7 @@ class Caregivers(Model):
                 self.cur.execute(
                     '''UPDATE Caregivers SET username_patient=?, name=?, lastname=?, relationship=?, phone=? WHERE username=?''',
                     (self.username_patient, self.name, self.lastname, self.relationship, self.phone, self.username))
-            self.conn.commit()
+            self._commit()
             self.username = self.cur.lastrowid  # Updating the username with last inserted row id
             print(Fore.GREEN + 'Information saved correctly!\n' + Style.RESET_ALL)
         except Exception: 
@@ -95,4 +95,4 @@ class Caregivers(Model):
         """
         if self.username is not None:
             self.cur.execute('DELETE FROM Caregivers WHERE username=?', (self.username,))
-            self.conn.commit()
+            self._commit()
@@ -1,4 +1,5 @@
 from models.model_base import Model
+from db.cache import credentials_cache
 
 class Credentials(Model):
     """
@@ -59,8 +60,11 @@ class Credentials(Model):
             # Update existing credentials record
             self.cur.execute('''UPDATE Credentials SET username=?, hash_password=?, role=?, public_key=?, private_key=? WHERE id=?''',
                              (self.username, self.hash_password, self.role, self.public_key, self.private_key, self.id))
-        self.conn.commit()
-        self.id = self.cur.lastrowid # Update the ID with the last row inserted ID if new record
+        # The username itself may have changed, so no cached row can be trusted any longer
+        credentials_cache.clear()
+        self._commit()
+        if self.id is None:
+            self.id = self.cur.lastrowid # Update the ID with the last row inserted ID if new record
 
     def delete(self):
         """
@@ -68,4 +72,5 @@ class Credentials(Model):
         """
         if self.id is not None:
             self.cur.execute('DELETE FROM Credentials WHERE id=?', (self.id,))
-            self.conn.commit()
+            credentials_cache.invalidate(self.username)
+            self._commit()
@@ -1,4 +1,5 @@
 from models.model_base import Model
+from db.cache import medic_directory
 from colorama import Fore, Style, init
 
 class Medics(Model):
@@ -89,7 +90,8 @@ class Medics(Model):
                 # Update existing medic details
                 self.cur.execute('''UPDATE Medics SET name=?, lastname=?, birthday=?, specialization=?, mail=?, phone=? WHERE username=?''',
                                 (self.name, self.lastname, self.birthday, self.specialization, self.mail, self.phone, self.username))
-            self.conn.commit()
+            medic_directory.invalidate(self.username)
+            self._commit()
             self.username = self.cur.lastrowid
             print(Fore.GREEN + 'Information saved correctly!\n' + Style.RESET_ALL)
         except: 
@@ -100,5 +102,6 @@ class Medics(Model):
         Deletes a Medic record from the database based on its username.
         """
         if self.username is not None:
-            self.cur.execute('DELETE FROM Medics WHERE username=?', (self.username))
-            self.conn.commit()
+            self.cur.execute('DELETE FROM Medics WHERE username=?', (self.username,))
+            medic_directory.invalidate(self.username)
+            self._commit()
@@ -1,25 +1,37 @@
 """This module defines the base Model class used to interact with the database."""
 
-import sqlite3
-from config import config
+from db.connection_manager import connection_manager
 
 class Model:
     """Base model to be extended for implementing other models."""
     db_path = "ADIChain"
 
     def __init__(self):
-        """Constructor that initializes the database connection."""
-        self.conn = sqlite3.connect(config.config["db_path"])
-        self.cur = self.conn.cursor()
+        """Constructor that prepares the model; the database connection is borrowed on demand."""
+        self._cur = None
+
+    @property
+    def conn(self):
+        """Connection of the calling thread, borrowed from the shared connection manager."""
+        return connection_manager.get_connection()
+
+    @property
+    def cur(self):
+        """Cursor on the borrowed connection, created the first time it is needed."""
+        conn = self.conn
+        if self._cur is None or self._cur.connection is not conn:
+            self._cur = conn.cursor()
+        return self._cur
+
+    def _commit(self):
+        """Commits the pending changes, unless they belong to an enclosing transaction block."""
+        if not connection_manager.in_transaction():
+            self.conn.commit()
 
     def save(self):
         """Virtual method to save the model. Must be implemented by subclasses."""
         raise NotImplementedError("Subclasses must implement this method.")
-    
+
     def delete(self):
         """Virtual method to delete the model. Must be implemented by subclasses."""
         raise NotImplementedError("Subclasses must implement this method")
-    
-    def __del__(self):
-        """Destructor that closes the database connection."""
-        self.conn.close()
@@ -95,7 +95,7 @@ class Patients(Model):
                 # Update existing patient details
                 self.cur.execute(""" UPDATE Patients SET name = ?, lastname = ?, birthday = ?, birth_place = ?, residence = ?, phone = ? WHERE username = ? """,
                                 (self.name, self.lastname, self.birthday, self.birth_place, self.residence, self.phone, self.username))
-            self.conn.commit()
+            self._commit()
             self.username = self.cur.lastrowid # Update the username with the last inserted row ID if new record
             print(Fore.GREEN + 'Information saved correctly!\n' + Style.RESET_ALL)
         except Exception as e: 
@@ -107,4 +107,4 @@ class Patients(Model):
         """
         if self.username is not None:
             self.cur.execute('DELETE FROM Patients WHERE username=?', (self.username,))
-            self.conn.commit()
+            self._commit()
@@ -0,0 +1,271 @@
+"""
+This module defines the read-only rows returned by the listing queries.
+Unlike the models, they never touch the database and carry no per-instance dictionary: they only hold
+the values of a query result, exposed through the same getters as the corresponding model.
+When a row has to be modified, to_model() returns an editable model holding the same values; search hits only
+carry a snippet of their record, so their to_model() is the one exception reading the full record from the database.
+"""
+
+from db.connection_manager import connection_manager
+from models.medics import Medics
+from models.patients import Patients
+from models.reports import Reports
+from models.treatmentplan import TreatmentPlans
+
+class ReadModel:
+    """
+    Base class for the immutable, slot-based query result rows.
+    Subclasses list every field, in column order, in _fields, and declare their own new fields in __slots__.
+    """
+    __slots__ = ()
+    _fields = ()
+
+    def __init__(self, *values):
+        """
+        Initializes the row with one value per field, in the order given by _fields.
+        """
+        if len(values) != len(self._fields):
+            raise TypeError(f"{type(self).__name__} expects {len(self._fields)} values, got {len(values)}")
+        for field, value in zip(self._fields, values):
+            object.__setattr__(self, field, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is read-only, use to_model() to get an editable copy")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is read-only, use to_model() to get an editable copy")
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(getattr(self, f) == getattr(other, f) for f in self._fields)
+
+    def __hash__(self):
+        return hash(tuple(getattr(self, f) for f in self._fields))
+
+    def __repr__(self):
+        values = ", ".join(f"{f}={getattr(self, f)!r}" for f in self._fields)
+        return f"{type(self).__name__}({values})"
+
+    def to_model(self):
+        """Virtual method returning an editable model with the same values. Must be implemented by subclasses."""
+        raise NotImplementedError("Subclasses must implement this method.")
+
+class PatientRecord(ReadModel):
+    """
+    This class represents a read-only Patients row: username, name, lastname, birthday, birth_place,
+    residence, autonomous and phone.
+    """
+    __slots__ = ('username', 'name', 'lastname', 'birthday', 'birth_place', 'residence', 'autonomous', 'phone')
+    _fields = __slots__
+
+    # Getter methods for each attribute
+    def get_username(self):
+        return self.username
+
+    def get_name(self):
+        return self.name
+
+    def get_lastname(self):
+        return self.lastname
+
+    def get_birthday(self):
+        return self.birthday
+
+    def get_birth_place(self):
+        return self.birth_place
+
+    def get_residence(self):
+        return self.residence
+
+    def get_autonomous(self):
+        return self.autonomous
+
+    def get_phone(self):
+        return self.phone
+
+    def to_model(self):
+        """
+        Returns an editable Patients model holding the same values, to be used when the patient has to be saved.
+        """
+        return Patients(self.username, self.name, self.lastname, self.birthday, self.birth_place,
+                        self.residence, self.autonomous, self.phone)
+
+class MedicRecord(ReadModel):
+    """
+    This class represents a read-only Medics row: username, name, lastname, birthday, specialization, mail and phone.
+    """
+    __slots__ = ('username', 'name', 'lastname', 'birthday', 'specialization', 'mail', 'phone')
+    _fields = __slots__
+
+    # Getter methods for each attribute
+    def get_username(self):
+        return self.username
+
+    def get_name(self):
+        return self.name
+
+    def get_lastname(self):
+        return self.lastname
+
+    def get_birthday(self):
+        return self.birthday
+
+    def get_specialization(self):
+        return self.specialization
+
+    def get_mail(self):
+        return self.mail
+
+    def get_phone(self):
+        return self.phone
+
+    def to_model(self):
+        """
+        Returns an editable Medics model holding the same values, to be used when the medic has to be saved.
+        """
+        return Medics(self.username, self.name, self.lastname, self.birthday, self.specialization, self.mail, self.phone)
+
+class ReportRecord(ReadModel):
+    """
+    This class represents a read-only Reports row: id_report, date, username_patient, username_medic,
+    analyses and diagnosis.
+    """
+    __slots__ = ('id_report', 'date', 'username_patient', 'username_medic', 'analyses', 'diagnosis')
+    _fields = __slots__
+
+    # Getter methods for each attribute
+    def get_id_report(self):
+        return self.id_report
+
+    def get_date(self):
+        return self.date
+
+    def get_username_patient(self):
+        return self.username_patient
+
+    def get_username_medic(self):
+        return self.username_medic
+
+    def get_analyses(self):
+        return self.analyses
+
+    def get_diagnosis(self):
+        return self.diagnosis
+
+    def to_model(self):
+        """
+        Returns an editable Reports model holding the same values, to be used when the report has to be saved.
+        """
+        return Reports(self.id_report, self.date, self.username_patient, self.username_medic, self.analyses, self.diagnosis)
+
+class ReportListing(ReportRecord):
+    """
+    This class represents a row of a report listing: the report itself plus the name (medic_name, medic_lastname)
+    of the medic who issued it.
+    """
+    __slots__ = ('medic_name', 'medic_lastname')
+    _fields = ReportRecord._fields + __slots__
+
+    def get_medic_name(self):
+        return self.medic_name
+
+    def get_medic_lastname(self):
+        return self.medic_lastname
+
+class TreatmentPlanRecord(ReadModel):
+    """
+    This class represents a read-only TreatmentPlans row: id_treatment_plan, date, username_patient,
+    username_medic, description, start_date and end_date.
+    """
+    __slots__ = ('id_treatment_plan', 'date', 'username_patient', 'username_medic', 'description', 'start_date', 'end_date')
+    _fields = __slots__
+
+    # Getter methods for each attribute
+    def get_id_treatment_plan(self):
+        return self.id_treatment_plan
+
+    def get_date(self):
+        return self.date
+
+    def get_username_patient(self):
+        return self.username_patient
+
+    def get_username_medic(self):
+        return self.username_medic
+
+    def get_description(self):
+        return self.description
+
+    def get_start_date(self):
+        return self.start_date
+
+    def get_end_date(self):
+        return self.end_date
+
+    def to_model(self):
+        """
+        Returns an editable TreatmentPlans model holding the same values, to be used when the plan has to be saved.
+        """
+        return TreatmentPlans(self.id_treatment_plan, self.date, self.username_patient, self.username_medic,
+                              self.description, self.start_date, self.end_date)
+
+class TreatmentPlanListing(TreatmentPlanRecord):
+    """
+    This class represents a row of a treatment plan listing: the plan itself plus the name (medic_name, medic_lastname)
+    of the medic who designed it.
+    """
+    __slots__ = ('medic_name', 'medic_lastname')
+    _fields = TreatmentPlanRecord._fields + __slots__
+
+    def get_medic_name(self):
+        return self.medic_name
+
+    def get_medic_lastname(self):
+        return self.medic_lastname
+
+class MedicalRecordHit(ReadModel):
+    """
+    This class represents a full-text search hit: the kind ('REPORT' or 'TREATMENT_PLAN') and id of the matching record,
+    its patient, medic and date, a snippet of the matching text and its bm25 rank (lower is more relevant).
+    """
+    __slots__ = ('kind', 'record_id', 'username_patient', 'username_medic', 'date', 'snippet', 'rank')
+    _fields = __slots__
+
+    # Getter methods for each attribute
+    def get_kind(self):
+        return self.kind
+
+    def get_record_id(self):
+        return self.record_id
+
+    def get_username_patient(self):
+        return self.username_patient
+
+    def get_username_medic(self):
+        return self.username_medic
+
+    def get_date(self):
+        return self.date
+
+    def get_snippet(self):
+        return self.snippet
+
+    def get_rank(self):
+        return self.rank
+
+    def to_model(self):
+        """
+        Loads the matching record, to be used when it has to be shown in full or saved.
+
+        Returns:
+            Reports|TreatmentPlans: An editable model of the report or treatment plan, or None if it no longer exists.
+        """
+        conn = connection_manager.get_connection()
+        if self.kind == 'REPORT':
+            row = conn.execute("""
+                    SELECT id_report, date, username_patient, username_medic, analyses, diagnosis
+                    FROM Reports WHERE id_report = ?""", (self.record_id,)).fetchone()
+            return Reports(*row) if row else None
+        row = conn.execute("""
+                SELECT id_treament_plan, date, username_patient, username_medic, description, start_date, end_date
+                FROM TreatmentPlans WHERE id_treament_plan = ?""", (self.record_id,)).fetchone()
+        return TreatmentPlans(*row) if row else None
@@ -60,7 +60,7 @@ class Reports(Model):
             # Update existing report details
             self.cur.execute('''UPDATE Reports SET date=?, username_patient=?, username_medic=?, analyses=?, diagnosis=? WHERE id_report=?''',
                              (self.date, self.username_patient, self.username_medic, self.analyses, self.diagnosis, self.id_report))
-        self.conn.commit()
+        self._commit()
         self.id_report = self.cur.lastrowid # Update the id_report with the last inserted row ID if new record
 
     def delete(self):
@@ -69,4 +69,4 @@ class Reports(Model):
         """
         if self.id_report is not None:
             self.cur.execute('DELETE FROM Reports WHERE id_report=?', (self.id_report,))
-            self.conn.commit()
+            self._commit()
@@ -85,8 +85,9 @@ class TreatmentPlans(Model):
             # Update existing treatment plan details
             self.cur.execute('''UPDATE TreatmentPlans SET date=?, username_patient=?, username_medic=?, description=?, start_date=?, end_date=? WHERE id_treament_plan=?''',
                  (self.date, self.username_patient, self.username_medic, self.description, self.start_date, self.end_date, self.id_treatment_plan))
-        self.conn.commit()
-        self.id_treatment_plan = self.cur.lastrowid # Update the id_treatment_plan with the last inserted row ID if new record
+        self._commit()
+        if self.id_treatment_plan is None:
+            self.id_treatment_plan = self.cur.lastrowid # Update the id_treatment_plan with the last inserted row ID if new record
 
     def delete(self):
         """
@@ -94,4 +95,4 @@ class TreatmentPlans(Model):
         """
         if self.id_treatment_plan is not None:
             self.cur.execute('DELETE FROM TreatmentPlans WHERE id_treament_plan=?', (self.id_treatment_plan,))
-            self.conn.commit()
+            self._commit()
@@ -18,6 +18,7 @@ class Session:
         self.__user = None
         self.__attempts = 0
         self.__login_error_timestamp = 0
+        self.__reauth = None
 
     def get_user(self):
         """
@@ -65,8 +66,38 @@ class Session:
     def reset_session(self):
         """
         Resets the session to its initial state with no user, 
-        no login attempts, and no timeout.
+        no login attempts, no timeout and no re-authentication grant.
         """
         self.__user = None
         self.__attempts = 0
         self.__login_error_timestamp = 0
+        self.revoke_reauth()
+
+    def grant_reauth(self, username, window: float):
+        """
+        Records that the user has just re-entered their password: sensitive operations of the same user
+        can skip the password check for the next window seconds. A window of 0 grants nothing.
+        """
+        if window > 0:
+            self.__reauth = (username, time.monotonic() + window)
+        else:
+            self.__reauth = None
+
+    def has_valid_reauth(self, username):
+        """
+        Returns True if the user re-entered their password within the grant window, False otherwise.
+        An expired grant is wiped.
+        """
+        if self.__reauth is None:
+            return False
+        reauth_username, expires_at = self.__reauth
+        if time.monotonic() >= expires_at:
+            self.__reauth = None
+            return False
+        return reauth_username == username
+
+    def revoke_reauth(self):
+        """
+        Wipes the re-authentication grant, if any.
+        """
+        self.__reauth = None
@@ -1,6 +1,88 @@
+import json
+import threading
+import time
 import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from eth_abi import encode
+from web3 import Web3
 from faker import Faker
+from web3.exceptions import TransactionNotFound
 from db.db_operations import DatabaseOperations
+from db.connection_manager import connection_manager, Rollback
+from db.login_throttle import LoginThrottle, login_throttle
+from db.kdf_executor import KDFExecutor, KDFBusyError, kdf_executor, needs_rehash, scrypt_verify
+from controllers.controller import Controller
+from controllers.action_controller import ActionController
+from controllers.event_ingestor import EventIngestor
+from controllers.gas_oracle import FeeOracle, GasEstimator
+from controllers.nonce_manager import NonceManager
+from controllers.receipt_tracker import ReceiptTracker, TransactionFailed, TxHandle
+from controllers.write_coalescer import WriteCoalescer
+from session.session import Session
+
+class FakeEth:
+    """Minimal in-memory stand-in for the w3.eth API used by the receipt tracker and the nonce manager."""
+    def __init__(self):
+        self.block_number = 0
+        self.blocks = {}
+        self.receipts = {}
+        self.transaction_counts = {}
+        self.logs = []
+        self.max_log_range = None
+
+    def mine(self, *receipts):
+        self.block_number += 1
+        self.blocks[self.block_number] = {"transactions": [tx_hash for tx_hash, _ in receipts]}
+        for tx_hash, status in receipts:
+            self.receipts[tx_hash] = {"status": status, "blockNumber": self.block_number, "gasUsed": 21000}
+
+    def get_block(self, number):
+        return self.blocks[number]
+
+    def get_transaction_receipt(self, tx_hash):
+        if tx_hash not in self.receipts:
+            raise TransactionNotFound(tx_hash)
+        return self.receipts[tx_hash]
+
+    def get_transaction(self, tx_hash):
+        return {"hash": tx_hash}
+
+    def get_transaction_count(self, account, block_identifier="latest"):
+        return self.transaction_counts.get(account, 0)
+
+    def get_logs(self, filter_params):
+        if self.max_log_range and filter_params["toBlock"] - filter_params["fromBlock"] + 1 > self.max_log_range:
+            raise ValueError("query returned more than 10000 results")
+        return [log for log in self.logs if filter_params["fromBlock"] <= log["blockNumber"] <= filter_params["toBlock"]]
+
+class FakeWeb3:
+    def __init__(self):
+        self.eth = FakeEth()
+
+class FakeNodeHandler(BaseHTTPRequestHandler):
+    """JSON-RPC endpoint answering eth_blockNumber and the eth_call of the patients mapping, batched or not."""
+    requests = []
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.requests.append(body)
+        response = json.dumps([self.answer(request) for request in body] if isinstance(body, list) else self.answer(body)).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def answer(self, request):
+        if request["method"] == "eth_blockNumber":
+            result = hex(7)
+        else:
+            address = request["params"][0]["data"][-4:]
+            result = "0x" + encode(["string", "string", "uint8", "bool"], [f"Name {address}", "Lastname", 1, True]).hex()
+        return {"jsonrpc": "2.0", "id": request["id"], "result": result}
+
+    def log_message(self, *args):
+        pass
 
 class testADI (unittest.TestCase):
     def setUp(self):
@@ -46,5 +128,582 @@ class testADI (unittest.TestCase):
         result = self.db_ops.insert_treatment_plan(username_patient, username_medic, description, start_date, end_date)
         self.assertEqual(result, 0, "Failed to insert treatment plan")
 
+    def test_shared_connection(self):
+        """Test that database operations and models borrow the same connection"""
+        other_ops = DatabaseOperations()
+        self.assertIs(self.db_ops.conn, other_ops.conn)
+        self.assertIs(self.db_ops.conn, connection_manager.get_connection())
+        for patient in self.db_ops.get_patients():
+            self.assertIs(patient.to_model().conn, self.db_ops.conn)
+
+    def test_username_lookups_use_indexes(self):
+        """Test that username, contact and listing lookups are served by secondary indexes"""
+        lookups = {
+            "SELECT * FROM Credentials WHERE username = ?": "idx_credentials_username",
+            "SELECT * FROM Patients WHERE username = ?": "idx_patients_username",
+            "SELECT * FROM Medics WHERE username = ?": "idx_medics_username",
+            "SELECT * FROM Caregivers WHERE username = ?": "idx_caregivers_username",
+            "SELECT * FROM Reports WHERE username_patient = ?": "idx_reports_patient_date",
+            "SELECT * FROM TreatmentPlans WHERE username_patient = ? ORDER BY start_date": "idx_treatmentplans_patient_start",
+            "SELECT * FROM TreatmentPlans WHERE username_patient = ? ORDER BY date, id_treament_plan": "idx_treatmentplans_patient_date",
+            "SELECT COUNT(*) FROM Caregivers WHERE phone = ?": "idx_caregivers_phone",
+            "SELECT COUNT(*) FROM Medics WHERE mail = ?": "idx_medics_mail",
+        }
+        for query, index in lookups.items():
+            with self.subTest(query=query):
+                plan = self.db_ops.conn.execute("EXPLAIN QUERY PLAN " + query, ("x",)).fetchall()
+                self.assertTrue(any(index in row[-1] for row in plan), f"{query} does not use {index}: {plan}")
+
+    def test_insert_reports_bulk(self):
+        """Test function for bulk insertion of reports, including an invalid row"""
+        username_patient = self.faker.user_name()
+        username_medic = self.faker.user_name()
+        reports = ((username_patient, username_medic, f"Analysis {i}", None if i == 3 else "Flu") for i in range(7))
+        result = self.db_ops.insert_reports_bulk(reports, chunk_size=2)
+        self.assertEqual(result, [0, 0, 0, -1, 0, 0, 0], "Unexpected per-row status for bulk insertion")
+        self.assertEqual(len(self.db_ops.get_reports_list_by_username(username_patient)), 6)
+
+    def test_insert_reports_bulk_is_atomic(self):
+        """Test that a failing row stream or a Rollback leaves no row of a bulk insertion behind"""
+        username_patient = self.faker.user_name()
+        def reports():
+            for i in range(5):
+                if i == 3:
+                    raise ValueError("Malformed input")
+                yield (username_patient, "medic", f"Analysis {i}", "Flu")
+        with self.assertRaises(ValueError):
+            self.db_ops.insert_reports_bulk(reports(), chunk_size=2)
+        self.assertEqual(len(self.db_ops.get_reports_list_by_username(username_patient)), 0)
+
+        with self.db_ops.transaction():
+            self.db_ops.insert_reports_bulk(((username_patient, "medic", f"Analysis {i}", "Flu") for i in range(3)), chunk_size=2)
+            raise Rollback()
+        self.assertEqual(len(self.db_ops.get_reports_list_by_username(username_patient)), 0)
+
+    def test_registration_unit_of_work(self):
+        """Test that credentials and profile are committed together, or rolled back together"""
+        controller = Controller(Session())
+        public_key = self.faker.pystr(min_chars=10, max_chars=10)
+        private_key = self.faker.pystr(min_chars=10, max_chars=10)
+        profile = {'name': self.faker.first_name(), 'lastname': self.faker.last_name(), 'birthday': '1990-01-01',
+                   'specialization': 'Cardiology', 'mail': self.faker.email(), 'phone': self.faker.msisdn()}
+
+        taken = username = self.faker.user_name() + "_ok"
+        result = controller.registration(username, self.faker.password(), 'MEDIC', public_key, private_key, profile=profile)
+        self.assertEqual(result, 0, "Failed to register medic with profile")
+        self.assertIsNotNone(self.db_ops.get_creds_by_username(username))
+
+        username = self.faker.user_name() + "_ko"
+        result = controller.registration(username, self.faker.password(), 'MEDIC', public_key, private_key, profile=dict(profile, name=None))
+        self.assertEqual(result, -2, "Registration with an invalid profile should fail")
+        self.assertIsNone(self.db_ops.get_creds_by_username(username), "Credentials of a failed registration were committed")
+        self.assertFalse(self.db_ops.conn.in_transaction)
+
+        result = controller.registration(taken, self.faker.password(), 'MEDIC', public_key, private_key, profile=profile)
+        self.assertEqual(result, -1, "A taken username should be reported as such")
+
+    def test_sqlite_performance_profile(self):
+        """Test that the configured pragmas are applied to the shared connection"""
+        pragmas = connection_manager.get_effective_pragmas()
+        self.assertEqual(pragmas['journal_mode'], 'wal')
+        self.assertEqual(pragmas['synchronous'], 1)  # NORMAL
+        self.assertEqual(pragmas['temp_store'], 2)  # MEMORY
+        self.assertEqual(pragmas['busy_timeout'], 5000)
+
+    def test_reports_keyset_pagination(self):
+        """Test that walking report pages with cursors returns every report exactly once, in order"""
+        username_patient = self.faker.user_name()
+        self.db_ops.insert_reports_bulk((username_patient, "medic", f"Analysis {i}", "Flu") for i in range(7))
+        seen = []
+        cursor = None
+        while True:
+            page, cursor = self.db_ops.get_reports_page(username_patient, cursor, limit=3)
+            self.assertLessEqual(len(page), 3)
+            seen.extend(report.get_analyses() for report in page)
+            if cursor is None:
+                break
+        self.assertEqual(seen, [f"Analysis {i}" for i in range(7)])
+
+    def test_report_listing_carries_medic_name(self):
+        """Test that report pages carry the name of the issuing medic"""
+        username_patient = self.faker.user_name()
+        username_medic = self.faker.user_name()
+        self.db_ops.insert_medic(username_medic, "Gregory", "House", "1959-06-11", "Diagnostics", self.faker.email(), self.faker.msisdn())
+        self.db_ops.insert_report(username_patient, username_medic, "Blood Test", "Lupus")
+        page, _ = self.db_ops.get_reports_page(username_patient)
+        self.assertEqual([(r.get_medic_name(), r.get_medic_lastname()) for r in page], [("Gregory", "House")])
+
+    def test_contact_directory_uniqueness(self):
+        """Test that phone numbers are unique across roles and follow profile updates"""
+        phone = self.faker.msisdn()
+        patient = self.faker.user_name()
+        self.assertEqual(self.db_ops.check_unique_phone_number(phone), 0)
+        self.assertEqual(self.db_ops.insert_patient(patient, "John", "Doe", "1980-01-01", "Rome", "Milan", 1, phone), 0)
+        self.assertEqual(self.db_ops.check_unique_phone_number(phone), -1)
+
+        caregiver = self.faker.user_name()
+        result = self.db_ops.insert_caregiver(caregiver, "Jane", "Doe", patient, "Sister", phone)
+        self.assertEqual(result, -1, "A duplicate phone number was accepted")
+        self.assertIsNone(self.db_ops.conn.execute("SELECT 1 FROM Caregivers WHERE username = ?", (caregiver,)).fetchone())
+
+        new_phone = self.faker.msisdn()
+        self.db_ops.conn.execute("UPDATE Patients SET phone = ? WHERE username = ?", (new_phone, patient))
+        self.db_ops.conn.commit()
+        self.assertEqual(self.db_ops.check_unique_phone_number(phone), 0)
+        self.assertEqual(self.db_ops.check_unique_phone_number(new_phone), -1)
+
+    def test_contact_directory_tolerates_legacy_duplicates(self):
+        """Test that owners of a contact duplicated before the directory existed can still save their profile"""
+        phone = self.faker.msisdn()
+        first, second = self.faker.user_name() + "_a", self.faker.user_name() + "_b"
+        self.db_ops.insert_patient(first, "John", "Doe", "1980-01-01", "Rome", "Milan", 1, phone)
+        self.db_ops.insert_patient(second, "Jack", "Doe", "1980-01-01", "Rome", "Milan", 1, self.faker.msisdn())
+        # Recreate the state left by the directory backfill: both share the phone, only the first one owns it
+        conn = self.db_ops.conn
+        conn.execute("DELETE FROM ContactDirectory WHERE username IN (?, ?)", (first, second))
+        conn.execute("UPDATE Patients SET phone = ? WHERE username = ?", (phone, second))
+        conn.execute("DELETE FROM ContactDirectory WHERE username = ?", (second,))
+        conn.execute("INSERT INTO ContactDirectory(kind, contact, username) VALUES ('PHONE', ?, ?)", (phone, first))
+        conn.commit()
+
+        conn.execute("UPDATE Patients SET name = ?, phone = ? WHERE username = ?", ("Jacob", phone, second))
+        conn.commit()
+        self.assertEqual(conn.execute("SELECT name FROM Patients WHERE username = ?", (second,)).fetchone()[0], "Jacob")
+
+    def test_caregiver_registered_with_patient_atomically(self):
+        """Test that a caregiver and their patient are saved together, or not at all"""
+        controller = Controller(Session())
+        phone = self.faker.msisdn()
+        username, username_patient = self.faker.user_name() + "_cg", self.faker.user_name() + "_pt"
+        patient_profile = {'name': "John", 'lastname': "Doe", 'birthday': "1940-01-01", 'birth_place': "Rome",
+                           'residence': "Milan", 'autonomous': 0, 'phone': phone}
+        profile = {'name': "Jane", 'lastname': "Doe", 'username_patient': username_patient,
+                   'relationship': "Daughter", 'phone': phone}
+        credentials = (self.faker.password(), 'CAREGIVER', self.faker.pystr(), self.faker.pystr())
+
+        result = controller.registration(username, *credentials, profile=profile, patient=(username_patient, patient_profile))
+        self.assertEqual(result, -2, "A phone shared by caregiver and patient was accepted")
+        self.assertIsNone(self.db_ops.get_creds_by_username(username))
+        self.assertIsNone(self.db_ops.conn.execute("SELECT 1 FROM Patients WHERE username = ?", (username_patient,)).fetchone())
+
+        patient_profile['phone'] = self.faker.msisdn()
+        result = controller.registration(username, *credentials, profile=profile, patient=(username_patient, patient_profile))
+        self.assertEqual(result, 0)
+        self.assertIsNotNone(self.db_ops.conn.execute("SELECT 1 FROM Patients WHERE username = ?", (username_patient,)).fetchone())
+
+    def test_read_models_are_compact_and_read_only(self):
+        """Test that listing rows are slot-based, immutable and upgradable to editable models"""
+        username_patient = self.faker.user_name()
+        self.db_ops.insert_report(username_patient, "medic", "Blood Test", "Flu")
+        report = self.db_ops.get_reports_list_by_username(username_patient)[0]
+        self.assertFalse(hasattr(report, '__dict__'))
+        with self.assertRaises(AttributeError):
+            report.diagnosis = "Cold"
+        model = report.to_model()
+        model.diagnosis = "Cold"
+        model.save()
+        self.assertEqual(self.db_ops.get_reports_list_by_username(username_patient)[0].get_diagnosis(), "Cold")
+
+    def test_iter_reports_streams_in_batches(self):
+        """Test that report streaming returns every matching row across several fetchmany batches"""
+        username_patient = self.faker.user_name()
+        self.db_ops.insert_reports_bulk((username_patient, "medic" if i % 2 else "other", f"Analysis {i}", "Flu") for i in range(9))
+        reports = self.db_ops.iter_reports(username_patient, batch_size=2)
+        self.assertNotIsInstance(reports, list)
+        self.assertEqual(len(list(reports)), 9)
+        by_medic = list(self.db_ops.iter_reports(username_patient, username_medic="medic", batch_size=2))
+        self.assertEqual([r.get_analyses() for r in by_medic], [f"Analysis {i}" for i in (1, 3, 5, 7)])
+
+    def test_search_medical_records(self):
+        """Test that the full-text index follows reports and treatment plans through inserts, updates and deletes"""
+        username_patient = self.faker.user_name()
+        self.db_ops.insert_report(username_patient, "medic", "Glycated hemoglobin test", "Type 2 diabetes")
+        self.db_ops.insert_treatment_plan(username_patient, "medic", "Insulin therapy for diabetes", "2024-01-01", "2024-06-30")
+        hits = self.db_ops.search_medical_records("diabetes", username_patient)
+        self.assertEqual(sorted(hit.get_kind() for hit in hits), ["REPORT", "TREATMENT_PLAN"])
+        self.assertIn("[diabetes]", hits[0].get_snippet())
+        models = {hit.get_kind(): hit.to_model() for hit in hits}
+        self.assertEqual(models["REPORT"].get_diagnosis(), "Type 2 diabetes")
+        self.assertEqual(models["TREATMENT_PLAN"].get_description(), "Insulin therapy for diabetes")
+        self.assertEqual(len(self.db_ops.search_medical_records('glyc "OR', username_patient)), 0)
+        self.assertEqual(len(self.db_ops.search_medical_records("hemoglobin glyc", username_patient)), 1)
+
+        report_id = next(hit.get_record_id() for hit in hits if hit.get_kind() == "REPORT")
+        self.db_ops.cur.execute("UPDATE Reports SET diagnosis = 'Anemia' WHERE id_report = ?", (report_id,))
+        self.assertEqual([hit.get_kind() for hit in self.db_ops.search_medical_records("diabetes", username_patient)], ["TREATMENT_PLAN"])
+        self.db_ops.cur.execute("DELETE FROM TreatmentPlans WHERE username_patient = ?", (username_patient,))
+        self.assertEqual(self.db_ops.search_medical_records("diabetes", username_patient), [])
+        self.db_ops.conn.commit()
+
+    def test_search_patients_by_prefix(self):
+        """Test the case-insensitive patient prefix search and that it seeks the expression indexes"""
+        suffix = self.faker.pystr(min_chars=8, max_chars=8).lower()
+        self.db_ops.insert_patients_bulk([
+            (f"mrossi{suffix}", "Mario", f"Rossi{suffix}", "1990-01-01", "Roma", "Roma", 1, ""),
+            (f"arossi{suffix}", "Anna", f"Rossi{suffix}", "1990-01-01", "Roma", "Roma", 1, ""),
+            (f"rossi{suffix}", "Luca", f"Bianchi{suffix}", "1990-01-01", "Roma", "Roma", 1, ""),
+        ])
+        found = self.db_ops.search_patients(f"ROSSI{suffix.upper()}")
+        self.assertEqual([p.get_username() for p in found], [f"rossi{suffix}", f"arossi{suffix}", f"mrossi{suffix}"])
+        self.assertEqual([p.get_username() for p in self.db_ops.search_patients(f"rossi{suffix} MA")], [f"mrossi{suffix}"])
+        self.assertEqual(len(self.db_ops.search_patients(f"rossi{suffix}", limit=2)), 2)
+        self.assertEqual(self.db_ops.search_patients("   "), [])
+
+        # A two-word last name is found by its beginning, in full, and followed by the name
+        self.db_ops.insert_patients_bulk([
+            (f"gdeluca{suffix}", "Giulia", f"De Luca{suffix}", "1990-01-01", "Roma", "Roma", 1, ""),
+            (f"pdeluca{suffix}", "Paolo", f"De Luca{suffix}", "1990-01-01", "Roma", "Roma", 1, ""),
+        ])
+        for prefix in ("de lu", f"De Luca{suffix}", f"de luca{suffix}  "):
+            with self.subTest(prefix=prefix):
+                found = [p.get_username() for p in self.db_ops.search_patients(prefix, limit=100)]
+                self.assertIn(f"gdeluca{suffix}", found)
+                self.assertIn(f"pdeluca{suffix}", found)
+        self.assertEqual([p.get_username() for p in self.db_ops.search_patients(f"de luca{suffix} pa")], [f"pdeluca{suffix}"])
+
+        plan = self.db_ops.conn.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM Patients WHERE lower(lastname) >= ?1 AND lower(lastname) < ?1 || char(1114111)", ("x",)).fetchall()
+        self.assertTrue(any("idx_patients_lastname_name_ci" in row[-1] for row in plan), plan)
+        plan = self.db_ops.conn.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM Patients WHERE lower(username) >= ?1 AND lower(username) < ?1 || char(1114111)", ("x",)).fetchall()
+        self.assertTrue(any("idx_patients_username_ci" in row[-1] for row in plan), plan)
+
+    def test_medic_directory_cache(self):
+        """Test that medic lookups are cached and that writes through insert_medic and Medics.save invalidate them"""
+        username = self.faker.user_name() + self.faker.pystr(min_chars=6, max_chars=6)
+        self.assertIsNone(self.db_ops.get_medic_by_username(username))
+        self.db_ops.insert_medic(username, "Gregory", "House", "1959-06-11", "Diagnostics", "", "")
+        stats = self.db_ops.get_cache_stats()["medic_directory"]
+        medic = self.db_ops.get_medic_by_username(username)
+        self.assertIs(self.db_ops.get_medic_by_username(username), medic)
+        after = self.db_ops.get_cache_stats()["medic_directory"]
+        self.assertEqual((after["hits"] - stats["hits"], after["misses"] - stats["misses"]), (1, 1))
+
+        editable = medic.to_model()
+        editable.set_lastname("Wilson")
+        editable.save()
+        self.assertEqual(self.db_ops.get_medic_by_username(username).get_lastname(), "Wilson")
+
+    def test_credentials_cache(self):
+        """Test that role and public key lookups are cached without secrets and that passwords are always read fresh"""
+        username = self.faker.user_name() + self.faker.pystr(min_chars=6, max_chars=6)
+        self.db_ops.register_creds(username, "OldPass1!", "MEDIC", "public", "private")
+        self.assertTrue(self.db_ops.check_credentials(username, "OldPass1!", "public", "private"))
+        statements = []
+        self.db_ops.conn.set_trace_callback(statements.append)
+        try:
+            self.assertEqual(self.db_ops.get_role_by_username(username), "MEDIC")
+            self.assertEqual(self.db_ops.get_public_key_by_username(username), "public")
+        finally:
+            self.db_ops.conn.set_trace_callback(None)
+        self.assertEqual([q for q in statements if "FROM Credentials" in q], [])
+
+        self.assertEqual(self.db_ops.change_passwd(username, "OldPass1!", "NewPass1!"), 0)
+        self.assertFalse(self.db_ops.check_passwd(username, "OldPass1!"))
+        self.assertTrue(self.db_ops.check_credentials(username, "NewPass1!", "public", "private"))
+        self.assertFalse(self.db_ops.check_passwd(username + "x", "NewPass1!"))
+
+        # A password changed by another process stops working at once, without any invalidation here
+        self.db_ops.cur.execute("UPDATE Credentials SET hash_password = ? WHERE username = ?",
+                                (self.db_ops.hash_function("Other1!"), username))
+        self.db_ops.conn.commit()
+        self.assertFalse(self.db_ops.check_passwd(username, "NewPass1!"))
+        self.assertTrue(self.db_ops.check_passwd(username, "Other1!"))
+
+    def test_login_single_query(self):
+        """Test that a login fetches credentials and profile with one query and rejects wrong credentials"""
+        username = self.faker.user_name() + self.faker.pystr(min_chars=6, max_chars=6)
+        self.db_ops.register_creds(username, "Secret1!", "PATIENT", "public", "private")
+        self.db_ops.insert_patient(username, "Mario", "Rossi", "1990-01-01", "Roma", "Roma", 1, "")
+        controller = Controller(Session())
+        statements = []
+        controller.db_ops.conn.set_trace_callback(statements.append)
+        try:
+            self.assertEqual(controller.login(username, "Secret1!", "public", "private"), (0, "PATIENT"))
+        finally:
+            controller.db_ops.conn.set_trace_callback(None)
+        self.assertEqual(len([q for q in statements if q.lstrip().startswith("SELECT") and "LoginThrottle" not in q]), 1, statements)
+        self.assertEqual(controller.session.get_user().get_lastname(), "Rossi")
+
+        self.assertIsNone(self.db_ops.authenticate(username, "Wrong1!", "public", "private"))
+        self.assertIsNone(self.db_ops.authenticate(username, "Secret1!", "other", "private"))
+        self.assertIsNone(self.db_ops.authenticate(username + "x", "Secret1!", "public", "private"))
+
+    def test_kdf_executor_back_pressure(self):
+        """Test that password derivations run in the pool and that a saturated pool refuses new work"""
+        hashed = self.db_ops.hash_function_async("Secret1!").result()
+        self.assertTrue(scrypt_verify(hashed, "Secret1!"))
+        self.assertFalse(scrypt_verify(hashed, "Secret2!"))
+
+        executor = KDFExecutor(workers=1, max_pending=1, queue_timeout=0.05)
+        release = threading.Event()
+        blocked = executor.submit(release.wait)
+        with self.assertRaises(KDFBusyError):
+            executor.verify_async(hashed, "Secret1!")
+        release.set()
+        blocked.result()
+        self.assertTrue(executor.verify_async(hashed, "Secret1!").result())
+        executor.shutdown()
+
+    def test_rehash_on_login(self):
+        """Test that a login verified against outdated scrypt parameters upgrades the stored hash"""
+        username = self.faker.user_name() + self.faker.pystr(min_chars=6, max_chars=6)
+        self.db_ops.register_creds(username, "Secret1!", "MEDIC", "public", "private")
+        old_hash = self.db_ops.get_creds_by_username(username).get_hash_password()
+        self.assertFalse(needs_rehash(old_hash, self.db_ops._scrypt_params()))
+
+        self.db_ops.n_param = 16
+        self.assertIsNotNone(self.db_ops.authenticate(username, "Secret1!", "public", "private"))
+        kdf_executor.shutdown(wait=True)
+        new_hash = self.db_ops.get_creds_by_username(username).get_hash_password()
+        self.assertEqual(new_hash.split('$')[2], "16")
+        self.assertTrue(self.db_ops.check_passwd(username, "Secret1!"))
+        self.assertFalse(needs_rehash(new_hash, self.db_ops._scrypt_params()))
+
+    def test_reauth_grace_window(self):
+        """Test that a successful re-authentication opens a window for the same user, closed by logout"""
+        username = self.faker.user_name() + self.faker.pystr(min_chars=6, max_chars=6)
+        self.db_ops.register_creds(username, "Secret1!", "MEDIC", "public", "private")
+        controller = Controller(Session())
+        self.assertFalse(controller.has_valid_reauth(username))
+        self.assertFalse(controller.reauthenticate(username, "Wrong1!"))
+        self.assertFalse(controller.has_valid_reauth(username))
+        self.assertTrue(controller.reauthenticate(username, "Secret1!"))
+        self.assertTrue(controller.has_valid_reauth(username))
+        self.assertFalse(controller.has_valid_reauth(username + "x"))
+        controller.session.reset_session()
+        self.assertFalse(controller.has_valid_reauth(username))
+
+        controller.session.grant_reauth(username, 0.05)
+        time.sleep(0.06)
+        self.assertFalse(controller.has_valid_reauth(username))
+
+    def test_login_throttle_sliding_window(self):
+        """Test that failures are limited per source and per username, with a sliding window and a lockout"""
+        throttle = LoginThrottle(max_attempts=3, max_attempts_per_user=5, window=60, lockout=30)
+        username = self.faker.user_name() + self.faker.pystr(min_chars=6, max_chars=6)
+        now = 6000.0
+        self.assertEqual(throttle.record_failure(username, "host-a", now), 0)
+        self.assertEqual(throttle.record_failure(username, "host-a", now + 1), 0)
+        self.assertEqual(throttle.record_failure(username, "host-a", now + 2), 30)
+        self.assertEqual(throttle.locked_for(username, "host-a", now + 12), 20)
+        self.assertEqual(throttle.locked_for(username, "host-b", now + 12), 0)
+
+        # Half of the previous window is still covered, so the 3 earlier failures weigh 1.5 over all sources:
+        # the fourth failure of the new window reaches the per-user limit of 5 and locks the username everywhere
+        self.assertEqual(throttle.record_failure(username, "host-b", now + 90), 0)
+        self.assertEqual(throttle.record_failure(username, "host-b", now + 90), 0)
+        self.assertEqual(throttle.record_failure(username, "host-c", now + 90), 0)
+        self.assertEqual(throttle.record_failure(username, "host-c", now + 90), 30)
+        self.assertEqual(throttle.locked_for(username, "host-d", now + 90), 30)
+
+        throttle.reset(username, "host-a", now + 200)
+        self.assertEqual(throttle.locked_for(username, "host-a", now + 200), 0)
+
+    def test_login_consults_shared_throttle(self):
+        """Test that a username locked by another process is refused without verifying the password"""
+        username = self.faker.user_name() + self.faker.pystr(min_chars=6, max_chars=6)
+        self.db_ops.register_creds(username, "Secret1!", "PATIENT", "public", "private")
+        for _ in range(login_throttle.max_attempts):
+            login_throttle.record_failure(username, "other-process")
+        controller = Controller(Session())
+        self.assertEqual(controller.login(username, "Secret1!", "public", "private", source="other-process"), (-2, None))
+        self.assertGreater(controller.session.get_timeout_left(), 0)
+        self.assertEqual(Controller(Session()).login(username, "Secret1!", "public", "private")[0], 0)
+
+    def test_receipt_tracker_resolves_handles(self):
+        """Test that submitted transactions are resolved in the background and their status persisted"""
+        w3 = FakeWeb3()
+        tracker = ReceiptTracker(w3, poll_interval=0.01)
+        suffix = self.faker.pystr(min_chars=8, max_chars=8).encode().hex()
+        ok, reverted = f"0x{suffix}01", f"0x{suffix}02"
+        try:
+            ok_handle = tracker.track(ok, "addReport", "0xmedic", 1)
+            reverted_handle = tracker.track(bytes.fromhex(reverted[2:]), "addReport", "0xmedic", 2)
+            self.assertFalse(ok_handle.done())
+            w3.eth.mine((ok, 1))
+            w3.eth.mine((reverted, 0))
+            self.assertEqual(ok_handle.result(timeout=5)["gasUsed"], 21000)
+            with self.assertRaises(TransactionFailed):
+                reverted_handle.result(timeout=5)
+        finally:
+            tracker.stop()
+        statuses = dict(self.db_ops.conn.execute(
+            "SELECT tx_hash, status FROM ChainTransactions WHERE tx_hash IN (?, ?)", (ok, reverted)).fetchall())
+        self.assertEqual(statuses, {ok: "SUCCESS", reverted: "FAILED"})
+
+    def test_nonce_manager_pipelines_and_resyncs(self):
+        """Test that concurrent submissions get consecutive nonces and that a nonce error triggers a resync"""
+        w3 = FakeWeb3()
+        w3.eth.transaction_counts["0xmedic"] = 5
+        manager = NonceManager(w3)
+        used = []
+        def submit(nonce):
+            if nonce < w3.eth.transaction_counts["0xmedic"]:
+                raise ValueError("nonce too low")
+            used.append(nonce)
+            return f"0x{nonce:02x}"
+        def reject(nonce):
+            raise ValueError("out of gas")
+        threads = [threading.Thread(target=manager.send, args=("0xmedic", submit)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(used), list(range(5, 13)))
+        self.assertEqual(manager.pending_nonces("0xMEDIC"), list(range(5, 13)))
+        manager.mark_done("0xmedic", 5)
+        self.assertNotIn(5, manager.pending_nonces("0xmedic"))
+        # Another client (or a previous run) used the next nonces: the manager resyncs and retries once
+        w3.eth.transaction_counts["0xmedic"] = 20
+        self.assertEqual(manager.send("0xmedic", submit), (20, "0x14"))
+        with self.assertRaises(ValueError):
+            manager.send("0xmedic", reject)
+        # A submission refused for another reason leaves its nonce free
+        self.assertEqual(manager.send("0xmedic", submit)[0], 21)
+
+    def test_gas_estimation_and_cached_fees(self):
+        """Test that gas is estimated once per function, record count and size bucket, refined by receipts, and fees are cached"""
+        estimator = GasEstimator(margin=1.5)
+        calls = []
+        def estimate():
+            calls.append(1)
+            return 100000
+        self.assertEqual(estimator.gas_limit("addReport", ("0xp", "short"), estimate), 150000)
+        self.assertEqual(estimator.gas_limit("addReport", ("0xq", "other"), estimate), 150000)
+        self.assertEqual(len(calls), 1)
+        estimator.gas_limit("addReport", ("0xp", "x" * 5000), estimate)
+        self.assertEqual(len(calls), 2)
+        # Same bucket, but larger than the call the cached estimate was taken at
+        estimator.gas_limit("addReport", ("0xp", "short!"), estimate)
+        self.assertEqual(len(calls), 3)
+        estimator.observe("addReport", ("0xp", "short!"), {"status": 1, "gasUsed": 60000}, 150000)
+        self.assertEqual(estimator.gas_limit("addReport", ("0xp", "short"), estimate), 90000)
+        # Ran out of gas: the limit grows
+        estimator.observe("addReport", ("0xp", "short"), {"status": 0, "gasUsed": 90000}, 90000)
+        self.assertEqual(estimator.gas_limit("addReport", ("0xp", "short"), estimate), 202500)
+
+        w3 = FakeWeb3()
+        w3.eth.gas_price = 7
+        w3.eth.max_priority_fee = 2
+        w3.eth.blocks["latest"] = {"transactions": [], "baseFeePerGas": 10}
+        oracle = FeeOracle(w3, mode="auto", ttl=60)
+        self.assertEqual(oracle.fees(), {"maxFeePerGas": 22, "maxPriorityFeePerGas": 2})
+        w3.eth.blocks["latest"]["baseFeePerGas"] = 1000
+        self.assertEqual(oracle.fees()["maxFeePerGas"], 22)
+        oracle.invalidate()
+        self.assertEqual(oracle.fees()["maxFeePerGas"], 2002)
+        self.assertEqual(FeeOracle(w3, mode="legacy").fees(), {"gasPrice": 7})
+
+    def test_write_coalescer_batches(self):
+        """Test that queued writes are sent as one batch transaction when full or when their delay expires"""
+        sent = []
+        def write(function_name, from_address, *args, wait=True):
+            handle = TxHandle(f"0x{len(sent):02x}", function_name)
+            sent.append((function_name, from_address, args, handle))
+            return handle
+        coalescer = WriteCoalescer(write, max_items=3, max_delay_ms=50)
+        try:
+            futures = [coalescer.submit('addReport', "0xmedic", f"Analysis {i}", "Flu") for i in range(3)]
+            self.assertEqual(len(sent), 1)
+            self.assertEqual(sent[0][:3], ('addReports', "0xmedic", (["Analysis 0", "Analysis 1", "Analysis 2"], ["Flu"] * 3)))
+            sent[0][3].future.set_result({"status": 1})
+            self.assertEqual([future.result(timeout=1) for future in futures], [{"status": 1}] * 3)
+
+            late = coalescer.submit('addTreatmentPlan', "0xmedic", "Rest", "2024-01-01", "2024-01-10")
+            other = coalescer.submit('addTreatmentPlan', "0xother", "Walk", "2024-01-01", "2024-01-10")
+            deadline = time.monotonic() + 5
+            while len(sent) < 3 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(sorted(call[1] for call in sent[1:]), ["0xmedic", "0xother"])
+            self.assertEqual(coalescer.pending_count(), 0)
+            for call in sent[1:]:
+                call[3].future.set_exception(TransactionFailed("reverted"))
+            with self.assertRaises(TransactionFailed):
+                late.result(timeout=1)
+            with self.assertRaises(ValueError):
+                coalescer.submit('updateTreatmentPlan', "0xmedic", 1, "Rest", "2024-01-01", "2024-01-10")
+            self.assertIsInstance(other.exception(timeout=1), TransactionFailed)
+        finally:
+            coalescer.close()
+
+    def test_coalesced_batch_gas_grows_with_records(self):
+        """Test that a batch of several records is not sent with the gas limit of a one-record batch"""
+        estimator = GasEstimator(margin=1.0)
+        limits = []
+        def write(function_name, from_address, *args, wait=True):
+            # The node charges every record of the batch
+            limits.append(estimator.gas_limit(function_name, args, lambda: 30000 + 50000 * len(args[0])))
+            return TxHandle(f"0x{len(limits):02x}", function_name)
+        coalescer = WriteCoalescer(write, max_items=10, max_delay_ms=60000)
+        try:
+            coalescer.submit('addReport', "0xmedic", "Analysis of the blood sample", "Flu")
+            coalescer.flush()
+            for i in range(3):
+                coalescer.submit('addReport', "0xmedic", f"Blood {i}", "Flu")
+            coalescer.flush()
+            self.assertEqual(limits, [80000, 180000])
+        finally:
+            coalescer.close()
+
+    def test_read_many_batches_calls(self):
+        """Test that read_many packs the calls into batch requests pinned to one block and keeps their order"""
+        server = HTTPServer(("127.0.0.1", 0), FakeNodeHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        FakeNodeHandler.requests = []
+        try:
+            act_controller = object.__new__(ActionController)
+            act_controller.w3 = Web3(Web3.HTTPProvider(f"http://127.0.0.1:{server.server_port}"))
+            with open('../on_chain/contract_abi.json') as file:
+                act_controller.contract = act_controller.w3.eth.contract(address="0x" + "11" * 20, abi=json.load(file))
+            addresses = [Web3.to_checksum_address(f"0x{i:040x}") for i in range(1, 6)]
+            results = act_controller.read_many((('patients', address) for address in addresses), batch_size=2)
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertEqual([result[0] for result in results], [f"Name {i:04x}" for i in range(1, 6)])
+        batches = FakeNodeHandler.requests[1:]
+        self.assertEqual([len(batch) for batch in batches], [2, 2, 1])
+        self.assertTrue(all(call["params"][1] == "0x7" for batch in batches for call in batch))
+
+    def test_event_ingestor_resumes_exactly_once(self):
+        """Test that events are ingested over adaptive ranges from the checkpoint and handled exactly once"""
+        w3 = FakeWeb3()
+        with open('../on_chain/contract_abi.json') as file:
+            contract = Web3().eth.contract(address=Web3.to_checksum_address("0x" + self.faker.hexify("^" * 40)), abi=json.load(file))
+        topic = contract.events.ActionLogged().topic
+        medic = "0x" + "22" * 20
+        def action_logged(block_number, action_id):
+            return {
+                "address": contract.address, "blockNumber": block_number, "logIndex": 0, "transactionIndex": 0,
+                "transactionHash": bytes([action_id]) * 32, "blockHash": bytes([block_number]) * 32, "removed": False,
+                "topics": [bytes.fromhex(topic[2:]), action_id.to_bytes(32, "big"), bytes(12) + bytes.fromhex(medic[2:]),
+                           (1700000000 + block_number).to_bytes(32, "big")],
+                "data": encode(["string", "string"], ["Create", "Report added"]),
+            }
+        w3.eth.logs = [action_logged(block, block) for block in (3, 40, 90)]
+        w3.eth.block_number = 100
+        w3.eth.max_log_range = 30
+        handled = []
+        ingestor = EventIngestor(w3, contract, handlers={'ActionLogged': lambda event: handled.append(event['args']['actionId'])},
+                                 start_block=0, max_range=64)
+        self.assertEqual(ingestor.run_once(), 3)
+        self.assertEqual(handled, [3, 40, 90])
+        self.assertEqual(ingestor.checkpoint(), 100)
+
+        # A restart resumes from the checkpoint and catches the events emitted meanwhile
+        w3.eth.logs.append(action_logged(120, 120))
+        w3.eth.block_number = 130
+        restarted = EventIngestor(w3, contract, handlers={'ActionLogged': lambda event: handled.append(event['args']['actionId'])})
+        self.assertEqual(restarted.run_once(), 1)
+        self.assertEqual(handled, [3, 40, 90, 120])
+
+        # Ranges already ingested (e.g. by another process) are not handled twice
+        self.db_ops.conn.execute("UPDATE EventCheckpoints SET last_block = 0 WHERE contract_address = ?", (contract.address,))
+        self.assertEqual(restarted.run_once(), 0)
+        self.assertEqual(handled, [3, 40, 90, 120])
+        stored = self.db_ops.conn.execute("SELECT COUNT(*) FROM ChainEvents WHERE contract_address = ?", (contract.address,)).fetchone()[0]
+        self.assertEqual(stored, 4)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -236,6 +236,38 @@ contract HealthCareRecords {
         logAction("Create", msg.sender, "Treatment plan added");
     }
 
+    /**
+     * @dev Adds several medical reports in a single transaction, logging one action per report.
+     * @param analyses Medical analysis details, one per report.
+     * @param diagnoses Medical diagnoses, in the same order as the analyses.
+     * @notice Only authorized users can add medical reports.
+     */
+    function addReports(string[] memory analyses, string[] memory diagnoses) public onlyAuthorized {
+        require(analyses.length == diagnoses.length, "Analyses and diagnoses must have the same length");
+        for (uint256 i = 0; i < analyses.length; i++) {
+            // The index keeps identical reports of the same batch apart
+            uint256 reportId = uint256(keccak256(abi.encodePacked(msg.sender, analyses[i], diagnoses[i], block.timestamp, i)));
+            reports[reportId] = Report(reportId, msg.sender, analyses[i], diagnoses[i]);
+            logAction("Create", msg.sender, "Report added");
+        }
+    }
+
+    /**
+     * @dev Adds several treatment plans in a single transaction, logging one action per plan.
+     * @param treatmentDetails Treatment details, one per plan.
+     * @param startDates Start dates of the treatments, in the same order as the details.
+     * @param endDates End dates of the treatments, in the same order as the details.
+     * @notice Only authorized users can add treatment plans.
+     */
+    function addTreatmentPlans(string[] memory treatmentDetails, string[] memory startDates, string[] memory endDates) public onlyAuthorized {
+        require(treatmentDetails.length == startDates.length && treatmentDetails.length == endDates.length, "Treatment plan fields must have the same length");
+        for (uint256 i = 0; i < treatmentDetails.length; i++) {
+            uint256 planId = uint256(keccak256(abi.encodePacked(msg.sender, treatmentDetails[i], block.timestamp, i)));
+            treatmentPlans[planId] = TreatmentPlan(planId, msg.sender, treatmentDetails[i], startDates[i], endDates[i]);
+            logAction("Create", msg.sender, "Treatment plan added");
+        }
+    }
+
     /**
      * @dev Updates an existing treatment plan with new details, start date, and end date.
      * @param planId Identifier of the treatment plan to update.